@@ -1,4 +1,21 @@
+from fastapi import Request
+from app.services.container import ServiceContainer
+from app.services.async_db_service import AsyncDBService
 from app.services.story_service import StoryService
+from app.services.job_service import JobService
 
-def get_story_service() -> StoryService:
-    return StoryService()
+
+def get_container(request: Request) -> ServiceContainer:
+    return request.app.state.container
+
+
+def get_story_service(request: Request) -> StoryService:
+    return request.app.state.container.story_service
+
+
+def get_async_db_service(request: Request) -> AsyncDBService:
+    return request.app.state.container.async_db_service
+
+
+def get_job_service(request: Request) -> JobService:
+    return request.app.state.container.job_service
@@ -1,4 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from starlette.status import HTTP_404_NOT_FOUND
 from pydantic import BaseModel
 from ...models.schemas import (
@@ -6,10 +8,11 @@ from ...models.schemas import (
     ErrorResponse,
     EpisodeBatchResponse,
 )
-from app.api.dependencies import get_story_service
+from app.api.dependencies import get_story_service, get_async_db_service
 from app.services.story_service import StoryService
-from ...services.ai_service import AIService
+from app.services.async_db_service import AsyncDBService
 from typing import Union, List, Dict
+import json
 
 router = APIRouter(prefix="/episodes", tags=["episodes"])
 
@@ -26,8 +29,9 @@ async def generate_batch(
     hinglish: bool = Query(False),
     refinement_type: str = Query("ai", enum=["ai", "human"]),
     service: StoryService = Depends(get_story_service),
+    db: AsyncDBService = Depends(get_async_db_service),
 ):
-    story_data = service.get_story_info(story_id)
+    story_data = await db.get_story_header(story_id, with_state=False)
     if "error" in story_data:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=story_data["error"])
 
@@ -35,8 +39,13 @@ async def generate_batch(
     if current_episode > story_data.get("num_episodes", 0):
         return {"error": "All episodes generated", "episodes": []}
 
-    episodes = service.generate_and_refine_batch(
-        story_id, batch_size, hinglish, refinement_type
+    # Generation is blocking LLM/DB work; keep it off the event loop
+    episodes = await run_in_threadpool(
+        service.generate_and_refine_batch,
+        story_id,
+        batch_size,
+        hinglish,
+        refinement_type,
     )
 
     # For AI refinement, return all episodes
@@ -53,6 +62,54 @@ async def generate_batch(
     }
 
 
+@router.get(
+    "/{story_id}/generate-stream",
+    summary="Generate the next episode, streaming its content as server-sent events",
+)
+async def generate_episode_stream(
+    story_id: int,
+    hinglish: bool = Query(False),
+    service: StoryService = Depends(get_story_service),
+    db: AsyncDBService = Depends(get_async_db_service),
+):
+    """
+    Events: "token" with a piece of episode_content, "reset" when a Hinglish
+    translation replaces the streamed draft, then a final "episode" with the
+    stored episode (or "error").
+    """
+    story_data = await db.get_story_header(story_id, with_state=False)
+    if "error" in story_data:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=story_data["error"])
+
+    episode_number = story_data.get("current_episode", 1)
+    num_episodes = story_data.get("num_episodes", 0)
+    if episode_number > num_episodes:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND, detail="All episodes generated"
+        )
+
+    prev_episodes = []
+    if episode_number > 1:
+        prev_episodes = await db.get_episodes_by_range(
+            story_id,
+            max(1, episode_number - 2),
+            episode_number - 1,
+            "episode_number, content, title, summary",
+        )
+
+    def events():
+        # A sync generator; StreamingResponse iterates it in the threadpool
+        for event in service.stream_and_store_episode(
+            story_id, episode_number, num_episodes, hinglish, prev_episodes
+        ):
+            yield (
+                f"event: {event['event']}\n"
+                f"data: {json.dumps(event.get('data'))}\n\n"
+            )
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 # Validate batch endpoint
 @router.post(
     "/{story_id}/validate-batch",
@@ -62,14 +119,15 @@ async def generate_batch(
 async def validate_batch(
     story_id: int,
     service: StoryService = Depends(get_story_service),
+    db: AsyncDBService = Depends(get_async_db_service),
 ):
-    story_data = service.get_story_info(story_id)
+    story_data = await db.get_story_header(story_id, with_state=False)
     print(f"Story data keys: {list(story_data.keys())}")
 
     if "error" in story_data:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=story_data["error"])
 
-    current_episodes_content = story_data.get("current_episodes_content", [])
+    current_episodes_content = await db.get_refined_episodes(story_id)
     print(f"Current episodes found: {len(current_episodes_content)}")
 
     # Debug the structure if episodes exist
@@ -84,7 +142,9 @@ async def validate_batch(
         )
 
     # Store the validated episodes (implicit approval)
-    service.store_validated_episodes(story_id, current_episodes_content)
+    await run_in_threadpool(
+        service.store_validated_episodes, story_id, current_episodes_content
+    )
 
     # Update the current episode number
     max_episode = max(
@@ -116,13 +176,14 @@ async def refine_batch(
     story_id: int,
     feedback: List[Feedback] = Body(...),
     service: StoryService = Depends(get_story_service),
+    db: AsyncDBService = Depends(get_async_db_service),
 ):
-    story_data = service.get_story_info(story_id)
+    story_data = await db.get_story_header(story_id)
     if "error" in story_data:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=story_data["error"])
 
     # Get the current episodes content
-    current_episodes_content = story_data.get("current_episodes_content", [])
+    current_episodes_content = await db.get_refined_episodes(story_id)
     if not current_episodes_content:
         raise HTTPException(
             status_code=HTTP_404_NOT_FOUND, detail="No current batch found to refine"
@@ -141,7 +202,7 @@ async def refine_batch(
         "current_episode": story_data.get("current_episode", 1),
         "num_episodes": story_data.get("num_episodes", 0),
         "story_id": story_id,
-        "characters": story_data.get("characters", {}),
+        "characters": await db.get_story_characters(story_id),
         "hinglish": story_data.get("hinglish", False),
     }
 
@@ -150,9 +211,15 @@ async def refine_batch(
     prev_batch_end = metadata["current_episode"] - 1
     prev_episodes = []
     if prev_batch_end >= prev_batch_start:
-        prev_episodes = service.get_episodes_by_range(
-            story_id, prev_batch_start, prev_batch_end
-        )
+        try:
+            prev_episodes = await db.get_episodes_by_range(
+                story_id,
+                prev_batch_start,
+                prev_batch_end,
+                "episode_number, content, title",
+            )
+        except Exception as e:
+            print(f"Error fetching episodes: {e}")
 
         print(f"Previous episodes found: {prev_episodes}")
 
@@ -165,11 +232,9 @@ async def refine_batch(
             for ep in prev_episodes
         ]
 
-    # Create AI service
-    ai_service = AIService()
-
     # Regenerate the whole batch with feedback
-    refined_episodes = ai_service.regenerate_batch(
+    refined_episodes = await run_in_threadpool(
+        service.ai_service.regenerate_batch,
         story_id,
         current_episodes_content,
         prev_episodes,
@@ -181,7 +246,7 @@ async def refine_batch(
     )
 
     # Store the refined episodes
-    service.update_current_episodes_content(story_id, refined_episodes)
+    await db.update_story_current_episodes_content(story_id, refined_episodes)
 
     return {
         "status": "pending",
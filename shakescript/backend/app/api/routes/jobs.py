@@ -0,0 +1,143 @@
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.status import HTTP_404_NOT_FOUND, HTTP_409_CONFLICT
+from ...models.schemas import JobResponse, EpisodeBatchResponse, ErrorResponse
+from app.api.dependencies import get_job_service, get_async_db_service
+from app.core.config import settings
+from app.services.job_service import JobService, TERMINAL_JOB_STATUSES
+from app.services.async_db_service import AsyncDBService
+from typing import Any, Dict, Union
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def job_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "job_id": job["id"],
+        "story_id": job["story_id"],
+        "status": job["status"],
+        "progress": job.get("progress") or [],
+        "error": job.get("error"),
+    }
+
+
+async def get_job_or_404(db: AsyncDBService, job_id: str) -> Dict[str, Any]:
+    job = await db.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.post(
+    "/generate-batch/{story_id}",
+    response_model=Union[JobResponse, ErrorResponse],
+    summary="Queue a batch of episodes for background generation",
+)
+async def submit_generate_batch(
+    story_id: int,
+    batch_size: int = Query(2, ge=1),
+    hinglish: bool = Query(False),
+    refinement_type: str = Query("ai", enum=["ai", "human"]),
+    job_service: JobService = Depends(get_job_service),
+    db: AsyncDBService = Depends(get_async_db_service),
+):
+    story_data = await db.get_story_header(story_id, with_state=False)
+    if "error" in story_data:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=story_data["error"])
+
+    if story_data.get("current_episode", 1) > story_data.get("num_episodes", 0):
+        return {"error": "All episodes generated"}
+
+    job = await run_in_threadpool(
+        job_service.submit, story_id, batch_size, hinglish, refinement_type
+    )
+    return job_response(job)
+
+
+@router.get(
+    "/{job_id}",
+    response_model=JobResponse,
+    summary="Get the status and progress of a generation job",
+)
+async def get_job(job_id: str, db: AsyncDBService = Depends(get_async_db_service)):
+    return job_response(await get_job_or_404(db, job_id))
+
+
+@router.get(
+    "/{job_id}/result",
+    response_model=EpisodeBatchResponse,
+    summary="Get the episodes produced by a finished generation job",
+)
+async def get_job_result(
+    job_id: str, db: AsyncDBService = Depends(get_async_db_service)
+):
+    job = await get_job_or_404(db, job_id)
+    if job["status"] not in TERMINAL_JOB_STATUSES:
+        raise HTTPException(
+            status_code=HTTP_409_CONFLICT, detail=f"Job is {job['status']}"
+        )
+    return {
+        "status": job["status"],
+        "episodes": job.get("result") or [],
+        "message": job.get("error"),
+    }
+
+
+@router.get(
+    "/{job_id}/events",
+    summary="Stream job status and progress as server-sent events",
+)
+async def stream_job_events(
+    job_id: str, db: AsyncDBService = Depends(get_async_db_service)
+):
+    await get_job_or_404(db, job_id)
+
+    async def events():
+        last = None
+        while True:
+            job = await db.get_job(job_id)
+            if not job:
+                return
+            payload = job_response(job)
+            if payload != last:
+                yield f"data: {json.dumps(payload)}\n\n"
+                last = payload
+            if job["status"] in TERMINAL_JOB_STATUSES:
+                return
+            await asyncio.sleep(settings.JOB_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@router.post(
+    "/{job_id}/cancel",
+    response_model=JobResponse,
+    summary="Stop a generation job after its current batch",
+)
+async def cancel_job(
+    job_id: str, job_service: JobService = Depends(get_job_service)
+):
+    try:
+        job = await run_in_threadpool(job_service.cancel, job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=str(e))
+    return job_response(job)
+
+
+@router.post(
+    "/{job_id}/resume",
+    response_model=JobResponse,
+    summary="Re-queue a cancelled, failed or abandoned generation job",
+)
+async def resume_job(
+    job_id: str, job_service: JobService = Depends(get_job_service)
+):
+    try:
+        job = await run_in_threadpool(job_service.resume, job_id)
+    except ValueError as e:
+        status = HTTP_404_NOT_FOUND if "not found" in str(e) else HTTP_409_CONFLICT
+        raise HTTPException(status_code=status, detail=str(e))
+    return job_response(job)
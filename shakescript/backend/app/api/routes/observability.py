@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+from app.core.metrics import metrics
+from app.core.tracing import tracer
+from typing import Any, Dict
+
+router = APIRouter(tags=["observability"])
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Process metrics in the Prometheus text format",
+)
+async def prometheus_metrics():
+    return PlainTextResponse(
+        metrics.render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@router.get(
+    "/traces",
+    summary="Recent request traces and per-stage latency percentiles",
+)
+async def recent_traces(limit: int = Query(20, ge=1, le=500)) -> Dict[str, Any]:
+    if tracer.memory is None:
+        return {"stages": [], "traces": []}
+    return {
+        "stages": tracer.memory.stage_stats(),
+        "traces": tracer.memory.traces(limit),
+    }
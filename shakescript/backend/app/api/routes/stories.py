@@ -8,7 +8,8 @@ from ...models.schemas import (
     EpisodeResponse,
 )
 from app.services.story_service import StoryService
-from app.api.dependencies import get_story_service
+from app.api.dependencies import get_story_service, get_async_db_service
+from app.services.async_db_service import AsyncDBService
 from typing import Annotated, Union, Dict, Any, List
 from app.utils import parse_user_prompt
 
@@ -39,6 +40,7 @@ def get_all_stories(service: StoryService = Depends(get_story_service)):
 )
 async def create_story(
     service: Annotated[StoryService, Depends(get_story_service)],
+    db: Annotated[AsyncDBService, Depends(get_async_db_service)],
     prompt: str = Body(..., description="Detailed story idea or prompt"),
     num_episodes: int = Body(..., description="Total number of episodes", ge=1),
     batch_size: int = Body(
@@ -54,7 +56,7 @@ async def create_story(
     if "error" in result:
         raise HTTPException(HTTP_400_BAD_REQUEST, detail=result["error"])
 
-    story_info = service.get_story_info(result["story_id"])
+    story_info = await db.get_story_info(result["story_id"])
     if "error" in story_info:
         raise HTTPException(HTTP_404_NOT_FOUND, detail=story_info["error"])
 
@@ -11,10 +11,58 @@ class Settings(BaseSettings):
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY")
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
-    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    GEMINI_MODEL: str = "gemini-2.0-flash"
+    LLM_CALL_TIMEOUT_SECONDS: int = 60
+    LLM_REQUESTS_PER_MINUTE: int = 2000  # per model; 0 disables the limit
+    LLM_TOKENS_PER_MINUTE: int = 4_000_000
+    LLM_ESTIMATED_OUTPUT_TOKENS: int = 1000  # reserved when max_output_tokens is unset
+    LLM_MAX_RETRIES: int = 4
+    LLM_RETRY_BASE_SECONDS: float = 1.0
+    LLM_RETRY_MAX_SECONDS: float = 30.0
+    VALIDATION_MAX_CONCURRENCY: int = 4
+    DB_MAX_CONCURRENCY: int = 20
+    DB_TIMEOUT_SECONDS: int = 10
+    STORY_SNAPSHOT_COMPACT_EVENTS: int = 20
+    STORY_CACHE_MAX_ENTRIES: int = 512
+    STORY_CACHE_TTL_SECONDS: int = 60
+    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"  # "onnx:<model>" for ONNX Runtime int8
+    EMBEDDING_ONNX_FILE: str = "onnx/model_quint8_avx2.onnx"
     VECTOR_DIMENSION: int = 384
+    EMBEDDING_TRANSPORT: str = "f4"  # f4, f2, i8 or text (needs sql/005 unless text)
+    EMBEDDING_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # 0 disables the cache
+    EMBEDDING_CACHE_PATH: str = ""  # e.g. .cache/embedding_cache.sqlite3
+    EMBEDDING_CACHE_DISK_MAX_BYTES: int = 512 * 1024 * 1024
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_NUM_THREADS: int = 0  # 0 keeps the torch / onnxruntime default
     CHUNK_SIZE: int = 500
     OVERLAP: int = 100
+    RETRIEVAL_CANDIDATE_MULTIPLIER: int = 4
+    RETRIEVAL_SIMILARITY_WEIGHT: float = 0.7
+    RETRIEVAL_IMPORTANCE_WEIGHT: float = 0.2
+    RETRIEVAL_RECENCY_WEIGHT: float = 0.1
+    RETRIEVAL_TIME_BUDGET_MS: int = 1500
+    CHUNK_INDEX_MAX_BYTES: int = 0  # in-process per-story vector index; 0 disables it
+    CHUNK_INDEX_TTL_SECONDS: int = 300
+    CHUNK_INDEX_HNSW_THRESHOLD: int = 20000  # chunks; smaller stories use brute force
+    EPISODE_SINGLE_CALL: bool = False
+    EPISODE_PIPELINE_DEPTH: int = 1  # episodes generated ahead of storage; 0 disables
+    PROMPT_BUDGET_PREVIOUS_EPISODES: int = 1500
+    PROMPT_BUDGET_RELEVANT_CONTEXT: int = 800
+    PROMPT_BUDGET_CHARACTERS: int = 800
+    PROMPT_BUDGET_KEY_EVENTS: int = 300
+    LLM_CACHE_BACKEND: str = "memory"  # memory, sqlite or none
+    LLM_CACHE_PATH: str = ".cache/llm_cache.sqlite3"
+    LLM_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.2  # and calls that pass cache=True
+    JOB_WORKERS: int = 2
+    JOB_POLL_SECONDS: float = 2
+    JOB_STALE_SECONDS: int = 900  # unfinished jobs idle this long can be resumed
+    PREWARM_MODELS: bool = True
+    TRACING_ENABLED: bool = True
+    TRACE_BUFFER_SPANS: int = 10000  # recent spans kept in memory for GET /traces
+    TRACE_EXPORT_PATH: str = ""  # e.g. .cache/traces.jsonl; one span per line
+    TRACING_OTEL: bool = False  # mirror spans to opentelemetry-api when installed
+    TRACING_PAYLOAD_SIZES: bool = False  # JSON-encodes every DB payload to size it
 
     class Config:
         env_file = ".env"
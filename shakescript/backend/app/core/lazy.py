@@ -0,0 +1,37 @@
+import threading
+from typing import Any, Callable
+
+
+class LazyComponent:
+    """
+    Stand-in for an expensive client or model that is only built the first
+    time something uses it (attribute access or get()). Building is
+    thread-safe and happens once; afterwards every attribute is forwarded
+    to the real object.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self._name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._loaded = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Any:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._value = self._factory()
+                    self._loaded = True
+        return self._value
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._loaded else "not loaded"
+        return f"<LazyComponent {self._name} ({state})>"
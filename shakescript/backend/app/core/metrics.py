@@ -0,0 +1,153 @@
+import bisect
+import threading
+from typing import Any, Dict, List, Tuple
+
+# Seconds; wide enough for DB round trips up to multi-minute LLM batches
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120,
+)
+
+
+class Metrics:
+    """
+    Minimal process-wide metrics registry: counters, gauges, summaries
+    (count / sum / max) and latency histograms, each optionally split by
+    labels.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple, float] = {}
+        self._gauges: Dict[Tuple, float] = {}
+        self._summaries: Dict[Tuple, Dict[str, float]] = {}
+        self._histograms: Dict[Tuple, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> Tuple:
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            summary = self._summaries.setdefault(
+                key, {"count": 0, "sum": 0.0, "max": value}
+            )
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def histogram(self, name: str, value: float, **labels) -> None:
+        """Record a duration in LATENCY_BUCKETS, so percentiles can be derived."""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                key, {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "count": 0, "sum": 0.0}
+            )
+            histogram["buckets"][bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+            histogram["count"] += 1
+            histogram["sum"] += value
+
+    def get(self, name: str, **labels) -> float:
+        key = self._key(name, labels)
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def snapshot(self) -> Dict[str, Any]:
+        def flatten(entries):
+            return {
+                name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+                for (name, labels), value in entries.items()
+            }
+
+        with self._lock:
+            return {
+                "counters": flatten(self._counters),
+                "gauges": flatten(self._gauges),
+                "summaries": flatten(
+                    {key: dict(value) for key, value in self._summaries.items()}
+                ),
+                "histograms": flatten(
+                    {
+                        key: {"count": value["count"], "sum": value["sum"]}
+                        for key, value in self._histograms.items()
+                    }
+                ),
+            }
+
+    def render_prometheus(self) -> str:
+        """
+        Prometheus text exposition format. Summaries become _count / _sum
+        plus a _max gauge; histograms get cumulative _bucket series.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            summaries = {key: dict(value) for key, value in self._summaries.items()}
+            histograms = {
+                key: {**value, "buckets": list(value["buckets"])}
+                for key, value in self._histograms.items()
+            }
+
+        lines: List[str] = []
+        typed = set()
+
+        def sample(name, labels, value, kind, family=None):
+            family = family or name
+            if family not in typed:
+                typed.add(family)
+                lines.append(f"# TYPE {family} {kind}")
+            lines.append(f"{name}{_prometheus_labels(labels)} {_prometheus_value(value)}")
+
+        for (name, labels), value in sorted(counters.items()):
+            sample(name, labels, value, "counter")
+        for (name, labels), value in sorted(gauges.items()):
+            sample(name, labels, value, "gauge")
+        for (name, labels), summary in sorted(summaries.items()):
+            sample(f"{name}_count", labels, summary["count"], "summary", name)
+            sample(f"{name}_sum", labels, summary["sum"], "summary", name)
+        for (name, labels), summary in sorted(summaries.items()):
+            sample(f"{name}_max", labels, summary["max"], "gauge")
+        for (name, labels), histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram["buckets"]):
+                cumulative += count
+                sample(
+                    f"{name}_bucket",
+                    labels + (("le", str(bound)),),
+                    cumulative,
+                    "histogram",
+                    name,
+                )
+            sample(f"{name}_count", labels, histogram["count"], "histogram", name)
+            sample(f"{name}_sum", labels, histogram["sum"], "histogram", name)
+        return "\n".join(lines) + "\n"
+
+
+def _prometheus_labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{k}="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _prometheus_value(value: float) -> str:
+    if isinstance(value, bool):
+        return str(int(value))
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = Metrics()
@@ -0,0 +1,288 @@
+"""
+In-process request tracing.
+
+Spans follow OpenTelemetry's model: a 128-bit trace id shared by every span
+of a request, 64-bit span ids, a parent span id, start / end times in Unix
+nanoseconds, flat attributes and an OK / ERROR status. The current span lives
+in a ContextVar, so it follows asyncio tasks and the thread pools that copy
+the caller's context.
+
+Finished spans are recorded in the span_duration_seconds histogram (labelled
+by span name) and handed to the exporters:
+
+    MemorySpanExporter   recent spans for GET /traces, with per-stage p50/p95
+    JsonlSpanExporter    one OTLP-style JSON object per line (TRACE_EXPORT_PATH)
+
+With TRACING_OTEL set and opentelemetry-api installed, spans are also
+mirrored to the globally configured OpenTelemetry tracer.
+"""
+
+import functools
+import inspect
+import json
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class Span:
+    recording = True
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "OK"
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._start = time.perf_counter()
+        self.duration = 0.0
+        self._otel = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+        if self._otel is not None:
+            self._otel.set_attribute(key, value)
+
+    def add(self, key: str, amount: float = 1) -> None:
+        """Accumulate a numeric attribute, e.g. round trips or bytes."""
+        self.set_attribute(key, self.attributes.get(key, 0) + amount)
+
+    def end(self) -> None:
+        self.duration = time.perf_counter() - self._start
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {
+                "code": "STATUS_CODE_ERROR" if self.status == "ERROR" else "STATUS_CODE_OK",
+                "message": self.error or "",
+            },
+        }
+
+
+class _NoopSpan:
+    """Handed out when tracing is disabled or no span is active."""
+
+    recording = False
+    trace_id = ""
+    span_id = ""
+    name = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def add(self, key: str, amount: float = 1) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+def record_db_query(span, query, result) -> None:
+    """
+    Round trip and row count of one query, plus its request / response
+    payload sizes when TRACING_PAYLOAD_SIZES is set; the sizes re-encode
+    both payloads, which costs as much as the query's own serialisation.
+    """
+    if not span.recording:
+        return
+    span.add("db.round_trips")
+    data = getattr(result, "data", None)
+    if data is not None:
+        span.add("db.rows", len(data) if isinstance(data, list) else 1)
+    if not settings.TRACING_PAYLOAD_SIZES:
+        return
+    body = getattr(query, "json", None)
+    if body:
+        span.add("db.request_bytes", len(json.dumps(body, default=str)))
+    if data is not None:
+        span.add("db.response_bytes", len(json.dumps(data, default=str)))
+
+
+class MemorySpanExporter:
+    """The most recent max_spans finished spans."""
+
+    def __init__(self, max_spans: int):
+        self._spans: "deque[Span]" = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def traces(self, limit: int) -> List[Dict[str, Any]]:
+        """The last limit root spans, newest first, each with its descendants."""
+        with self._lock:
+            spans = list(self._spans)
+        by_trace: Dict[str, List[Span]] = {}
+        for span in spans:
+            by_trace.setdefault(span.trace_id, []).append(span)
+        roots = [span for span in reversed(spans) if span.parent_id is None][:limit]
+        return [
+            {
+                "trace_id": root.trace_id,
+                "name": root.name,
+                "duration_ms": round(root.duration * 1000, 3),
+                "spans": [
+                    span.to_dict()
+                    for span in sorted(by_trace[root.trace_id], key=lambda s: s.start_ns)
+                ],
+            }
+            for root in roots
+        ]
+
+    def stage_stats(self) -> List[Dict[str, Any]]:
+        """Latency percentiles per span name over the buffer, slowest p95 first."""
+        with self._lock:
+            spans = list(self._spans)
+        durations: Dict[str, List[float]] = {}
+        for span in spans:
+            durations.setdefault(span.name, []).append(span.duration * 1000)
+        stats = []
+        for name, values in durations.items():
+            values.sort()
+            stats.append(
+                {
+                    "name": name,
+                    "count": len(values),
+                    "p50_ms": round(values[(len(values) - 1) // 2], 3),
+                    "p95_ms": round(values[int(0.95 * (len(values) - 1))], 3),
+                    "max_ms": round(values[-1], 3),
+                    "total_ms": round(sum(values), 3),
+                }
+            )
+        return sorted(stats, key=lambda s: -s["p95_ms"])
+
+
+class JsonlSpanExporter:
+    """Appends each finished span to path as one JSON line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+
+class Tracer:
+    def __init__(self, enabled: bool, exporters: List[Any], use_otel: bool = False):
+        self.enabled = enabled
+        self.exporters = exporters
+        self.memory = next(
+            (e for e in exporters if isinstance(e, MemorySpanExporter)), None
+        )
+        self._otel = None
+        if use_otel:
+            try:
+                from opentelemetry import trace as otel_trace
+
+                self._otel = otel_trace.get_tracer("shakescript")
+            except ImportError:
+                print("TRACING_OTEL is set but opentelemetry-api is not installed")
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        parent = _current.get()
+        trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        span = Span(name, trace_id, parent.span_id if parent else None, attributes)
+        token = _current.set(span)
+        otel_scope = None
+        if self._otel is not None:
+            otel_scope = self._otel.start_as_current_span(name, attributes=attributes)
+            span._otel = otel_scope.__enter__()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "ERROR"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+            if otel_scope is not None:
+                otel_scope.__exit__(None, None, None)
+            self._finish(span)
+
+    def traced(self, name: str) -> Callable:
+        """Decorator running a function (sync or async) inside a span."""
+
+        def decorate(fn: Callable) -> Callable:
+            if inspect.iscoroutinefunction(fn):
+
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return await fn(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    def trace_methods(self, prefix: str) -> Callable[[type], type]:
+        """Class decorator putting every public method in a "<prefix>.<method>" span."""
+
+        def decorate(cls: type) -> type:
+            for attr, value in list(vars(cls).items()):
+                if attr.startswith("_") or not inspect.isfunction(value):
+                    continue
+                setattr(cls, attr, self.traced(f"{prefix}.{attr}")(value))
+            return cls
+
+        return decorate
+
+    def _finish(self, span: Span) -> None:
+        metrics.histogram("span_duration_seconds", span.duration, span=span.name)
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"Exporting span {span.name} failed: {e}")
+
+
+def _build_exporters() -> List[Any]:
+    exporters: List[Any] = [MemorySpanExporter(settings.TRACE_BUFFER_SPANS)]
+    if settings.TRACE_EXPORT_PATH:
+        exporters.append(JsonlSpanExporter(settings.TRACE_EXPORT_PATH))
+    return exporters
+
+
+tracer = Tracer(settings.TRACING_ENABLED, _build_exporters(), settings.TRACING_OTEL)
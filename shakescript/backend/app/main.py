@@ -1,8 +1,26 @@
-from fastapi import FastAPI, APIRouter
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import stories, episodes, embeddings, search
+from app.api.routes import stories, episodes, embeddings, search, jobs, observability
+from app.core.config import settings
+from app.core.tracing import tracer
+from app.services.container import ServiceContainer
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build every shared client and service once for the whole process
+    app.state.container = ServiceContainer()
+    await app.state.container.init_async_services()
+    app.state.container.report_init_times()
+    if settings.PREWARM_MODELS:
+        # Start accepting traffic now; the models finish loading behind it
+        app.state.container.prewarm_in_background()
+    yield
+    app.state.container.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -13,14 +31,41 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Root span per request. It is renamed to the matched route template once
+    routing is done, even when the handler raises, so span names (and metric
+    labels) stay low-cardinality. A streamed body is still being sent when
+    the span ends.
+    """
+    with tracer.span(
+        f"{request.method} {request.url.path}",
+        **{"http.method": request.method, "http.target": request.url.path},
+    ) as span:
+        try:
+            response = await call_next(request)
+        finally:
+            if span.recording:
+                route = request.scope.get("route")
+                span.name = f"{request.method} {getattr(route, 'path', 'unmatched')}"
+        if span.recording:
+            span.set_attribute("http.status_code", response.status_code)
+            response.headers["X-Trace-Id"] = span.trace_id
+        return response
+
+
 api_router = APIRouter(prefix="/api/v1")
 
 api_router.include_router(stories.router, tags=["stories"])
 api_router.include_router(episodes.router, tags=["episodes"])
+api_router.include_router(jobs.router, tags=["jobs"])
 # api_router.include_router(embeddings.router, prefix="/embeddings", tags=["embeddings"])
 # api_router.include_router(search.router, prefix="/search", tags=["search"])
 
 app.include_router(api_router)
+app.include_router(observability.router)
 
 @app.get("/")
 async def root():
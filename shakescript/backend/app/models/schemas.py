@@ -74,3 +74,11 @@ class EpisodeBatchResponse(BaseModel):
 
     class Config:
         arbitrary_types_allowed = True 
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    story_id: int
+    status: str
+    progress: List[Dict[str, Any]] = []
+    error: Optional[str] = None
@@ -1,5 +1,3 @@
-import google.generativeai as genai
-from openai import OpenAI
 from app.core.config import settings
 from app.services.ai_service.instructions import AIInstructions
 from app.services.ai_service.generation import AIGeneration
@@ -12,29 +10,47 @@ from app.services.ai_service.validation import (
     generate_episode_title,
 )
 from app.services.embedding_service import EmbeddingService
-from typing import Dict, List, Any, Optional
+from typing import TYPE_CHECKING, Dict, Iterator, List, Any, Optional
 import json
 
+if TYPE_CHECKING:
+    import google.generativeai as genai
+    from openai import OpenAI
+
 
 class AIService:
-    def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
-        self.openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.embedding_service = EmbeddingService()
+    def __init__(
+        self,
+        model: "genai.GenerativeModel",
+        openai_client: "OpenAI",
+        embedding_service: EmbeddingService,
+    ):
+        self.model = model
+        self.openai_client = openai_client
+        self.embedding_service = embedding_service
         self.instructions = AIInstructions()
         self.generation = AIGeneration(self.model, self.embedding_service)
         self.utils = AIUtils()
 
     def call_llm(
-        self, prompt: str, max_tokens: int = 1000, temperature: float = 0.7
+        self,
+        prompt: str,
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+        cache: bool = False,
     ) -> str:
         """
-        Call the Gemini language model with the given prompt.
+        Call the Gemini language model with the given prompt. cache=True lets
+        the LLM cache answer repeated identical calls.
         """
-        # Adjust temperature and max_tokens as needed for Gemini
+        # Adjust max_tokens as needed for Gemini
         instruction = prompt
-        first_response = self.model.generate_content(instruction)
+        first_response = self.model.generate_content(
+            instruction,
+            generation_config={"temperature": temperature},
+            request_options={"timeout": settings.LLM_CALL_TIMEOUT_SECONDS},
+            cache=cache,
+        )
         return first_response.text
 
     def extract_metadata(
@@ -66,6 +82,28 @@ class AIService:
             feedback,
         )
 
+    def stream_episode_helper(
+        self,
+        num_episodes: int,
+        metadata: Dict,
+        episode_number: int,
+        char_text: str,
+        story_id: int,
+        prev_episodes: List = [],
+        hinglish: bool = False,
+        feedback: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        return self.generation.stream_episode_helper(
+            num_episodes,
+            metadata,
+            episode_number,
+            char_text,
+            story_id,
+            prev_episodes,
+            hinglish,
+            feedback,
+        )
+
     def validate_batch(
         self,
         story_id: int,
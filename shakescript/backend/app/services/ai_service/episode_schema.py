@@ -0,0 +1,147 @@
+from typing import Any, Dict
+from app.utils.json_repair import extract_json
+
+# Gemini response schemas cannot describe free-form maps, so Relationship and
+# Settings come back as lists of pairs and are folded into dicts afterwards.
+_CHARACTER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "Name": {"type": "string"},
+        "Role": {"type": "string"},
+        "Description": {"type": "string"},
+        "Relationship": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "Character_Name": {"type": "string"},
+                    "Relation": {"type": "string"},
+                },
+                "required": ["Character_Name", "Relation"],
+            },
+        },
+        "role_active": {"type": "boolean"},
+        "Emotional_State": {"type": "string"},
+    },
+    "required": [
+        "Name",
+        "Role",
+        "Description",
+        "Relationship",
+        "role_active",
+        "Emotional_State",
+    ],
+}
+
+EPISODE_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "episode_title": {"type": "string"},
+        "episode_content": {"type": "string"},
+        "episode_summary": {"type": "string"},
+        "episode_emotional_state": {"type": "string"},
+        "characters_featured": {"type": "array", "items": _CHARACTER_SCHEMA},
+        "Key Events": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "event": {"type": "string"},
+                    "tier": {
+                        "type": "string",
+                        "enum": [
+                            "foundational",
+                            "character-defining",
+                            "transitional",
+                            "contextual",
+                        ],
+                    },
+                },
+                "required": ["event", "tier"],
+            },
+        },
+        "Settings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "Place": {"type": "string"},
+                    "Description": {"type": "string"},
+                },
+                "required": ["Place", "Description"],
+            },
+        },
+    },
+    "required": [
+        "episode_title",
+        "episode_content",
+        "episode_summary",
+        "episode_emotional_state",
+        "characters_featured",
+        "Key Events",
+        "Settings",
+    ],
+}
+
+EPISODE_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": EPISODE_RESPONSE_SCHEMA,
+}
+
+
+def single_call_output_format(hinglish: bool) -> str:
+    """Output block for a prompt that asks for the episode and its details at once."""
+    language = (
+        """
+        - Write episode_title and episode_content in Hinglish. Dont use any english word unless it becomes a necessity.
+        - Keep every other field in English."""
+        if hinglish
+        else ""
+    )
+    return f"""
+        After writing the episode, record everything needed to write the next one by just reading it:
+        - episode_summary: summarize concisely (50-70 words) with vivid language.
+        - episode_emotional_state: the emotional state reflecting the tone.
+        - characters_featured: update the Character Snapshot based on the content (emotional state, relationships).
+        - Key Events: identify 1-3; tag as 'foundational' if they shift the story significantly, 'character-defining' if they develop a character.
+        - Settings: the places used in this episode.{language}
+
+        - Output STRICTLY a JSON object matching the response schema with NO additional text.
+        """
+
+
+def episode_from_structured_response(
+    response_text: str, episode_number: int
+) -> Dict[str, Any]:
+    """
+    Parse a schema-constrained response into the dict the two-call path
+    produces. Raises ValueError if the response is unusable.
+    """
+    data = extract_json(response_text)
+    if not isinstance(data, dict) or not data.get("episode_content"):
+        raise ValueError("Structured episode response has no episode_content")
+
+    characters = []
+    for char in data.get("characters_featured") or []:
+        char = dict(char)
+        char["Relationship"] = {
+            rel.get("Character_Name", ""): rel.get("Relation", "")
+            for rel in char.get("Relationship") or []
+            if isinstance(rel, dict)
+        }
+        characters.append(char)
+
+    return {
+        "episode_number": episode_number,
+        "episode_title": data.get("episode_title") or f"Episode {episode_number}",
+        "episode_content": data["episode_content"],
+        "episode_summary": data.get("episode_summary", ""),
+        "episode_emotional_state": data.get("episode_emotional_state", "neutral"),
+        "characters_featured": characters,
+        "Key Events": data.get("Key Events") or [],
+        "Settings": {
+            setting.get("Place", ""): setting.get("Description", "")
+            for setting in data.get("Settings") or []
+            if isinstance(setting, dict)
+        },
+    }
@@ -1,9 +1,28 @@
 import json
 import re
-from typing import Dict, List, Any, Optional
+import time
+from typing import Dict, Generator, Iterator, List, Any, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.tracing import tracer
+from app.services.ai_service.streaming import JsonFieldStream, stream_text
+from app.services.ai_service.episode_schema import (
+    EPISODE_GENERATION_CONFIG,
+    single_call_output_format,
+    episode_from_structured_response,
+)
+from app.services.ai_service.prompt_builder import EpisodePromptBudget
 from app.services.ai_service.utils import AIUtils
 from app.services.embedding_service import EmbeddingService
 
+EPISODE_OUTPUT_FORMAT = """
+        - Output STRICTLY a valid JSON object with NO additional text:
+        {
+          "episode_title": "A descriptive, Pronounceable Title",
+          "episode_content": "An immersive episode with compelling storytelling and varied style."
+        }
+        """
+
 
 class AIGeneration:
     def __init__(self, model, embedding_service: EmbeddingService):
@@ -11,6 +30,7 @@ class AIGeneration:
         self.embedding_service = embedding_service
         self.utils = AIUtils()
 
+    @tracer.traced("episode.generate")
     def generate_episode_helper(
         self,
         num_episodes: int,
@@ -22,6 +42,181 @@ class AIGeneration:
         hinglish: bool = False,
         feedback: Optional[str] = None,
     ) -> Dict[str, Any]:
+        if settings.EPISODE_SINGLE_CALL:
+            episode = self._generate_episode_single_call(
+                num_episodes,
+                metadata,
+                episode_number,
+                char_text,
+                story_id,
+                prev_episodes,
+                hinglish,
+                feedback,
+            )
+            if episode:
+                return episode
+
+        instruction, char_snapshot, chunks_text = self.build_episode_prompt(
+            num_episodes,
+            metadata,
+            episode_number,
+            char_text,
+            story_id,
+            prev_episodes,
+            feedback,
+        )
+        first_response = self.model.generate_content(instruction)
+        title_content_data = self.utils._parse_episode_response(first_response.text, metadata)
+        if hinglish:
+            title_content_data = self.hinglish_conversion(title_content_data["episode_content"], title_content_data["episode_title"])
+
+        return self.extract_episode_details(
+            metadata, episode_number, title_content_data, char_snapshot, chunks_text
+        )
+
+    def _generate_episode_single_call(
+        self,
+        num_episodes: int,
+        metadata: Dict[str, Any],
+        episode_number: int,
+        char_text: str,
+        story_id: int,
+        prev_episodes: List[Dict[str, Any]],
+        hinglish: bool,
+        feedback: Optional[str],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Write the episode and extract its details (and translate it, for
+        Hinglish) in one schema-constrained call. Returns None on failure so
+        the caller can fall back to the two-call path.
+        """
+        instruction, _, _ = self.build_episode_prompt(
+            num_episodes,
+            metadata,
+            episode_number,
+            char_text,
+            story_id,
+            prev_episodes,
+            feedback,
+            single_call_output_format(hinglish),
+        )
+        try:
+            response = self.model.generate_content(
+                instruction,
+                generation_config=EPISODE_GENERATION_CONFIG,
+                request_options={"timeout": settings.LLM_CALL_TIMEOUT_SECONDS},
+            )
+            return episode_from_structured_response(response.text, episode_number)
+        except Exception as e:
+            print(f"Single-call generation failed for episode {episode_number}: {e}")
+            metrics.inc("episode_single_call_fallbacks_total")
+            return None
+
+    def stream_episode_helper(
+        self,
+        num_episodes: int,
+        metadata: Dict[str, Any],
+        episode_number: int,
+        char_text: str,
+        story_id: int,
+        prev_episodes: List[Dict[str, Any]] = [],
+        hinglish: bool = False,
+        feedback: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming variant of generate_episode_helper. Yields
+        {"event": "token", "data": text} as episode_content is generated,
+        then one {"event": "episode", "data": episode} once the details call
+        has finished. For Hinglish the English draft is streamed first and a
+        {"event": "reset"} precedes the streamed translation.
+
+        With EPISODE_SINGLE_CALL the details (and translation) come from the
+        same streamed call; if that response cannot be parsed, the details
+        call runs on the streamed content instead.
+        """
+        single_call = settings.EPISODE_SINGLE_CALL
+        instruction, char_snapshot, chunks_text = self.build_episode_prompt(
+            num_episodes,
+            metadata,
+            episode_number,
+            char_text,
+            story_id,
+            prev_episodes,
+            feedback,
+            single_call_output_format(hinglish) if single_call else None,
+        )
+        raw_text = yield from self._stream_episode_content(
+            instruction, EPISODE_GENERATION_CONFIG if single_call else None
+        )
+        if single_call:
+            try:
+                episode = episode_from_structured_response(raw_text, episode_number)
+                yield {"event": "episode", "data": episode}
+                return
+            except Exception as e:
+                print(f"Single-call generation failed for episode {episode_number}: {e}")
+                metrics.inc("episode_single_call_fallbacks_total")
+                hinglish = False
+        title_content_data = self.utils._parse_episode_response(raw_text, metadata)
+        if hinglish:
+            yield {"event": "reset"}
+            raw_text = yield from self._stream_episode_content(
+                self._hinglish_instruction(
+                    title_content_data["episode_content"],
+                    title_content_data["episode_title"],
+                )
+            )
+            title_content_data = self.utils._parse_episode_response(raw_text, {})
+
+        yield {
+            "event": "episode",
+            "data": self.extract_episode_details(
+                metadata, episode_number, title_content_data, char_snapshot, chunks_text
+            ),
+        }
+
+    def _stream_episode_content(
+        self, instruction: str, generation_config: Optional[Dict[str, Any]] = None
+    ) -> Generator[Dict[str, Any], None, str]:
+        """Yield episode_content tokens and return the full raw response text."""
+        field = JsonFieldStream("episode_content")
+        raw_parts = []
+        start = time.perf_counter()
+        response = self.model.generate_content(
+            instruction,
+            stream=True,
+            generation_config=generation_config,
+            request_options={"timeout": settings.LLM_CALL_TIMEOUT_SECONDS},
+        )
+        for text in stream_text(response):
+            raw_parts.append(text)
+            token = field.feed(text)
+            if token:
+                if start is not None:
+                    metrics.observe(
+                        "llm_time_to_first_token_seconds", time.perf_counter() - start
+                    )
+                    start = None
+                yield {"event": "token", "data": token}
+        return "".join(raw_parts)
+
+    @tracer.traced("prompt.build")
+    def build_episode_prompt(
+        self,
+        num_episodes: int,
+        metadata: Dict[str, Any],
+        episode_number: int,
+        char_text: str,
+        story_id: int,
+        prev_episodes: List[Dict[str, Any]] = [],
+        feedback: Optional[str] = None,
+        output_format: Optional[str] = None,
+    ) -> Tuple[str, str, str]:
+        """
+        Build the episode instruction. Returns (instruction, char_snapshot,
+        chunks_text); the last two are reused by extract_episode_details.
+        output_format replaces the default title/content output block.
+        """
         settings_data = (
             "\n".join(
                 f"{place}: {description}"
@@ -30,21 +225,15 @@ class AIGeneration:
             or "No settings provided. Build your own."
         )
 
-        prev_episodes_text = (
-            "\n\n".join(
-                f"EPISODE {ep.get('episode_number', 'N/A')}\nCONTENT: {ep.get('content', 'No content')}\nTITLE: {ep.get('title', 'No title')}"
-                for ep in prev_episodes[-3:]
+        budget = EpisodePromptBudget()
+        prev_episodes_text = budget.fit_previous_episodes(prev_episodes)
+        chunks_text = budget.fit_relevant_context(
+            self.embedding_service.retrieve_relevant_chunks(
+                story_id,
+                prev_episodes_text or char_text,
+                k=5,
+                before_episode=_retrieval_cutoff(episode_number, prev_episodes),
             )
-            or "First Episode"
-        )
-        chunks_text = (
-            "\n\n".join(
-                f"RELEVANT CONTEXT: {chunk['content']}"
-                for chunk in self.embedding_service.retrieve_relevant_chunks(
-                    story_id, prev_episodes_text or char_text, k=5
-                )
-            )
-            or ""
         )
         
         try:
@@ -54,17 +243,7 @@ class AIGeneration:
         except json.JSONDecodeError:
             characters = []
 
-        char_snapshot = (
-            "\n".join(
-                f"Name: {char.get('Name')}, Role: {char.get('Role', 'Unknown')}, "
-                f"Description: {char.get('Description', 'No description available')}, "
-                f"Relationships: {json.dumps(char.get('Relationship', {}))}, "
-                f"Active: {'Yes' if char.get('role_active', True) else 'No'}, "
-                f"Emotional State: {char.get('Emotional_State', 'Unknown')}"
-                for char in characters
-            )
-            or "No characters introduced yet."
-        )
+        char_snapshot = budget.fit_characters(characters)
 
         story_outline = metadata.get("story_outline", [])
         episode_info = current_phase = next_phase = ""
@@ -95,8 +274,10 @@ class AIGeneration:
         {self._get_phase_description(current_phase)}"""
 
         PHASE_INFORMATION = ( transition_guide if end == episode_number and next_phase != current_phase else phase_description)
-        key_events_summary = self._summarize_key_events(
-            metadata.get("key_events", []), characters, episode_info
+        key_events_summary = budget.fit_key_events(
+            self._summarize_key_events(
+                metadata.get("key_events", []), characters, episode_info
+            )
         )
 
         general_pts = """
@@ -169,21 +350,25 @@ class AIGeneration:
         <Key_Events>
         {key_events_summary}
         </Key_Events>
-
-        - Output STRICTLY a valid JSON object with NO additional text:
-        {{
-          "episode_title": "A descriptive, Pronounceable Title",
-          "episode_content": "An immersive episode with compelling storytelling and varied style."
-        }}
-        """
+        {output_format or EPISODE_OUTPUT_FORMAT}"""
         if feedback:
             instruction += f"\nStrictly follow this : Apply the following REFINEMENT based on feedback:\n{feedback}"
+        budget.report(instruction, episode_number)
+        return instruction, char_snapshot, chunks_text
 
-        first_response = self.model.generate_content(instruction)
-        title_content_data = self.utils._parse_episode_response(first_response.text, metadata)
-        if hinglish:
-            title_content_data = self.hinglish_conversion(title_content_data["episode_content"], title_content_data["episode_title"])
-
+    @tracer.traced("episode.extract_details")
+    def extract_episode_details(
+        self,
+        metadata: Dict[str, Any],
+        episode_number: int,
+        title_content_data: Dict[str, Any],
+        char_snapshot: str,
+        chunks_text: str,
+    ) -> Dict[str, Any]:
+        """
+        Second call: pull summary, character updates and key events out of
+        the written episode and merge them into the complete episode dict.
+        """
         details_instruction = f"""
         I have written episode {episode_number} for the story "{metadata.get('title', 'Untitled Story')}".
         Title: 
@@ -222,7 +407,13 @@ class AIGeneration:
         return self.utils._parse_episode_response(json.dumps(complete_episode), metadata)
 
     def hinglish_conversion(self, ep_content, ep_title)->Dict[str, Any]:
-        instruction = f"""
+        reposne = self.model.generate_content(
+            self._hinglish_instruction(ep_content, ep_title)
+        )
+        return self.utils._parse_episode_response(reposne.text, {})
+
+    def _hinglish_instruction(self, ep_content, ep_title) -> str:
+        return f"""
         I want your help in converting one of my story's episode to Hinglish.
         EPISODE TITLE:
         {ep_title}
@@ -241,9 +432,6 @@ class AIGeneration:
         }}
         """
 
-        reposne = self.model.generate_content(instruction)
-        return self.utils._parse_episode_response(reposne.text, {})
-
     def _summarize_key_events(
         self, key_events: List[str], characters: List[Dict[str, Any]], episode_info: str
     ) -> str:
@@ -321,3 +509,15 @@ class AIGeneration:
                 """
         }
         return transition_guides.get(f"{current_phase}-{next_phase}", "")
+
+
+def _retrieval_cutoff(episode_number: int, prev_episodes: List[Dict[str, Any]]) -> int:
+    """
+    Retrieve chunks only from episodes before this number. The previous
+    episodes' text is already in the prompt, and while pipelined generation
+    runs, the EPISODE_PIPELINE_DEPTH + 1 episodes before this one may not be
+    stored yet. Excluding both on every path keeps the prompt independent of
+    how far storage has got.
+    """
+    numbers = [ep["episode_number"] for ep in prev_episodes if ep.get("episode_number")]
+    return min([episode_number - settings.EPISODE_PIPELINE_DEPTH - 1, *numbers])
@@ -1,8 +1,7 @@
 from app.services.ai_service.utils import AIUtils
-from app.utils import parse_user_prompt
+from app.utils import extract_json, parse_user_prompt
 import json
 from typing import Dict
-import re
 
 
 class AIInstructions:
@@ -75,10 +74,4 @@ class AIInstructions:
         {json.dumps(metadata_template, indent=2)}
         """
         response = model.generate_content(instruction)
-        raw_text = response.text
-        if "```" in raw_text:
-            json_pattern = r"(?:json)?\s*\n(.*?)\n```"
-            matches = re.findall(json_pattern, raw_text, re.DOTALL)
-            if matches:
-                raw_text = matches[0]
-        return json.loads(raw_text)
+        return extract_json(response.text)
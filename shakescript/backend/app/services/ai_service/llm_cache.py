@@ -0,0 +1,112 @@
+import hashlib
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+from app.core.metrics import metrics
+from app.core.tracing import current_span
+
+
+class CachedResponse:
+    """Stand-in for a generate_content response served from the cache."""
+
+    def __init__(self, text: str, prompt_tokens: int, output_tokens: int):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        )
+
+
+class CachedGenerativeModel:
+    """
+    Wraps a GenerativeModel so identical generate_content calls are answered
+    from a cache backend. Entries are keyed on the model name, the prompt and
+    the generation config; request_options (timeouts) do not affect the key.
+
+    A call is cached when it passes cache=True (the validation quality check
+    and episode titles do) or sets a temperature of at most max_temperature
+    (the consistency check). The cache flag is never forwarded. Streaming
+    calls and all other calls, including every episode and metadata call,
+    are passed straight through: retries and regenerations rely on getting
+    a fresh answer, and an unparseable response must not be replayed.
+    """
+
+    def __init__(self, model, backend, model_name: str, max_temperature: float):
+        self.model = model
+        self.backend = backend
+        self.model_name = model_name
+        self.max_temperature = max_temperature
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+    def generate_content(
+        self,
+        contents,
+        generation_config: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
+        cache: bool = False,
+        **kwargs,
+    ):
+        if stream or not (cache or self._cacheable(generation_config)):
+            metrics.inc("llm_cache_requests_total", result="bypass")
+            return self.model.generate_content(
+                contents, generation_config=generation_config, stream=stream, **kwargs
+            )
+
+        key = self.cache_key(contents, generation_config)
+        cached = self.backend.get(key)
+        if cached is not None:
+            entry = json.loads(cached)
+            metrics.inc("llm_cache_requests_total", result="hit")
+            current_span().add("llm.cache_hits")
+            metrics.inc(
+                "llm_cache_tokens_saved_total", entry["prompt_tokens"], kind="prompt"
+            )
+            metrics.inc(
+                "llm_cache_tokens_saved_total", entry["output_tokens"], kind="output"
+            )
+            return CachedResponse(
+                entry["text"], entry["prompt_tokens"], entry["output_tokens"]
+            )
+
+        metrics.inc("llm_cache_requests_total", result="miss")
+        response = self.model.generate_content(
+            contents, generation_config=generation_config, **kwargs
+        )
+        # .text raises for blocked or empty responses; those are not cached
+        text = response.text
+        usage = getattr(response, "usage_metadata", None)
+        self.backend.set(
+            key,
+            json.dumps(
+                {
+                    "text": text,
+                    "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+                    "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+                }
+            ).encode("utf-8"),
+        )
+        return response
+
+    def cache_key(self, contents, generation_config: Optional[Dict[str, Any]]) -> str:
+        payload = json.dumps(
+            {
+                "model": self.model_name,
+                "contents": contents,
+                "generation_config": generation_config,
+            },
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _cacheable(self, generation_config: Optional[Dict[str, Any]]) -> bool:
+        if not generation_config:
+            return False
+        if isinstance(generation_config, dict):
+            temperature = generation_config.get("temperature")
+        else:
+            temperature = getattr(generation_config, "temperature", None)
+        return temperature is not None and temperature <= self.max_temperature
@@ -0,0 +1,262 @@
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from app.core.metrics import metrics
+from app.core.tracing import current_span, tracer
+from app.services.ai_service.prompt_builder import count_tokens
+
+# Lower value is served first. HTTP requests run as "interactive"; the job
+# workers switch to "batch" so a user waiting on a refine is not queued
+# behind background generation.
+PRIORITIES = {"interactive": 0, "batch": 1}
+_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# google.api_core and openai exception names, matched by name so neither SDK
+# has to be imported here
+RETRYABLE_ERRORS = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "DeadlineExceeded",
+    "InternalServerError",
+    "RateLimitError",
+    "ResourceExhausted",
+    "ServiceUnavailable",
+    "TooManyRequests",
+}
+
+
+@contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    """Run the LLM calls made inside the block at the given priority."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority {priority!r}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts and 5xx responses; not bad requests or blocked prompts."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    for attr in ("code", "status_code"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+            return True
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+class TokenBucket:
+    """per_minute units of capacity, refilled continuously."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # A single request larger than the bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        # May go negative when usage is corrected upwards; later calls wait it off
+        self.tokens -= amount
+
+
+class LLMGateway:
+    """
+    Shared admission control for one model: token buckets for requests and
+    tokens per minute, a wait queue ordered by priority then arrival, and
+    retries with full-jitter exponential backoff for 429s and transient
+    errors. Limits of 0 disable that bucket.
+
+    Priority is strict: batch calls only start while no interactive call is
+    waiting.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_retries: int,
+        retry_base_seconds: float,
+        retry_max_seconds: float,
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._cond = threading.Condition()
+        self._waiting: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def limits_tokens(self) -> bool:
+        return self._tokens is not None
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0) -> Any:
+        attempt = 0
+        while True:
+            self._acquire(estimated_tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    metrics.inc("llm_gateway_failures_total", model=self.name)
+                    raise
+                delay = random.uniform(
+                    0, min(self.retry_max_seconds, self.retry_base_seconds * 2**attempt)
+                )
+                attempt += 1
+                metrics.inc(
+                    "llm_gateway_retries_total", model=self.name, error=type(e).__name__
+                )
+                current_span().add("llm.retries")
+                print(
+                    f"LLM call to {self.name} failed ({type(e).__name__}: {e}), "
+                    f"retry {attempt}/{self.max_retries} in {delay:.1f} s"
+                )
+                time.sleep(delay)
+                continue
+            metrics.inc("llm_gateway_requests_total", model=self.name)
+            return result
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Charge the token bucket for the difference once usage is known."""
+        if self._tokens is None or not actual_tokens:
+            return
+        with self._cond:
+            self._tokens.take(actual_tokens - estimated_tokens)
+            self._cond.notify_all()
+
+    def _acquire(self, tokens: int) -> None:
+        if self._requests is None and self._tokens is None:
+            return
+        priority = current_priority()
+        ticket = (PRIORITIES[priority], next(self._sequence))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            metrics.set("llm_gateway_queue_depth", len(self._waiting), model=self.name)
+            try:
+                while True:
+                    if self._waiting[0] != ticket:
+                        self._cond.wait()
+                        continue
+                    delay = self._delay(tokens)
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            if self._requests is not None:
+                self._requests.take(1)
+            if self._tokens is not None:
+                self._tokens.take(tokens)
+            metrics.set("llm_gateway_queue_depth", len(self._waiting), model=self.name)
+            self._cond.notify_all()
+        waited = time.monotonic() - start
+        metrics.observe(
+            "llm_gateway_wait_seconds", waited, model=self.name, priority=priority
+        )
+        current_span().add("llm.queue_wait_seconds", waited)
+
+    def _delay(self, tokens: int) -> float:
+        delay = 0.0
+        if self._requests is not None:
+            delay = self._requests.wait_time(1)
+        if self._tokens is not None:
+            delay = max(delay, self._tokens.wait_time(tokens))
+        return delay
+
+
+class RateLimitedModel:
+    """
+    Wraps a GenerativeModel so every generate_content call goes through an
+    LLMGateway. The token estimate is the prompt plus max_output_tokens
+    (or default_output_tokens) and is corrected from usage_metadata once the
+    response arrives. A streamed response is admitted and retried as a
+    whole call; errors while iterating it are not retried.
+    """
+
+    def __init__(self, model, gateway: LLMGateway, default_output_tokens: int):
+        self.model = model
+        self.gateway = gateway
+        self.default_output_tokens = default_output_tokens
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+    def generate_content(
+        self,
+        contents,
+        generation_config: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
+        cache: bool = False,  # CachedGenerativeModel's opt-in; not forwarded
+        **kwargs,
+    ):
+        with tracer.span(
+            "llm.generate_content",
+            **{
+                "llm.model": self.gateway.name,
+                "llm.priority": current_priority(),
+                "llm.stream": stream,
+            },
+        ) as span:
+            estimate = (
+                self._estimate_tokens(contents, generation_config)
+                if self.gateway.limits_tokens
+                else 0
+            )
+            response = self.gateway.call(
+                lambda: self.model.generate_content(
+                    contents, generation_config=generation_config, stream=stream, **kwargs
+                ),
+                estimate,
+            )
+            if not stream:
+                # A streamed call's span ends when the stream opens
+                usage = getattr(response, "usage_metadata", None)
+                prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+                output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+                span.set_attribute("llm.prompt_tokens", prompt_tokens)
+                span.set_attribute("llm.output_tokens", output_tokens)
+                self.gateway.record_usage(
+                    estimate, getattr(usage, "total_token_count", 0) or 0
+                )
+            return response
+
+    def _estimate_tokens(self, contents, generation_config) -> int:
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, default=repr)
+        if isinstance(generation_config, dict):
+            output = generation_config.get("max_output_tokens")
+        else:
+            output = getattr(generation_config, "max_output_tokens", None)
+        return count_tokens(prompt) + (output or self.default_output_tokens)
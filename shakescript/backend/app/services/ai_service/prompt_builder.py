@@ -0,0 +1,170 @@
+import json
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.tracing import current_span
+
+_ENCODING: Any = False  # not loaded yet
+
+
+def _encoding() -> Any:
+    """tiktoken's encoding, loaded on first use; None when unavailable."""
+    global _ENCODING
+    if _ENCODING is False:
+        try:
+            import tiktoken
+
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # Fall back to the ~4 characters per token rule of thumb
+            _ENCODING = None
+    return _ENCODING
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    """Cut text to about max_tokens, keeping its start (or its end)."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        kept = tokens[-max_tokens:] if keep_end else tokens[:max_tokens]
+        text = encoding.decode(kept)
+    else:
+        text = text[-max_tokens * 4 :] if keep_end else text[: max_tokens * 4]
+    return f"...{text}" if keep_end else f"{text}..."
+
+
+class EpisodePromptBudget:
+    """
+    Token budgets for the variable sections of the episode prompt. Each
+    fit_* method renders one section within its budget, dropping or
+    shortening the least valuable material first, and records how many
+    tokens the section ended up using.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None):
+        self.budgets = budgets or {
+            "previous_episodes": settings.PROMPT_BUDGET_PREVIOUS_EPISODES,
+            "relevant_context": settings.PROMPT_BUDGET_RELEVANT_CONTEXT,
+            "characters": settings.PROMPT_BUDGET_CHARACTERS,
+            "key_events": settings.PROMPT_BUDGET_KEY_EVENTS,
+        }
+        self.usage: Dict[str, int] = {}
+
+    def fit_previous_episodes(self, prev_episodes: List[Dict[str, Any]]) -> str:
+        """
+        The latest episode is reserved first and kept in full unless it alone
+        exceeds the budget, in which case it is cut from the front so the
+        ending, which the next episode continues from, survives. Older
+        episodes share what is left: each is replaced by its summary when one
+        is available and cut to at most half of the remainder.
+        """
+        episodes = prev_episodes[-3:]
+        if not episodes:
+            return self._record("previous_episodes", "First Episode")
+
+        remaining = self.budgets["previous_episodes"]
+        latest = episodes[-1]
+        latest_text = self._episode_text(
+            latest, f"CONTENT: {latest.get('content', 'No content')}", remaining
+        )
+        remaining -= count_tokens(latest_text)
+
+        parts: List[str] = []
+        for ep in reversed(episodes[:-1]):
+            body = (
+                f"SUMMARY: {ep['summary']}"
+                if ep.get("summary")
+                else f"CONTENT: {ep.get('content', 'No content')}"
+            )
+            text = self._episode_text(ep, body, remaining // 2)
+            tokens = count_tokens(text)
+            # Even an empty body needs room for the episode header and title
+            if tokens > remaining // 2:
+                break
+            parts.insert(0, text)
+            remaining -= tokens
+
+        parts.append(latest_text)
+        return self._record("previous_episodes", "\n\n".join(parts))
+
+    def _episode_text(self, ep: Dict[str, Any], body: str, max_tokens: int) -> str:
+        header = f"EPISODE {ep.get('episode_number', 'N/A')}"
+        title = f"TITLE: {ep.get('title', 'No title')}"
+        body_budget = max_tokens - count_tokens(f"{header}\n\n{title}")
+        return f"{header}\n{truncate_to_tokens(body, body_budget, keep_end=True)}\n{title}"
+
+    def fit_relevant_context(self, chunks: List[Dict[str, Any]]) -> str:
+        """Chunks arrive best-first; keep as many whole chunks as fit."""
+        budget = self.budgets["relevant_context"]
+        parts: List[str] = []
+        used = 0
+        for chunk in chunks:
+            text = f"RELEVANT CONTEXT: {chunk['content']}"
+            tokens = count_tokens(text)
+            if used + tokens > budget:
+                continue
+            parts.append(text)
+            used += tokens
+        return self._record("relevant_context", "\n\n".join(parts))
+
+    def fit_characters(self, characters: List[Dict[str, Any]]) -> str:
+        """Active characters come first, so inactive ones drop out first."""
+        budget = self.budgets["characters"]
+        ordered = sorted(characters, key=lambda char: not char.get("role_active", True))
+        lines: List[str] = []
+        used = 0
+        for char in ordered:
+            line = (
+                f"Name: {char.get('Name')}, Role: {char.get('Role', 'Unknown')}, "
+                f"Description: {char.get('Description', 'No description available')}, "
+                f"Relationships: {json.dumps(char.get('Relationship', {}))}, "
+                f"Active: {'Yes' if char.get('role_active', True) else 'No'}, "
+                f"Emotional State: {char.get('Emotional_State', 'Unknown')}"
+            )
+            tokens = count_tokens(line)
+            if used + tokens > budget:
+                continue
+            lines.append(line)
+            used += tokens
+        if len(lines) < len(characters):
+            metrics.inc("prompt_characters_dropped_total", len(characters) - len(lines))
+        return self._record(
+            "characters", "\n".join(lines) or "No characters introduced yet."
+        )
+
+    def fit_key_events(self, key_events_summary: str) -> str:
+        """Foundational events are listed first, so the tail is cut."""
+        return self._record(
+            "key_events",
+            truncate_to_tokens(key_events_summary, self.budgets["key_events"]),
+        )
+
+    def report(self, instruction: str, episode_number: int) -> None:
+        total = count_tokens(instruction)
+        usage = dict(self.usage, other=max(0, total - sum(self.usage.values())))
+        for section, tokens in usage.items():
+            metrics.observe("episode_prompt_tokens", tokens, section=section)
+        metrics.observe("episode_prompt_tokens", total, section="total")
+        current_span().set_attribute("prompt.tokens", total)
+        print(
+            f"Episode {episode_number} prompt: {total} tokens ("
+            + ", ".join(f"{section}={tokens}" for section, tokens in usage.items())
+            + ")"
+        )
+
+    def _record(self, section: str, text: str) -> str:
+        self.usage[section] = count_tokens(text)
+        return text
@@ -0,0 +1,103 @@
+import re
+from typing import Iterable, Iterator
+
+
+class JsonFieldStream:
+    """
+    Incrementally decodes one string field out of a JSON object that is
+    still being generated, so its text can be forwarded before the closing
+    brace arrives. Feed raw model output with feed(); it returns whatever
+    new, already-unescaped text of the field is available.
+    """
+
+    _ESCAPES = {
+        '"': '"',
+        "\\": "\\",
+        "/": "/",
+        "b": "\b",
+        "f": "\f",
+        "n": "\n",
+        "r": "\r",
+        "t": "\t",
+    }
+
+    def __init__(self, field: str):
+        self._start = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._prefix = ""
+        self._pending = ""
+        self._high_surrogate = 0
+        self.started = False
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ""
+        if not self.started:
+            self._prefix += chunk
+            match = self._start.search(self._prefix)
+            if not match:
+                return ""
+            self.started = True
+            chunk = self._prefix[match.end() :]
+            self._prefix = ""
+        return self._decode(self._pending + chunk)
+
+    def _decode(self, text: str) -> str:
+        out = []
+        i = 0
+        self._pending = ""
+        while i < len(text):
+            ch = text[i]
+            if ch == '"':
+                self.done = True
+                break
+            if ch != "\\":
+                out.append(self._drop_surrogate() + ch)
+                i += 1
+                continue
+            if i + 1 >= len(text):
+                self._pending = text[i:]
+                break
+            code = text[i + 1]
+            if code != "u":
+                out.append(self._drop_surrogate() + self._ESCAPES.get(code, code))
+                i += 2
+                continue
+            if i + 6 > len(text):
+                self._pending = text[i:]
+                break
+            out.append(self._unicode(text[i + 2 : i + 6]))
+            i += 6
+        return "".join(out)
+
+    def _unicode(self, hex_digits: str) -> str:
+        try:
+            value = int(hex_digits, 16)
+        except ValueError:
+            return self._drop_surrogate() + hex_digits
+        if 0xD800 <= value <= 0xDBFF:
+            self._high_surrogate = value
+            return ""
+        if 0xDC00 <= value <= 0xDFFF:
+            high, self._high_surrogate = self._high_surrogate, 0
+            if not high:
+                return ""
+            return chr(0x10000 + ((high - 0xD800) << 10) + (value - 0xDC00))
+        return self._drop_surrogate() + chr(value)
+
+    def _drop_surrogate(self) -> str:
+        # A high surrogate not followed by a low one cannot be encoded
+        self._high_surrogate = 0
+        return ""
+
+
+def stream_text(response: Iterable) -> Iterator[str]:
+    """Yield the text of each chunk of a streamed generate_content response."""
+    for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. safety metadata only)
+            continue
+        if text:
+            yield text
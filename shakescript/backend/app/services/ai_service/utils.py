@@ -1,5 +1,6 @@
 from typing import Dict, Any
-import json, re
+from app.utils.json_repair import extract_json
+from app.utils.utils import parse_episode_response
 
 class AIUtils:
     def __init__(self) -> None:
@@ -51,72 +52,25 @@ class AIUtils:
     def _parse_episode_response(
         self, response_text: str, metadata: Dict[str, Any]
     ) -> Dict[str, Any]:
-        try:
-            return json.loads(response_text)
-        except json.JSONDecodeError:
-            json_pattern = r"```(?:json)?\s*\n(.*?)\n```"
-            matches = re.findall(json_pattern, response_text, re.DOTALL)
-            if matches:
-                try:
-                    return json.loads(matches[0])
-                except:
-                    cleaned_text = matches[0].replace("'", '"')
-                    try:
-                        return json.loads(cleaned_text)
-                    except:
-                        pass
-            json_pattern2 = r'{[\s\S]*"episode_title"[\s\S]*"episode_content"[\s\S]*}'
-            match = re.search(json_pattern2, response_text)
-            if match:
-                try:
-                    cleaned_json = match.group(0).replace("'", '"')
-                    return json.loads(cleaned_json)
-                except:
-                    pass
-            title_match = re.search(r'"episode_title":\s*"([^"]+)"', response_text)
-            content_match = re.search(
-                r'"episode_content":\s*"([^"]*(?:(?:"[^"]*)*[^"])*)"', response_text
-            )
-            summary_match = re.search(r'"episode_summary":\s*"([^"]+)"', response_text)
-            episode_title = (
-                title_match.group(1)
-                if title_match
-                else f"Episode {metadata.get('current_episode', 1)}"
-            )
-            episode_content = content_match.group(1) if content_match else response_text
-            episode_summary = (
-                summary_match.group(1)
-                if summary_match
-                else "Episode summary not available."
-            )
-            return {
-                "episode_title": episode_title,
-                "episode_content": episode_content,
-                "episode_summary": episode_summary,
-            }
+        return parse_episode_response(response_text, metadata)
 
     def _parse_and_clean_response(
         self, raw_text: str, metadata: Dict[str, Any]
     ) -> Dict[str, Any]:
-        if "```json" in raw_text:
-            raw_text = re.sub(r"```json\s*|\s*```", "", raw_text)
-        elif "```" in raw_text:
-            raw_text = re.sub(r"```\s*|\s*```", "", raw_text)
         try:
-            return json.loads(raw_text)
-        except json.JSONDecodeError:
-            clean_text = "".join(ch for ch in raw_text if ch.isprintable())
-            try:
-                return json.loads(clean_text)
-            except json.JSONDecodeError as e:
-                print(f"DEBUG: JSON parsing failed with error: {e}")
-                print(f"DEBUG: Raw text:\n{raw_text}\n")
-                return {
-                    "episode_summary": "Summary placeholder due to parsing error.",
-                    "episode_emotional_state": "neutral",
-                    "characters_featured": [],
-                    "Key Events": [{"event": "Default event", "tier": "contextual"}],
-                    "Settings": {},
-                }
+            data = extract_json(raw_text)
+            if not isinstance(data, dict):
+                raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+            return data
+        except ValueError as e:
+            print(f"DEBUG: JSON parsing failed with error: {e}")
+            print(f"DEBUG: Raw text:\n{raw_text}\n")
+            return {
+                "episode_summary": "Summary placeholder due to parsing error.",
+                "episode_emotional_state": "neutral",
+                "characters_featured": [],
+                "Key Events": [{"event": "Default event", "tier": "contextual"}],
+                "Settings": {},
+            }
 
 
@@ -1,37 +1,61 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Any, Optional
+from app.core.config import settings
 import re
 
 
 def validate_batch(self, story_id, episodes, prev_episodes, metadata):
     """
     Validate a batch of episodes for narrative consistency and quality.
+    The LLM checks are independent, so they run concurrently on a bounded pool;
+    feedback is still assembled in episode/check order.
     """
-    validation_issues = []
-
+    checks = []
     for i, episode in enumerate(episodes):
         if prev_episodes and i == 0:
-            if not self.is_consistent_with_previous(episode, prev_episodes[-1]):
+            checks.append(
+                (
+                    episode,
+                    "Ensure this episode follows directly from the previous one in the timeline",
+                    self.is_consistent_with_previous,
+                    (episode, prev_episodes[-1]),
+                )
+            )
+
+        if i > 0:
+            checks.append(
+                (
+                    episode,
+                    "Ensure this episode maintains continuity with the previous episode",
+                    self.is_consistent_with_previous,
+                    (episode, episodes[i - 1]),
+                )
+            )
+
+        checks.append((episode, None, self.check_episode_quality, (episode, metadata)))
+
+    results = _run_checks(
+        [(check, args) for _, _, check, args in checks],
+        max_workers=settings.VALIDATION_MAX_CONCURRENCY,
+    )
+
+    validation_issues = []
+    for (episode, consistency_feedback, _, _), result in zip(checks, results):
+        if consistency_feedback is not None:
+            # Consistency check: a False result needs refinement
+            if result is False:
                 validation_issues.append(
                     {
                         "episode_number": episode["episode_number"],
-                        "feedback": "Ensure this episode follows directly from the previous one in the timeline",
+                        "feedback": consistency_feedback,
                     }
                 )
-
-        if i > 0 and not self.is_consistent_with_previous(episode, episodes[i - 1]):
+        elif result:
             validation_issues.append(
                 {
                     "episode_number": episode["episode_number"],
-                    "feedback": "Ensure this episode maintains continuity with the previous episode",
-                }
-            )
-
-        quality_feedback = self.check_episode_quality(episode, metadata)
-        if quality_feedback:
-            validation_issues.append(
-                {
-                    "episode_number": episode["episode_number"],
-                    "feedback": quality_feedback,
+                    "feedback": result,
                 }
             )
 
@@ -45,6 +69,29 @@ def validate_batch(self, story_id, episodes, prev_episodes, metadata):
     return {"status": "success", "episodes": episodes}
 
 
+def _run_checks(calls, max_workers):
+    """
+    Run (fn, args) calls concurrently and return their results in input order.
+    A call that fails or times out yields None, which validate_batch reads as
+    "no issue found" rather than failing the whole batch.
+    """
+    if not calls:
+        return []
+    results = [None] * len(calls)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(calls)))) as pool:
+        # Each check runs in the caller's context, so it keeps its LLM priority
+        futures = {
+            pool.submit(contextvars.copy_context().run, fn, *args): i
+            for i, (fn, args) in enumerate(calls)
+        }
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                print(f"Validation check failed, skipping it: {e}")
+    return results
+
+
 def is_consistent_with_previous(self, current_episode, previous_episode):
     """
     Check if the current episode is consistent with the previous episode.
@@ -94,7 +141,9 @@ def check_episode_quality(self, episode, metadata):
     If no quality issues, respond with 'GOOD'.
     """
 
-    response = self.call_llm(quality_prompt, max_tokens=100, temperature=0.3)
+    response = self.call_llm(
+        quality_prompt, max_tokens=100, temperature=0.3, cache=True
+    )
     return None if "GOOD" in response.upper() else response.strip()
 
 
@@ -219,5 +268,5 @@ def generate_episode_title(self, episode_content):
     Title (in 2-6 words):
     """
 
-    title = self.call_llm(title_prompt, max_tokens=20, temperature=0.7)
+    title = self.call_llm(title_prompt, max_tokens=20, temperature=0.7, cache=True)
     return title.strip()
@@ -0,0 +1,179 @@
+import asyncio
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.tracing import current_span, record_db_query, tracer
+from app.services import db_queries as queries
+from app.services.story_cache import StoryCache
+from app.services.db_service import (
+    story_header_from_row,
+    character_from_row,
+    story_from_rows,
+    refined_episodes_from_rows,
+    apply_story_events,
+    story_snapshot_row,
+)
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+
+@tracer.trace_methods("db")
+class AsyncDBService:
+    """
+    Non-blocking counterpart of DBService for the async FastAPI handlers: the
+    story reads and the refinement write they need. Queries come from
+    db_queries and rows are mapped by the db_service helpers, so only
+    _execute differs.
+
+    One AsyncClient (and so one pooled HTTP connection set) is shared by the
+    whole process, and a semaphore caps how many queries are in flight at once.
+    Pass the DBService's StoryCache so both variants see each other's writes.
+    """
+
+    def __init__(self, client: "AsyncClient", cache: Optional[StoryCache] = None):
+        self.supabase: "AsyncClient" = client
+        self.cache = cache or StoryCache()
+        self._semaphore = asyncio.Semaphore(settings.DB_MAX_CONCURRENCY)
+
+    @classmethod
+    async def create(cls, cache: Optional[StoryCache] = None) -> "AsyncDBService":
+        from supabase import acreate_client
+        from supabase.lib.client_options import AsyncClientOptions
+
+        client = await acreate_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_KEY,
+            options=AsyncClientOptions(
+                postgrest_client_timeout=settings.DB_TIMEOUT_SECONDS
+            ),
+        )
+        return cls(client, cache)
+
+    async def _execute(self, query):
+        metrics.inc("db_round_trips_total")
+        async with self._semaphore:
+            result = await query.execute()
+        record_db_query(current_span(), query, result)
+        return result
+
+    async def _cached(
+        self, story_id: int, view: str, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        found, value, version = self.cache.get(story_id, view)
+        if found:
+            return value
+        value = await loader()
+        if not (isinstance(value, dict) and "error" in value):
+            self.cache.put(story_id, view, version, value)
+        return value
+
+    async def get_story_info(self, story_id: int) -> Dict:
+        return await self._cached(
+            story_id, "full", lambda: self._load_story_info(story_id)
+        )
+
+    async def _load_story_info(self, story_id: int) -> Dict:
+        story_result, episodes_result, characters_result = await asyncio.gather(
+            self._execute(queries.story(self.supabase, story_id)),
+            self._execute(queries.story_episodes(self.supabase, story_id)),
+            self._execute(queries.story_characters(self.supabase, story_id)),
+        )
+        if not story_result.data:
+            return {"error": "Story not found"}
+        story_row = story_result.data[0]
+        story = story_from_rows(
+            story_row, episodes_result.data, characters_result.data
+        )
+        await self._apply_pending_events(
+            story_id, story, story_row.get("snapshot_event_id")
+        )
+        return story
+
+    async def _apply_pending_events(
+        self, story_id: int, story: Dict, snapshot_event_id: Optional[int]
+    ) -> None:
+        snapshot_event_id = snapshot_event_id or 0
+        events = (
+            await self._execute(
+                queries.pending_events(self.supabase, story_id, snapshot_event_id)
+            )
+        ).data or []
+        apply_story_events(story, events)
+        if len(events) >= settings.STORY_SNAPSHOT_COMPACT_EVENTS:
+            await self._execute(
+                queries.write_snapshot(
+                    self.supabase,
+                    story_id,
+                    story_snapshot_row(story, events[-1]["id"]),
+                    snapshot_event_id,
+                )
+            )
+            self.cache.invalidate(story_id)
+
+    async def get_story_header(self, story_id: int, with_state: bool = True) -> Dict:
+        return await self._cached(
+            story_id,
+            f"header:{with_state}",
+            lambda: self._load_story_header(story_id, with_state),
+        )
+
+    async def _load_story_header(self, story_id: int, with_state: bool) -> Dict:
+        story_result = await self._execute(
+            queries.story(self.supabase, story_id, queries.STORY_HEADER_COLUMNS)
+        )
+        if not story_result.data:
+            return {"error": "Story not found"}
+        story_row = story_result.data[0]
+        header = story_header_from_row(story_row)
+        if with_state:
+            await self._apply_pending_events(
+                story_id, header, story_row.get("snapshot_event_id")
+            )
+        return header
+
+    async def get_story_characters(self, story_id: int) -> List[Dict[str, Any]]:
+        return await self._cached(
+            story_id, "characters", lambda: self._load_story_characters(story_id)
+        )
+
+    async def _load_story_characters(self, story_id: int) -> List[Dict[str, Any]]:
+        result = await self._execute(queries.story_characters(self.supabase, story_id))
+        return [character_from_row(char) for char in result.data or []]
+
+    async def get_episodes_by_range(
+        self, story_id: int, start_episode: int, end_episode: int, columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        result = await self._execute(
+            queries.episodes_by_range(
+                self.supabase, story_id, start_episode, end_episode, columns
+            )
+        )
+        return result.data or []
+
+    async def update_story_current_episodes_content(
+        self, story_id: int, episodes: List[Dict]
+    ):
+        """Update the current_episodes_content field in the stories table with refined episodes."""
+        await self._execute(
+            queries.set_current_episodes_content(self.supabase, story_id, episodes)
+        )
+        self.cache.invalidate(story_id)
+
+    async def get_refined_episodes(self, story_id: int) -> List[Dict]:
+        """Retrieve the refined episodes from current_episodes_content if they exist."""
+        return await self._cached(
+            story_id,
+            "current_episodes_content",
+            lambda: self._load_refined_episodes(story_id),
+        )
+
+    async def _load_refined_episodes(self, story_id: int) -> List[Dict]:
+        result = await self._execute(
+            queries.story(self.supabase, story_id, "current_episodes_content")
+        )
+        return refined_episodes_from_rows(result.data)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        result = await self._execute(queries.job(self.supabase, job_id))
+        return result.data[0] if result.data else None
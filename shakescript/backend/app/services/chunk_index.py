@@ -0,0 +1,335 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+import numpy as np
+from app.core.metrics import metrics
+from app.utils.vector_codec import decode_vector
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+INDEX_COLUMNS = "id, episode_number, chunk_number, content, importance_score, characters"
+LOAD_PAGE_SIZE = 1000  # PostgREST's default max-rows
+
+
+def _characters(value: Any) -> FrozenSet[str]:
+    if isinstance(value, str):
+        value = json.loads(value or "[]")
+    return frozenset(value or [])
+
+
+class StoryChunkIndex:
+    """
+    Cosine-similarity index over one story's chunks. Vectors are kept
+    normalised in a growing float32 matrix and searched brute force; once a
+    story has hnsw_threshold chunks (and hnswlib is installed) build_hnsw
+    builds an HNSW graph, which is then kept up to date as chunks are added.
+    Brute force stays around 5 ms up to ~20k chunks while building the graph
+    takes seconds, so HNSW only pays off for very long stories.
+
+    Callers hold lock around add and search; build_hnsw takes it itself and
+    releases it while the graph is built.
+    """
+
+    def __init__(self, dimension: int, hnsw_threshold: int):
+        self.dimension = dimension
+        self.hnsw_threshold = hnsw_threshold
+        self.rows: List[Dict[str, Any]] = []
+        self.characters: List[FrozenSet[str]] = []
+        self._matrix = np.zeros((64, dimension), dtype=np.float32)
+        self._hnsw = None
+        self._building = False
+        self._text_bytes = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def nbytes(self) -> int:
+        graph = len(self.rows) * (self.dimension * 4 + 16 * 2 * 4) if self._hnsw else 0
+        return self._matrix.nbytes + graph + self._text_bytes
+
+    def add(self, rows: List[Dict[str, Any]], vectors: List[Any]) -> None:
+        if not rows:
+            return
+        block = np.vstack([decode_vector(v) for v in vectors]).astype(np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        block /= np.where(norms == 0, 1, norms)
+
+        start = len(self.rows)
+        end = start + len(rows)
+        if end > len(self._matrix):
+            grown = np.zeros((max(end, 2 * len(self._matrix)), self.dimension), dtype=np.float32)
+            grown[:start] = self._matrix[:start]
+            self._matrix = grown
+        self._matrix[start:end] = block
+
+        for row in rows:
+            self.rows.append(
+                {
+                    "id": row.get("id"),
+                    "episode_number": row.get("episode_number"),
+                    "chunk_number": row.get("chunk_number"),
+                    "content": row.get("content"),
+                    "importance_score": row.get("importance_score"),
+                }
+            )
+            self.characters.append(_characters(row.get("characters")))
+            self._text_bytes += len(row.get("content") or "")
+
+        if self._hnsw is not None:
+            self._hnsw.resize_index(max(end, self._hnsw.get_max_elements()))
+            self._hnsw.add_items(block, np.arange(start, end))
+
+    def wants_hnsw(self) -> bool:
+        return (
+            hnswlib is not None
+            and self._hnsw is None
+            and not self._building
+            and len(self.rows) >= self.hnsw_threshold
+        )
+
+    def search(
+        self,
+        query: List[float],
+        limit: int,
+        character_names: List[str],
+        before_episode: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        if not self.rows:
+            return []
+        query_vector = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        if norm:
+            query_vector = query_vector / norm
+
+        # A filtered search scans exactly, so results never depend on the graph
+        if self._hnsw is not None and not character_names and before_episode is None:
+            self._hnsw.set_ef(max(128, limit))
+            labels, distances = self._hnsw.knn_query(
+                query_vector, k=min(limit, len(self.rows))
+            )
+            hits = zip(labels[0].tolist(), (1 - distances[0]).tolist())
+        else:
+            # Character filters are selective, so scanning the matches is cheap
+            candidates = np.arange(len(self.rows))
+            if character_names:
+                wanted = set(character_names)
+                candidates = np.array(
+                    [i for i, names in enumerate(self.characters) if wanted <= names],
+                    dtype=np.int64,
+                )
+            if before_episode is not None:
+                candidates = np.array(
+                    [
+                        i
+                        for i in candidates.tolist()
+                        if (self.rows[i]["episode_number"] or 0) < before_episode
+                    ],
+                    dtype=np.int64,
+                )
+            if not len(candidates):
+                return []
+            similarities = self._matrix[candidates] @ query_vector
+            order = np.arange(len(similarities))
+            if len(similarities) > limit:
+                order = np.argpartition(-similarities, limit)[:limit]
+            order = order[np.argsort(-similarities[order])]
+            hits = zip(candidates[order].tolist(), similarities[order].tolist())
+
+        return [{**self.rows[i], "similarity": float(s)} for i, s in hits]
+
+    def build_hnsw(self) -> None:
+        """
+        Build the HNSW graph over the rows present now without holding lock,
+        then swap it in, adding any rows that arrived during the build.
+        """
+        with self.lock:
+            if not self.wants_hnsw():
+                return
+            self._building = True
+            count = len(self.rows)
+            # add() only writes past count, or into a new matrix when it grows
+            vectors = self._matrix[:count]
+        try:
+            index = hnswlib.Index(space="cosine", dim=self.dimension)
+            index.init_index(
+                max_elements=max(count * 2, 1024), ef_construction=200, M=16
+            )
+            index.add_items(vectors, np.arange(count))
+        except Exception:
+            with self.lock:
+                self._building = False
+            raise
+        with self.lock:
+            end = len(self.rows)
+            if end > count:
+                index.resize_index(max(end, index.get_max_elements()))
+                index.add_items(self._matrix[count:end], np.arange(count, end))
+            self._hnsw = index
+            self._building = False
+
+
+class ChunkIndexManager:
+    """
+    Process-local StoryChunkIndex per story, loaded from the chunks table on
+    first use, extended as this process stores new chunks, and evicted least
+    recently used once the indexes exceed max_bytes. Supabase remains the
+    source of truth: chunks written by other workers show up after
+    ttl_seconds, when the story's index is reloaded.
+
+    As in StoryCache, a load that races with add() for the same story is used
+    for that one search but not kept. The manager lock only guards the
+    story table; each index has its own lock, so a slow search, add or HNSW
+    build for one story does not block the others. Versions are only kept
+    for stories with a resident index or a load in flight.
+    """
+
+    def __init__(
+        self,
+        db_service,
+        max_bytes: int,
+        ttl_seconds: float,
+        hnsw_threshold: int,
+        dimension: int,
+    ):
+        self.db_service = db_service
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hnsw_threshold = hnsw_threshold
+        self.dimension = dimension
+        self._lock = threading.Lock()
+        self._indexes: "OrderedDict[int, Tuple[float, StoryChunkIndex]]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._loading: Dict[int, int] = {}  # loads in flight per story
+
+    def search(
+        self,
+        story_id: int,
+        query_embedding: List[float],
+        limit: int,
+        character_names: List[str],
+        before_episode: Optional[int] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Nearest chunks with their similarity, or None if loading failed.
+        before_episode keeps only chunks from earlier episodes.
+        """
+        index = self._get(story_id)
+        if index is None:
+            return None
+        with index.lock:
+            return index.search(
+                query_embedding, limit, character_names, before_episode
+            )
+
+    def add(self, story_id: int, rows: List[Dict[str, Any]], vectors: List[Any]) -> None:
+        """Index freshly stored chunks; unloaded stories pick them up on load."""
+        with self._lock:
+            self._bump_version(story_id)
+            entry = self._indexes.get(story_id)
+            if entry is None:
+                return
+        index = entry[1]
+        with index.lock:
+            index.add(rows, vectors)
+        self._build_hnsw(story_id, index)
+        with self._lock:
+            self._evict()
+
+    def drop(self, story_id: int) -> None:
+        with self._lock:
+            self._bump_version(story_id)
+            self._indexes.pop(story_id, None)
+            self._forget_version(story_id)
+            self._report_size()
+
+    def _get(self, story_id: int) -> Optional[StoryChunkIndex]:
+        with self._lock:
+            entry = self._indexes.get(story_id)
+            if entry and entry[0] > time.monotonic():
+                self._indexes.move_to_end(story_id)
+                metrics.inc("chunk_index_requests_total", result="hit")
+                return entry[1]
+            version = self._versions.get(story_id, 0)
+            self._loading[story_id] = self._loading.get(story_id, 0) + 1
+        metrics.inc("chunk_index_requests_total", result="load")
+
+        start = time.perf_counter()
+        index = None
+        try:
+            index = self._load(story_id)
+            metrics.observe("chunk_index_load_seconds", time.perf_counter() - start)
+            self._build_hnsw(story_id, index)
+        except Exception as e:
+            print(f"Loading chunk index for story {story_id} failed: {e}")
+        finally:
+            with self._lock:
+                self._loading[story_id] -= 1
+                if not self._loading[story_id]:
+                    del self._loading[story_id]
+                if index is not None and self._versions.get(story_id, 0) == version:
+                    self._indexes[story_id] = (
+                        time.monotonic() + self.ttl_seconds,
+                        index,
+                    )
+                    self._indexes.move_to_end(story_id)
+                    self._evict()
+                self._forget_version(story_id)
+        return index
+
+    def _bump_version(self, story_id: int) -> None:
+        # Only a load in flight or a resident index can be made stale
+        if story_id in self._indexes or story_id in self._loading:
+            self._versions[story_id] = self._versions.get(story_id, 0) + 1
+
+    def _forget_version(self, story_id: int) -> None:
+        if story_id not in self._indexes and story_id not in self._loading:
+            self._versions.pop(story_id, None)
+
+    def _build_hnsw(self, story_id: int, index: StoryChunkIndex) -> None:
+        # Brute-force search keeps working if the build fails
+        try:
+            index.build_hnsw()
+        except Exception as e:
+            print(f"Building HNSW index for story {story_id} failed: {e}")
+
+    def _load(self, story_id: int) -> StoryChunkIndex:
+        index = StoryChunkIndex(self.dimension, self.hnsw_threshold)
+        last_id = None
+        while True:
+            query = (
+                self.db_service.supabase.table("chunks")
+                .select(f"{INDEX_COLUMNS}, embedding")
+                .eq("story_id", story_id)
+            )
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            page = (
+                self.db_service._execute(query.order("id").limit(LOAD_PAGE_SIZE)).data
+                or []
+            )
+            rows = [row for row in page if row.get("embedding")]
+            index.add(rows, [row["embedding"] for row in rows])
+            if len(page) < LOAD_PAGE_SIZE:
+                return index
+            last_id = page[-1]["id"]
+
+    def _evict(self) -> None:
+        total = sum(index.nbytes for _, index in self._indexes.values())
+        while total > self.max_bytes and len(self._indexes) > 1:
+            story_id, (_, evicted) = self._indexes.popitem(last=False)
+            self._forget_version(story_id)
+            total -= evicted.nbytes
+            metrics.inc("chunk_index_evictions_total")
+        metrics.set("chunk_index_bytes", total)
+
+    def _report_size(self) -> None:
+        metrics.set(
+            "chunk_index_bytes", sum(index.nbytes for _, index in self._indexes.values())
+        )
@@ -0,0 +1,193 @@
+import threading
+import time
+from typing import Any, Callable, Dict
+from app.core.config import settings
+from app.core.cache_backends import MemoryCacheBackend, build_cache_backend
+from app.core.lazy import LazyComponent
+from app.services.db_service import DBService
+from app.services.async_db_service import AsyncDBService
+from app.services.story_cache import StoryCache
+from app.services.embedding_service import EmbeddingService
+from app.services.embedding_backends import build_embedding_model
+from app.services.embedding_cache import CachedEmbeddingModel
+from app.services.chunk_index import ChunkIndexManager
+from app.services.ai_service import AIService
+from app.services.ai_service.llm_cache import CachedGenerativeModel
+from app.services.ai_service.llm_gateway import LLMGateway, RateLimitedModel
+from app.services.story_service import StoryService
+from app.services.job_service import JobService
+
+
+class ServiceContainer:
+    """
+    Application-lifetime owner of the expensive clients (embedding model, Gemini
+    model, OpenAI client, Supabase client) and the services built on top of them.
+
+    The clients are LazyComponents: their SDKs (torch in particular) are only
+    imported when first used, so the app starts serving straight away and
+    prewarm_in_background() loads them while requests are already handled.
+    """
+
+    def __init__(self):
+        self.init_times: Dict[str, float] = {}
+        self._lazy_components = []
+
+        supabase_client = self._lazy("supabase_client", self._build_supabase_client)
+        self.embedding_model = self._with_embedding_cache(
+            self._lazy("embedding_model", self._build_embedding_model)
+        )
+        self.gemini_model = self._build_gemini_model()
+        self.openai_client = self._lazy("openai_client", self._build_openai_client)
+
+        self.story_cache = StoryCache()
+        self.db_service = self._timed(
+            "db_service", lambda: DBService(supabase_client, self.story_cache)
+        )
+        self.embedding_service = self._timed(
+            "embedding_service",
+            lambda: EmbeddingService(
+                self.embedding_model, self.db_service, self._build_chunk_index()
+            ),
+        )
+        self.ai_service = self._timed(
+            "ai_service",
+            lambda: AIService(
+                self.gemini_model, self.openai_client, self.embedding_service
+            ),
+        )
+        self.story_service = self._timed(
+            "story_service",
+            lambda: StoryService(
+                self.ai_service, self.db_service, self.embedding_service
+            ),
+        )
+        self.job_service = JobService(self.story_service, self.db_service)
+
+    async def init_async_services(self) -> None:
+        """
+        Services that need a running event loop (the async Supabase client).
+        """
+        start = time.perf_counter()
+        self.async_db_service = await AsyncDBService.create(self.story_cache)
+        self.init_times["async_db_service"] = time.perf_counter() - start
+
+    def prewarm_in_background(self) -> threading.Thread:
+        """
+        Load the lazy clients (and the sentence splitter) on a daemon thread
+        so the first story request does not pay for importing the models.
+        """
+
+        def prewarm() -> None:
+            start = time.perf_counter()
+            try:
+                for component in self._lazy_components:
+                    component.get()
+                self.embedding_service.splitter.warm_up()
+            except Exception as e:
+                print(f"Model pre-warm failed, loading on first use instead: {e}")
+                return
+            print(f"Models pre-warmed in {time.perf_counter() - start:.2f} s")
+            self.report_init_times()
+
+        thread = threading.Thread(target=prewarm, name="prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self) -> None:
+        self.job_service.shutdown()
+
+    def _build_supabase_client(self):
+        from supabase import create_client
+
+        return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+
+    def _build_embedding_model(self):
+        return build_embedding_model(
+            settings.EMBEDDING_MODEL,
+            settings.EMBEDDING_BATCH_SIZE,
+            settings.EMBEDDING_NUM_THREADS,
+        )
+
+    def _with_embedding_cache(self, model):
+        if not settings.EMBEDDING_CACHE_MAX_BYTES:
+            return model
+        disk = None
+        if settings.EMBEDDING_CACHE_PATH:
+            disk = build_cache_backend(
+                "sqlite",
+                settings.EMBEDDING_CACHE_PATH,
+                settings.EMBEDDING_CACHE_DISK_MAX_BYTES,
+            )
+        return CachedEmbeddingModel(
+            model,
+            settings.EMBEDDING_MODEL,
+            MemoryCacheBackend(settings.EMBEDDING_CACHE_MAX_BYTES),
+            disk,
+        )
+
+    def _build_chunk_index(self):
+        if not settings.CHUNK_INDEX_MAX_BYTES:
+            return None
+        return ChunkIndexManager(
+            self.db_service,
+            settings.CHUNK_INDEX_MAX_BYTES,
+            settings.CHUNK_INDEX_TTL_SECONDS,
+            settings.CHUNK_INDEX_HNSW_THRESHOLD,
+            settings.VECTOR_DIMENSION,
+        )
+
+    def _build_openai_client(self):
+        from openai import OpenAI
+
+        return OpenAI(api_key=settings.OPENAI_API_KEY)
+
+    def _build_gemini_client(self):
+        import google.generativeai as genai
+
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        return genai.GenerativeModel(settings.GEMINI_MODEL)
+
+    def _build_gemini_model(self):
+        # Cache outermost, so cache hits use no rate-limit budget
+        model = RateLimitedModel(
+            self._lazy("gemini_model", self._build_gemini_client),
+            self._build_llm_gateway(settings.GEMINI_MODEL),
+            settings.LLM_ESTIMATED_OUTPUT_TOKENS,
+        )
+        backend = build_cache_backend(
+            settings.LLM_CACHE_BACKEND,
+            settings.LLM_CACHE_PATH,
+            settings.LLM_CACHE_MAX_BYTES,
+        )
+        if backend is None:
+            return model
+        return CachedGenerativeModel(
+            model, backend, settings.GEMINI_MODEL, settings.LLM_CACHE_MAX_TEMPERATURE
+        )
+
+    def _build_llm_gateway(self, model_name: str) -> LLMGateway:
+        return LLMGateway(
+            model_name,
+            settings.LLM_REQUESTS_PER_MINUTE,
+            settings.LLM_TOKENS_PER_MINUTE,
+            settings.LLM_MAX_RETRIES,
+            settings.LLM_RETRY_BASE_SECONDS,
+            settings.LLM_RETRY_MAX_SECONDS,
+        )
+
+    def _lazy(self, name: str, factory: Callable[[], Any]) -> LazyComponent:
+        component = LazyComponent(name, lambda: self._timed(name, factory))
+        self._lazy_components.append(component)
+        return component
+
+    def _timed(self, name: str, factory: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        component = factory()
+        self.init_times[name] = time.perf_counter() - start
+        return component
+
+    def report_init_times(self) -> None:
+        total = sum(self.init_times.values())
+        print(f"Service container initialised in {total * 1000:.1f} ms")
+        for name, seconds in self.init_times.items():
+            print(f"  {name}: {seconds * 1000:.1f} ms")
@@ -0,0 +1,158 @@
+"""
+PostgREST query builders shared by DBService and AsyncDBService.
+
+The sync and async supabase clients build queries the same way and differ only
+in how a query is executed, so every query is defined once here and each
+service runs it through its own _execute. Row <-> dict mapping lives next to
+DBService in db_service.py.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+import json
+
+# Everything on the stories row except the current_episodes_content blob
+STORY_HEADER_COLUMNS = (
+    "id, title, setting, key_events, special_instructions, story_outline, "
+    "current_episode, num_episodes, protagonist, timeline, summary, snapshot_event_id"
+)
+
+
+def all_stories(client):
+    return client.table("stories").select("id, title")
+
+
+def story(client, story_id: int, columns: str = "*"):
+    return client.table("stories").select(columns).eq("id", story_id)
+
+
+def update_story(client, story_id: int, fields: Dict[str, Any]):
+    return client.table("stories").update(fields).eq("id", story_id)
+
+
+def insert_story(client, row: Dict[str, Any]):
+    return client.table("stories").insert(row)
+
+
+def delete_story(client, story_id: int):
+    return client.table("stories").delete().eq("id", story_id)
+
+
+def write_snapshot(
+    client, story_id: int, row: Dict[str, Any], previous_event_id: int
+):
+    # Conditional on the snapshot we read, so a concurrent compaction wins cleanly
+    return update_story(client, story_id, row).eq("snapshot_event_id", previous_event_id)
+
+
+def set_current_episodes_content(client, story_id: int, episodes: List[Dict]):
+    return update_story(
+        client, story_id, {"current_episodes_content": json.dumps(episodes)}
+    )
+
+
+def pending_events(client, story_id: int, snapshot_event_id: int):
+    return (
+        client.table("story_events")
+        .select("id, kind, payload")
+        .eq("story_id", story_id)
+        .gt("id", snapshot_event_id)
+        .order("id")
+    )
+
+
+def upsert_events(client, events: List[Dict]):
+    return client.table("story_events").upsert(
+        events,
+        on_conflict="story_id,episode_number,kind,event_key",
+        ignore_duplicates=True,
+    )
+
+
+def delete_episode_events(client, story_id: int, episode_number: int):
+    return (
+        client.table("story_events")
+        .delete()
+        .eq("story_id", story_id)
+        .eq("episode_number", episode_number)
+    )
+
+
+def compacted_key_events(client, story_id: int, snapshot_event_id: int):
+    return (
+        client.table("story_events")
+        .select("payload")
+        .eq("story_id", story_id)
+        .eq("kind", "key_event")
+        .lte("id", snapshot_event_id)
+    )
+
+
+def story_characters(client, story_id: int):
+    return client.table("characters").select("*").eq("story_id", story_id)
+
+
+def insert_characters(client, rows: List[Dict]):
+    return client.table("characters").insert(rows)
+
+
+def upsert_characters(client, rows: List[Dict]):
+    return client.table("characters").upsert(rows, on_conflict="story_id,name")
+
+
+def story_episodes(client, story_id: int, columns: str = "*"):
+    return (
+        client.table("episodes")
+        .select(columns)
+        .eq("story_id", story_id)
+        .order("episode_number")
+    )
+
+
+def episodes_by_range(
+    client, story_id: int, start_episode: int, end_episode: int, columns: str = "*"
+):
+    return (
+        story_episodes(client, story_id, columns)
+        .gte("episode_number", start_episode)
+        .lte("episode_number", end_episode)
+    )
+
+
+def previous_episodes(client, story_id: int, current_episode: int, limit: int):
+    return (
+        client.table("episodes")
+        .select("*")
+        .eq("story_id", story_id)
+        .lt("episode_number", current_episode)
+        .order("episode_number", desc=True)
+        .limit(limit)
+    )
+
+
+def upsert_episode(client, row: Dict[str, Any]):
+    return client.table("episodes").upsert(row, on_conflict="story_id,episode_number")
+
+
+def job(client, job_id: str):
+    return client.table("generation_jobs").select("*").eq("id", job_id)
+
+
+def insert_job(client, row: Dict[str, Any]):
+    return client.table("generation_jobs").insert(row)
+
+
+def update_job(
+    client,
+    job_id: str,
+    fields: Dict[str, Any],
+    from_statuses: Optional[Sequence[str]] = None,
+):
+    query = (
+        client.table("generation_jobs")
+        .update({**fields, "updated_at": datetime.now(timezone.utc).isoformat()})
+        .eq("id", job_id)
+    )
+    if from_statuses:
+        query = query.in_("status", list(from_statuses))
+    return query
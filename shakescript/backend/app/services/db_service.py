@@ -1,213 +1,238 @@
-from supabase import create_client, Client
+from contextvars import ContextVar
 from app.core.config import settings
-from typing import Dict, List, Any
+from app.core.metrics import metrics
+from app.core.tracing import current_span, record_db_query, tracer
+from app.services import db_queries as queries
+from app.services.story_cache import StoryCache
+from typing import TYPE_CHECKING, Callable, Dict, List, Any, Optional, Sequence
+import hashlib
 import json
 
+if TYPE_CHECKING:
+    from supabase import Client
 
+# Supabase requests issued in the current thread / task, used to measure how
+# many round trips a compound operation such as store_episode costs
+_round_trips: ContextVar[int] = ContextVar("db_round_trips", default=0)
+
+
+class _TimeoutSession:
+    """Wraps a postgrest request's httpx client to pass a per-request timeout."""
+
+    def __init__(self, session, timeout: float):
+        self.session = session
+        self.timeout = timeout
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
+
+    def request(self, *args, **kwargs):
+        return self.session.request(*args, timeout=self.timeout, **kwargs)
+
+
+@tracer.trace_methods("db")
 class DBService:
-    def __init__(self):
-        self.supabase: Client = create_client(
-            settings.SUPABASE_URL, settings.SUPABASE_KEY
-        )
+    def __init__(
+        self, client: Optional["Client"] = None, cache: Optional[StoryCache] = None
+    ):
+        if client is None:
+            from supabase import create_client
+
+            client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+        self.supabase: "Client" = client
+        self.cache = cache or StoryCache()
+
+    def _execute(self, query, timeout: Optional[float] = None):
+        """
+        Run a query builder. timeout (seconds) bounds this one HTTP request
+        instead of the client-wide default.
+        """
+        _round_trips.set(_round_trips.get() + 1)
+        metrics.inc("db_round_trips_total")
+        request = getattr(query, "request", None)
+        if timeout is not None and hasattr(request, "session"):
+            request.session = _TimeoutSession(request.session, timeout)
+        result = query.execute()
+        record_db_query(current_span(), query, result)
+        return result
+
+    def _cached(self, story_id: int, view: str, loader: Callable[[], Any]) -> Any:
+        found, value, version = self.cache.get(story_id, view)
+        if found:
+            return value
+        value = loader()
+        if not (isinstance(value, dict) and "error" in value):
+            self.cache.put(story_id, view, version, value)
+        return value
 
     def get_all_stories(self) -> List[Dict[str, Any]]:
-        result = self.supabase.table("stories").select("id, title").execute()
+        result = self._execute(queries.all_stories(self.supabase))
         return result.data if result.data else []
 
     def get_story_info(self, story_id: int) -> Dict:
-        story_result = (
-            self.supabase.table("stories").select("*").eq("id", story_id).execute()
-        )
+        return self._cached(story_id, "full", lambda: self._load_story_info(story_id))
+
+    def _load_story_info(self, story_id: int) -> Dict:
+        story_result = self._execute(queries.story(self.supabase, story_id))
         if not story_result.data:
             return {"error": "Story not found"}
         story_row = story_result.data[0]
 
-        episodes_result = (
-            self.supabase.table("episodes")
-            .select("*")
-            .eq("story_id", story_id)
-            .order("episode_number")
-            .execute()
+        episodes_result = self._execute(queries.story_episodes(self.supabase, story_id))
+        characters_result = self._execute(
+            queries.story_characters(self.supabase, story_id)
         )
-        episodes_list = [
-            {
-                "id": ep["id"],
-                "number": ep["episode_number"],
-                "title": ep["title"],
-                "content": ep["content"],
-                "summary": ep["summary"],
-                "emotional_state": ep.get("emotional_state", "neutral"),
-                "key_events": json.loads(ep["key_events"] or "[]"),
-            }
-            for ep in episodes_result.data
-        ]
-
-        characters_result = (
-            self.supabase.table("characters")
-            .select("*")
-            .eq("story_id", story_id)
-            .execute()
+        story = story_from_rows(
+            story_row, episodes_result.data, characters_result.data
+        )
+        self._apply_pending_events(story_id, story, story_row.get("snapshot_event_id"))
+        return story
+
+    def _apply_pending_events(
+        self, story_id: int, story: Dict, snapshot_event_id: Optional[int]
+    ) -> None:
+        """
+        Fold events appended since the last snapshot into the story's
+        setting / key_events / timeline, compacting once the tail grows long.
+        """
+        snapshot_event_id = snapshot_event_id or 0
+        events = self._execute(
+            queries.pending_events(self.supabase, story_id, snapshot_event_id)
+        ).data or []
+        apply_story_events(story, events)
+        if len(events) >= settings.STORY_SNAPSHOT_COMPACT_EVENTS:
+            self._write_snapshot(story_id, story, snapshot_event_id, events[-1]["id"])
+
+    def _write_snapshot(
+        self, story_id: int, story: Dict, previous_event_id: int, last_event_id: int
+    ) -> None:
+        self._execute(
+            queries.write_snapshot(
+                self.supabase,
+                story_id,
+                story_snapshot_row(story, last_event_id),
+                previous_event_id,
+            )
+        )
+        self.cache.invalidate(story_id)
+
+    def compact_story_state(self, story_id: int) -> None:
+        """Materialise all pending story events into the stories row snapshot."""
+        story_row = self._execute(
+            queries.story(
+                self.supabase,
+                story_id,
+                "key_events, setting, timeline, snapshot_event_id",
+            )
+        ).data[0]
+        story = story_state_from_row(story_row)
+        snapshot_event_id = story_row.get("snapshot_event_id") or 0
+        events = self._execute(
+            queries.pending_events(self.supabase, story_id, snapshot_event_id)
+        ).data or []
+        if events:
+            apply_story_events(story, events)
+            self._write_snapshot(story_id, story, snapshot_event_id, events[-1]["id"])
+
+    def get_story_header(self, story_id: int, with_state: bool = True) -> Dict:
+        """
+        Story row without episodes, characters or pending refinements. Pass
+        with_state=False to skip folding in pending story events when only
+        counters like current_episode / num_episodes are needed.
+        """
+        return self._cached(
+            story_id,
+            f"header:{with_state}",
+            lambda: self._load_story_header(story_id, with_state),
+        )
+
+    def _load_story_header(self, story_id: int, with_state: bool) -> Dict:
+        story_result = self._execute(
+            queries.story(self.supabase, story_id, queries.STORY_HEADER_COLUMNS)
         )
-        characters = [
+        if not story_result.data:
+            return {"error": "Story not found"}
+        story_row = story_result.data[0]
+        header = story_header_from_row(story_row)
+        if with_state:
+            self._apply_pending_events(
+                story_id, header, story_row.get("snapshot_event_id")
+            )
+        return header
+
+    def get_story(self, story_id: int) -> Dict:
+        """
+        Story header with episodes, characters and current_episodes_content
+        loaded lazily on first access.
+        """
+        header = self.get_story_header(story_id)
+        if "error" in header:
+            return header
+        return LazyStory(
+            header,
             {
-                "Name": char["name"],
-                "Role": char["role"],
-                "Description": char["description"],
-                "Relationship": json.loads(char["relationship"] or "{}"),
-                "role_active": char.get("is_active", True),
-                "Emotional_State": char.get("emotional_state", "neutral"),
-                "Milestones": json.loads(char["milestones"] or "[]"),
-            }
-            for char in characters_result.data
-        ]
-
-        return {
-            "id": story_row["id"],
-            "title": story_row["title"],
-            "setting": json.loads(story_row["setting"] or "{}"),
-            "key_events": json.loads(story_row["key_events"] or "[]"),
-            "special_instructions": story_row["special_instructions"],
-            "story_outline": json.loads(story_row["story_outline"] or "[]"),
-            "current_episode": story_row["current_episode"],
-            "episodes": episodes_list,
-            "characters": characters,
-            "summary": story_row.get("summary"),
-            "num_episodes": story_row["num_episodes"],
-            "protagonist": json.loads(story_row["protagonist"] or "[]"),
-            "timeline": json.loads(story_row["timeline"] or "[]"),
-            "current_episodes_content": json.loads(
-                story_row.get("current_episodes_content", "[]") or "[]"
-            ),  # Add current_episodes_content
-        }
+                "episodes": lambda: [
+                    episode_from_row(ep) for ep in self.get_all_episodes(story_id)
+                ],
+                "characters": lambda: self.get_story_characters(story_id),
+                "current_episodes_content": lambda: self.get_refined_episodes(
+                    story_id
+                ),
+            },
+        )
+
+    def get_story_characters(self, story_id: int) -> List[Dict[str, Any]]:
+        return self._cached(
+            story_id,
+            "characters",
+            lambda: [
+                character_from_row(char) for char in self.get_character_rows(story_id)
+            ],
+        )
+
+    def get_character_rows(self, story_id: int) -> List[Dict[str, Any]]:
+        """Raw characters rows, the form update_character_state merges into."""
+        return (
+            self._execute(queries.story_characters(self.supabase, story_id)).data
+            or []
+        )
 
     def store_story_metadata(self, metadata: Dict, num_episodes: int) -> int:
-        result = (
-            self.supabase.table("stories")
-            .insert(
-                {
-                    "title": metadata.get("Title", "Untitled Story"),
-                    "protagonist": json.dumps(metadata.get("Protagonist", [])),
-                    "setting": json.dumps(metadata.get("Settings", {})),
-                    "key_events": json.dumps([]),
-                    "timeline": json.dumps([]),
-                    "special_instructions": metadata.get("Special Instructions", ""),
-                    "story_outline": json.dumps(metadata.get("Story Outline", [])),
-                    "current_episode": 1,
-                    "num_episodes": num_episodes,
-                    "current_episodes_content": json.dumps(
-                        []
-                    ),  # Initialize current_episodes_content
-                }
+        result = self._execute(
+            queries.insert_story(
+                self.supabase, story_row_from_metadata(metadata, num_episodes)
             )
-            .execute()
         )
         story_id = result.data[0]["id"]
 
-        character_data_list = [
-            {
-                "story_id": story_id,
-                "name": char["Name"],
-                "role": char["Role"],
-                "description": char["Description"],
-                "relationship": json.dumps(char.get("Relationship", {})),
-                "emotional_state": char.get("Emotional_State", "neutral"),
-                "is_active": True,
-                "milestones": json.dumps([]),
-            }
-            for char in metadata.get("Characters", [])
-        ]
+        character_data_list = character_rows_from_metadata(story_id, metadata)
         if character_data_list:
-            self.supabase.table("characters").insert(character_data_list).execute()
+            self._execute(queries.insert_characters(self.supabase, character_data_list))
         return story_id
 
     def update_character_state(self, story_id: int, character_data: List[Dict]) -> None:
-        # Separate existing characters and new characters
-        for char in character_data:
-            # Query for existing character
-            current_char = (
-                self.supabase.table("characters")
-                .select("*")
-                .eq("story_id", story_id)
-                .eq("name", char["Name"])
-                .execute()
-                .data
+        """
+        Merge the featured characters into the story's cast with one read and one
+        bulk upsert keyed on (story_id, name), whatever the size of the cast.
+        """
+        if not character_data:
+            return
+        existing = self.get_character_rows(story_id)
+        self._execute(
+            queries.upsert_characters(
+                self.supabase, merge_character_rows(story_id, existing, character_data)
             )
-
-            if current_char:
-                # Existing character: Update by ID
-                current = current_char[0]
-                new_emotional = char.get(
-                    "Emotional_State", current.get("emotional_state", "neutral")
-                )
-                milestones = json.loads(current.get("milestones", "[]"))
-                if new_emotional != current.get("emotional_state"):
-                    milestones.append(
-                        {
-                            "event": f"Shift to {new_emotional}",
-                            "episode": current.get("last_episode", 0) + 1,
-                        }
-                    )
-
-                # Update existing character by ID
-                self.supabase.table("characters").update(
-                    {
-                        "role": char.get("Role", current.get("role", "Unknown")),
-                        "description": char.get(
-                            "Description", current.get("description", "No description")
-                        ),
-                        "relationship": json.dumps(
-                            {
-                                **json.loads(current.get("relationship", "{}")),
-                                **char.get("Relationship", {}),
-                            }
-                        ),
-                        "is_active": char.get(
-                            "role_active", current.get("is_active", True)
-                        ),
-                        "emotional_state": new_emotional,
-                        "milestones": json.dumps(milestones[-5:]),
-                        "last_episode": current.get("last_episode", 0) + 1,
-                    }
-                ).eq("id", current["id"]).execute()
-            else:
-                # New character: Insert without ID
-                new_emotional = char.get("Emotional_State", "neutral")
-                self.supabase.table("characters").insert(
-                    {
-                        "story_id": story_id,
-                        "name": char["Name"],
-                        "role": char.get("Role", "Unknown"),
-                        "description": char.get("Description", "No description"),
-                        "relationship": json.dumps(char.get("Relationship", {})),
-                        "is_active": char.get("role_active", True),
-                        "emotional_state": new_emotional,
-                        "milestones": json.dumps([]),
-                        "last_episode": 1,
-                    }
-                ).execute()
+        )
+        self.cache.invalidate(story_id)
 
     def store_episode(
         self, story_id: int, episode_data: Dict, current_episode: int
     ) -> int:
-        episode_result = (
-            self.supabase.table("episodes")
-            .upsert(
-                {
-                    "story_id": story_id,
-                    "episode_number": current_episode,
-                    "title": episode_data.get(
-                        "episode_title", f"Episode {current_episode}"
-                    ),
-                    "content": episode_data.get("episode_content", ""),
-                    "summary": episode_data.get("episode_summary", ""),
-                    "key_events": json.dumps(episode_data.get("Key Events", [])),
-                    "emotional_state": episode_data.get(
-                        "episode_emotional_state", "neutral"
-                    ),
-                },
-                on_conflict="story_id,episode_number",
+        round_trips_before = _round_trips.get()
+        episode_result = self._execute(
+            queries.upsert_episode(
+                self.supabase, episode_row(story_id, episode_data, current_episode)
             )
-            .execute()
         )
         episode_id = episode_result.data[0]["id"]
 
@@ -215,91 +240,478 @@ class DBService:
             story_id, episode_data.get("characters_featured", [])
         )
 
-        story_data = (
-            self.supabase.table("stories")
-            .select("key_events, setting, timeline")
-            .eq("id", story_id)
-            .execute()
-            .data[0]
+        # Write only this episode's events; the stories row is not rewritten.
+        # Re-storing an episode with new key events or settings (regeneration)
+        # replaces its old events; data without them (a validated batch)
+        # leaves the stored events alone.
+        replaced = []
+        if "Key Events" in episode_data or "Settings" in episode_data:
+            replaced = self._execute(
+                queries.delete_episode_events(self.supabase, story_id, current_episode)
+            ).data or []
+        events = story_events_from_episode(story_id, episode_data, current_episode)
+        if events:
+            self._execute(queries.upsert_events(self.supabase, events))
+        if replaced:
+            self._retract_compacted_events(story_id, replaced)
+        self._execute(
+            queries.update_story(
+                self.supabase, story_id, {"current_episode": current_episode + 1}
+            )
+        )
+        self.cache.invalidate(story_id)
+        metrics.observe(
+            "db_round_trips_per_episode", _round_trips.get() - round_trips_before
         )
-        current_key_events = json.loads(story_data["key_events"] or "[]")
-        current_timeline = json.loads(story_data["timeline"] or "[]")
-        new_key_events = [
-            event["event"]
-            for event in episode_data.get("Key Events", [])
-            if event["tier"] in ["foundational", "character-defining"]
-        ]
-        new_timeline = [
-            {
-                "event": e["event"],
-                "episode": current_episode,
-                "resolved": e["tier"] in ["foundational", "character-defining"],
-            }
-            for e in episode_data.get("Key Events", [])
-        ]
-        self.supabase.table("stories").update(
-            {
-                "current_episode": current_episode + 1,
-                "setting": json.dumps(
-                    {
-                        **json.loads(story_data["setting"]),
-                        **episode_data.get("Settings", {}),
-                    }
-                ),
-                "key_events": json.dumps(
-                    list(set(current_key_events + new_key_events))
-                ),
-                "timeline": json.dumps(current_timeline + new_timeline),
-            }
-        ).eq("id", story_id).execute()
         return episode_id
 
+    def _retract_compacted_events(self, story_id: int, replaced: List[Dict]) -> None:
+        """
+        Take replaced events that were already folded into the stories row
+        snapshot back out of it. Their timeline entries and key events are
+        removed; a setting keeps its description until a later event
+        overwrites it.
+        """
+        story_rows = self._execute(
+            queries.story(
+                self.supabase,
+                story_id,
+                "key_events, setting, timeline, snapshot_event_id",
+            )
+        ).data
+        if not story_rows:
+            return
+        snapshot_event_id = story_rows[0].get("snapshot_event_id") or 0
+        compacted = [event for event in replaced if event["id"] <= snapshot_event_id]
+        if not compacted:
+            return
+        kept_key_events = set()
+        if any(event["kind"] == "key_event" for event in compacted):
+            kept_key_events = {
+                _event_payload(event)["event"]
+                for event in self._execute(
+                    queries.compacted_key_events(
+                        self.supabase, story_id, snapshot_event_id
+                    )
+                ).data
+                or []
+            }
+        story = story_state_from_row(story_rows[0])
+        retract_story_events(story, compacted, kept_key_events)
+        self._write_snapshot(story_id, story, snapshot_event_id, snapshot_event_id)
+
     def get_previous_episodes(
         self, story_id: int, current_episode: int, limit: int = 3
     ) -> List[Dict]:
-        result = (
-            self.supabase.table("episodes")
-            .select("*")
-            .eq("story_id", story_id)
-            .lt("episode_number", current_episode)
-            .order("episode_number", desc=True)
-            .limit(limit)
-            .execute()
+        result = self._execute(
+            queries.previous_episodes(self.supabase, story_id, current_episode, limit)
+        )
+        return [previous_episode_from_row(ep) for ep in result.data or []]
+
+    def get_episodes_by_range(
+        self, story_id: int, start_episode: int, end_episode: int, columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        result = self._execute(
+            queries.episodes_by_range(
+                self.supabase, story_id, start_episode, end_episode, columns
+            )
+        )
+        return result.data or []
+
+    def get_all_episodes(
+        self, story_id: int, columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        return self._cached(
+            story_id,
+            f"episodes:{columns}",
+            lambda: self._execute(
+                queries.story_episodes(self.supabase, story_id, columns)
+            ).data
+            or [],
         )
-        return [
-            {
-                "episode_number": ep["episode_number"],
-                "content": ep["content"],  # Full content for display
-                "title": ep["title"],
-                "emotional_state": ep["emotional_state"],
-                "key_events": json.loads(ep["key_events"] or "[]"),
-            }
-            for ep in result.data or []
-        ]
 
     def update_story_current_episodes_content(
         self, story_id: int, episodes: List[Dict]
     ):
         """Update the current_episodes_content field in the stories table with refined episodes."""
-        self.supabase.table("stories").update(
-            {"current_episodes_content": json.dumps(episodes)}
-        ).eq("id", story_id).execute()
+        self._execute(
+            queries.set_current_episodes_content(self.supabase, story_id, episodes)
+        )
+        self.cache.invalidate(story_id)
+
+    def update_current_episode(self, story_id: int, current_episode: int) -> None:
+        self._execute(
+            queries.update_story(
+                self.supabase, story_id, {"current_episode": current_episode}
+            )
+        )
+        self.cache.invalidate(story_id)
+
+    def update_story_summary(self, story_id: int, summary: str) -> None:
+        self._execute(
+            queries.update_story(self.supabase, story_id, {"summary": summary})
+        )
+        self.cache.invalidate(story_id)
 
     def get_refined_episodes(self, story_id: int) -> List[Dict]:
         """Retrieve the refined episodes from current_episodes_content if they exist."""
-        story_data = self.get_story_info(story_id)
-        return story_data.get("current_episodes_content", [])
+        return self._cached(
+            story_id,
+            "current_episodes_content",
+            lambda: refined_episodes_from_rows(
+                self._execute(
+                    queries.story(self.supabase, story_id, "current_episodes_content")
+                ).data
+            ),
+        )
 
     def clear_current_episodes_content(self, story_id: int):
         """Clear the current_episodes_content field after validation."""
-        self.supabase.table("stories").update(
-            {"current_episodes_content": json.dumps([])}
-        ).eq("id", story_id).execute()
+        self._execute(queries.set_current_episodes_content(self.supabase, story_id, []))
+        self.cache.invalidate(story_id)
+
+    def create_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return self._execute(queries.insert_job(self.supabase, job)).data[0]
+
+    def update_job(
+        self,
+        job_id: str,
+        fields: Dict[str, Any],
+        from_statuses: Optional[Sequence[str]] = None,
+    ) -> bool:
+        """
+        Update a job; with from_statuses, only while its status is one of
+        them. Returns whether a row was updated.
+        """
+        return bool(
+            self._execute(
+                queries.update_job(self.supabase, job_id, fields, from_statuses)
+            ).data
+        )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        result = self._execute(queries.job(self.supabase, job_id))
+        return result.data[0] if result.data else None
 
     def delete_story(self, story_id: int) -> None:
         """Delete a story from the database."""
-        story = self.supabase.table("stories").select("id").eq("id", story_id).execute()
+        story = self._execute(queries.story(self.supabase, story_id, "id"))
         if not story.data:
             raise ValueError(f"Story with ID {story_id} not found")
 
-        self.supabase.table("stories").delete().eq("id", story_id).execute()
+        self._execute(queries.delete_story(self.supabase, story_id))
+        self.cache.invalidate(story_id)
+
+
+# Row <-> dict mapping shared by DBService and AsyncDBService
+
+
+def episode_from_row(ep: Dict) -> Dict[str, Any]:
+    return {
+        "id": ep["id"],
+        "number": ep["episode_number"],
+        "title": ep["title"],
+        "content": ep["content"],
+        "summary": ep["summary"],
+        "emotional_state": ep.get("emotional_state", "neutral"),
+        "key_events": json.loads(ep["key_events"] or "[]"),
+    }
+
+
+def previous_episode_from_row(ep: Dict) -> Dict[str, Any]:
+    return {
+        "episode_number": ep["episode_number"],
+        "content": ep["content"],  # Full content for display
+        "title": ep["title"],
+        "emotional_state": ep["emotional_state"],
+        "key_events": json.loads(ep["key_events"] or "[]"),
+    }
+
+
+def character_from_row(char: Dict) -> Dict[str, Any]:
+    return {
+        "Name": char["name"],
+        "Role": char["role"],
+        "Description": char["description"],
+        "Relationship": json.loads(char["relationship"] or "{}"),
+        "role_active": char.get("is_active", True),
+        "Emotional_State": char.get("emotional_state", "neutral"),
+        "Milestones": json.loads(char["milestones"] or "[]"),
+    }
+
+
+def story_header_from_row(story_row: Dict) -> Dict[str, Any]:
+    return {
+        "id": story_row["id"],
+        "title": story_row["title"],
+        "setting": json.loads(story_row["setting"] or "{}"),
+        "key_events": json.loads(story_row["key_events"] or "[]"),
+        "special_instructions": story_row["special_instructions"],
+        "story_outline": json.loads(story_row["story_outline"] or "[]"),
+        "current_episode": story_row["current_episode"],
+        "summary": story_row.get("summary"),
+        "num_episodes": story_row["num_episodes"],
+        "protagonist": json.loads(story_row["protagonist"] or "[]"),
+        "timeline": json.loads(story_row["timeline"] or "[]"),
+    }
+
+
+def story_from_rows(
+    story_row: Dict, episode_rows: List[Dict], character_rows: List[Dict]
+) -> Dict[str, Any]:
+    return {
+        **story_header_from_row(story_row),
+        "episodes": [episode_from_row(ep) for ep in episode_rows],
+        "characters": [character_from_row(char) for char in character_rows],
+        "current_episodes_content": json.loads(
+            story_row.get("current_episodes_content", "[]") or "[]"
+        ),  # Add current_episodes_content
+    }
+
+
+def refined_episodes_from_rows(story_rows: List[Dict]) -> List[Dict]:
+    if not story_rows:
+        return []
+    return json.loads(story_rows[0].get("current_episodes_content") or "[]")
+
+
+class LazyStory(dict):
+    """
+    A story header that fetches its heavy sub-collections (episodes,
+    characters, current_episodes_content) only when a caller first reads them.
+    """
+
+    def __init__(self, header: Dict[str, Any], loaders: Dict[str, Callable[[], Any]]):
+        super().__init__(header)
+        self._loaders = loaders
+
+    def __missing__(self, key):
+        if key not in self._loaders:
+            raise KeyError(key)
+        value = self[key] = self._loaders.pop(key)()
+        return value
+
+    def __contains__(self, key) -> bool:
+        return super().__contains__(key) or key in self._loaders
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+def story_row_from_metadata(metadata: Dict, num_episodes: int) -> Dict[str, Any]:
+    return {
+        "title": metadata.get("Title", "Untitled Story"),
+        "protagonist": json.dumps(metadata.get("Protagonist", [])),
+        "setting": json.dumps(metadata.get("Settings", {})),
+        "key_events": json.dumps([]),
+        "timeline": json.dumps([]),
+        "special_instructions": metadata.get("Special Instructions", ""),
+        "story_outline": json.dumps(metadata.get("Story Outline", [])),
+        "current_episode": 1,
+        "num_episodes": num_episodes,
+        "current_episodes_content": json.dumps(
+            []
+        ),  # Initialize current_episodes_content
+    }
+
+
+def character_rows_from_metadata(story_id: int, metadata: Dict) -> List[Dict]:
+    return [
+        {
+            "story_id": story_id,
+            "name": char["Name"],
+            "role": char["Role"],
+            "description": char["Description"],
+            "relationship": json.dumps(char.get("Relationship", {})),
+            "emotional_state": char.get("Emotional_State", "neutral"),
+            "is_active": True,
+            "milestones": json.dumps([]),
+        }
+        for char in metadata.get("Characters", [])
+    ]
+
+
+def merged_character_row(current: Dict, char: Dict) -> Dict[str, Any]:
+    new_emotional = char.get(
+        "Emotional_State", current.get("emotional_state", "neutral")
+    )
+    milestones = json.loads(current.get("milestones", "[]"))
+    if new_emotional != current.get("emotional_state"):
+        milestones.append(
+            {
+                "event": f"Shift to {new_emotional}",
+                "episode": current.get("last_episode", 0) + 1,
+            }
+        )
+    return {
+        "role": char.get("Role", current.get("role", "Unknown")),
+        "description": char.get(
+            "Description", current.get("description", "No description")
+        ),
+        "relationship": json.dumps(
+            {
+                **json.loads(current.get("relationship", "{}")),
+                **char.get("Relationship", {}),
+            }
+        ),
+        "is_active": char.get("role_active", current.get("is_active", True)),
+        "emotional_state": new_emotional,
+        "milestones": json.dumps(milestones[-5:]),
+        "last_episode": current.get("last_episode", 0) + 1,
+    }
+
+
+CHARACTER_COLUMNS = (
+    "story_id",
+    "name",
+    "role",
+    "description",
+    "relationship",
+    "is_active",
+    "emotional_state",
+    "milestones",
+    "last_episode",
+)
+
+
+def merge_character_rows(
+    story_id: int, existing_rows: List[Dict], character_data: List[Dict]
+) -> List[Dict]:
+    """
+    Apply every featured character to the stored cast in memory and return one
+    row per name, ready for a bulk upsert. Repeated names merge in order.
+    """
+    existing = {row["name"]: row for row in existing_rows}
+    merged: Dict[str, Dict] = {}
+    for char in character_data:
+        name = char["Name"]
+        current = merged.get(name) or existing.get(name)
+        if current:
+            merged[name] = {**current, **merged_character_row(current, char)}
+        else:
+            merged[name] = new_character_row(story_id, char)
+    return [
+        {column: row.get(column) for column in CHARACTER_COLUMNS}
+        for row in merged.values()
+    ]
+
+
+def new_character_row(story_id: int, char: Dict) -> Dict[str, Any]:
+    return {
+        "story_id": story_id,
+        "name": char["Name"],
+        "role": char.get("Role", "Unknown"),
+        "description": char.get("Description", "No description"),
+        "relationship": json.dumps(char.get("Relationship", {})),
+        "is_active": char.get("role_active", True),
+        "emotional_state": char.get("Emotional_State", "neutral"),
+        "milestones": json.dumps([]),
+        "last_episode": 1,
+    }
+
+
+def episode_row(story_id: int, episode_data: Dict, current_episode: int) -> Dict:
+    return {
+        "story_id": story_id,
+        "episode_number": current_episode,
+        "title": episode_data.get("episode_title", f"Episode {current_episode}"),
+        "content": episode_data.get("episode_content", ""),
+        "summary": episode_data.get("episode_summary", ""),
+        "key_events": json.dumps(episode_data.get("Key Events", [])),
+        "emotional_state": episode_data.get("episode_emotional_state", "neutral"),
+    }
+
+
+def story_state_from_row(story_row: Dict) -> Dict[str, Any]:
+    return {
+        "setting": json.loads(story_row["setting"] or "{}"),
+        "key_events": json.loads(story_row["key_events"] or "[]"),
+        "timeline": json.loads(story_row["timeline"] or "[]"),
+    }
+
+
+def story_snapshot_row(story: Dict, last_event_id: int) -> Dict[str, Any]:
+    return {
+        "setting": json.dumps(story["setting"]),
+        "key_events": json.dumps(story["key_events"]),
+        "timeline": json.dumps(story["timeline"]),
+        "snapshot_event_id": last_event_id,
+    }
+
+
+def _story_event(
+    story_id: int, episode_number: int, kind: str, payload: Dict
+) -> Dict[str, Any]:
+    encoded = json.dumps(payload, sort_keys=True)
+    return {
+        "story_id": story_id,
+        "episode_number": episode_number,
+        "kind": kind,
+        "payload": payload,
+        # Repeated events within one episode collapse to a single row
+        "event_key": hashlib.md5(encoded.encode("utf-8")).hexdigest(),
+    }
+
+
+def story_events_from_episode(
+    story_id: int, episode_data: Dict, current_episode: int
+) -> List[Dict]:
+    events = []
+    for e in episode_data.get("Key Events", []):
+        defining = e["tier"] in ["foundational", "character-defining"]
+        if defining:
+            events.append(
+                _story_event(story_id, current_episode, "key_event", {"event": e["event"]})
+            )
+        events.append(
+            _story_event(
+                story_id,
+                current_episode,
+                "timeline",
+                {"event": e["event"], "episode": current_episode, "resolved": defining},
+            )
+        )
+    for place, description in episode_data.get("Settings", {}).items():
+        events.append(
+            _story_event(story_id, current_episode, "setting", {place: description})
+        )
+    return events
+
+
+def _event_payload(event: Dict) -> Dict:
+    payload = event["payload"]
+    return json.loads(payload) if isinstance(payload, str) else payload
+
+
+def apply_story_events(story: Dict, events: List[Dict]) -> None:
+    """Fold story_events rows, in id order, into a parsed story state."""
+    seen_key_events = set(story["key_events"])
+    for event in events:
+        payload = _event_payload(event)
+        if event["kind"] == "key_event":
+            if payload["event"] not in seen_key_events:
+                seen_key_events.add(payload["event"])
+                story["key_events"].append(payload["event"])
+        elif event["kind"] == "timeline":
+            story["timeline"].append(payload)
+        elif event["kind"] == "setting":
+            story["setting"].update(payload)
+
+
+def retract_story_events(
+    story: Dict, events: List[Dict], kept_key_events: set
+) -> None:
+    """
+    Undo apply_story_events for timeline and key_event rows. A key event is
+    kept while another folded event (kept_key_events) still records it.
+    """
+    for event in events:
+        payload = _event_payload(event)
+        if event["kind"] == "timeline" and payload in story["timeline"]:
+            story["timeline"].remove(payload)
+        elif (
+            event["kind"] == "key_event"
+            and payload["event"] not in kept_key_events
+            and payload["event"] in story["key_events"]
+        ):
+            story["key_events"].remove(payload["event"])
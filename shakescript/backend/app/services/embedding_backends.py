@@ -0,0 +1,130 @@
+import os
+from typing import Any, List
+import numpy as np
+from app.core.config import settings
+
+ONNX_PREFIX = "onnx:"
+
+
+def build_embedding_model(spec: str, batch_size: int, num_threads: int = 0) -> Any:
+    """
+    Build the embedding model named by Settings.EMBEDDING_MODEL.
+
+    "onnx:<model>" runs the model's int8 ONNX export on ONNX Runtime; any
+    other value is loaded through llama_index's HuggingFaceEmbedding
+    (PyTorch). Both expose get_text_embedding and get_text_embedding_batch
+    and return L2-normalised vectors.
+    """
+    if spec.startswith(ONNX_PREFIX):
+        return OnnxEmbedding(
+            spec[len(ONNX_PREFIX) :],
+            model_file=settings.EMBEDDING_ONNX_FILE,
+            embed_batch_size=batch_size,
+            num_threads=num_threads,
+        )
+
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    if num_threads:
+        import torch
+
+        torch.set_num_threads(num_threads)
+    return HuggingFaceEmbedding(model_name=spec, embed_batch_size=batch_size)
+
+
+class OnnxEmbedding:
+    """
+    Sentence-transformers model (mean pooling + normalisation) on ONNX
+    Runtime. Needs only onnxruntime, tokenizers and huggingface_hub (see
+    requirements-onnx.txt), so torch is never imported.
+
+    model_name is a local directory or a Hub id; short names such as
+    all-MiniLM-L6-v2 resolve to the sentence-transformers organisation.
+    model_file picks the export inside it: sentence-transformers publishes
+    int8 ones per CPU family (onnx/model_quint8_avx2.onnx,
+    onnx/model_qint8_avx512_vnni.onnx, onnx/model_qint8_arm64.onnx).
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        model_file: str = "onnx/model_quint8_avx2.onnx",
+        embed_batch_size: int = 64,
+        num_threads: int = 0,
+        max_length: int = 256,
+    ):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                f"EMBEDDING_MODEL=onnx:{model_name} needs onnxruntime; "
+                "install requirements-onnx.txt"
+            ) from e
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.embed_batch_size = embed_batch_size
+        model_dir = self._model_dir(model_name, model_file)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        dimension = len(self.get_text_embedding("dimension check"))
+        if dimension != settings.VECTOR_DIMENSION:
+            raise ValueError(
+                f"{model_name} produces {dimension}-dimensional vectors, "
+                f"VECTOR_DIMENSION is {settings.VECTOR_DIMENSION}"
+            )
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self.get_text_embedding_batch([text])[0]
+
+    def get_query_embedding(self, query: str) -> List[float]:
+        return self.get_text_embedding(query)
+
+    def get_text_embedding_batch(self, texts: List[str], **kwargs) -> List[List[float]]:
+        embeddings: List[List[float]] = []
+        for start in range(0, len(texts), self.embed_batch_size):
+            embeddings.extend(
+                self._embed(texts[start : start + self.embed_batch_size]).tolist()
+            )
+        return embeddings
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.array(
+                [e.type_ids for e in encodings], dtype=np.int64
+            )
+        token_embeddings = self.session.run(None, feed)[0]
+
+        # Mean over real tokens, then L2-normalise, as sentence-transformers does
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(
+            mask.sum(axis=1), 1e-9, None
+        )
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    @staticmethod
+    def _model_dir(model_name: str, model_file: str) -> str:
+        if os.path.isdir(model_name):
+            return model_name
+        from huggingface_hub import snapshot_download
+
+        repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        return snapshot_download(repo_id, allow_patterns=["tokenizer.json", model_file])
@@ -0,0 +1,96 @@
+import hashlib
+import re
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.core.metrics import metrics
+
+
+def normalise_text(text: str) -> str:
+    """Whitespace differences do not change what a chunk means."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class CachedEmbeddingModel:
+    """
+    Wraps an embedding model so each distinct text is embedded once. Vectors
+    are keyed on (model name, hash of the normalised text) and stored as
+    float32 bytes in a memory LRU, with an optional on-disk store behind it
+    that survives restarts; disk hits are promoted to memory.
+
+    The semantic splitter and the retrieval queries both go through this
+    wrapper, so re-ingesting a lightly edited episode only embeds the
+    sentence groups whose text changed.
+    """
+
+    def __init__(self, model, model_name: str, memory, disk=None):
+        self.model = model
+        self.model_name = model_name
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self.get_text_embedding_batch([text])[0]
+
+    def get_query_embedding(self, query: str) -> List[float]:
+        return self.get_text_embedding(query)
+
+    def get_text_embedding_batch(self, texts: List[str], **kwargs) -> List[List[float]]:
+        keys = [self.cache_key(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            vector = self._lookup(key)
+            if vector is None:
+                missing[key] = text
+            else:
+                found[key] = vector
+
+        if missing:
+            # One batched model call for everything not cached yet
+            vectors = self.model.get_text_embedding_batch(list(missing.values()), **kwargs)
+            for key, vector in zip(missing, vectors):
+                # Hand back the stored float32 values, so a text's vector is
+                # the same whether or not it came from the cache
+                found[key] = self._store(key, vector)
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        metrics.inc("embedding_cache_requests_total", len(texts) - len(missing), result="hit")
+        metrics.inc("embedding_cache_requests_total", len(missing), result="miss")
+        metrics.set("embedding_cache_hit_ratio", self.hit_rate)
+        return [found[key] for key in keys]
+
+    def cache_key(self, text: str) -> str:
+        payload = f"{self.model_name}\0{normalise_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                metrics.inc("embedding_cache_disk_hits_total")
+                self.memory.set(key, value)
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype=np.float32).tolist()
+
+    def _store(self, key: str, vector: List[float]) -> List[float]:
+        array = np.asarray(vector, dtype=np.float32)
+        value = array.tobytes()
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+        return array.tolist()
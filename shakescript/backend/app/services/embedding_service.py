@@ -1,23 +1,69 @@
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.core.node_parser import SemanticSplitterNodeParser
-from llama_index.core.schema import Document
 from app.core.config import settings
+from app.core.tracing import current_span, tracer
 from app.services.db_service import DBService
-from typing import List, Dict
+from app.services.semantic_splitter import SemanticSplitter
+from app.services.chunk_index import ChunkIndexManager
+from app.utils.vector_codec import decode_vector, encode_vector
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+import numpy as np
 import json
+import re
+import time
 
+if TYPE_CHECKING:
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 
-class EmbeddingService:
-    def __init__(self):
-        self.embedding_model = HuggingFaceEmbedding(model_name=settings.EMBEDDING_MODEL)
-        self.db_service = DBService()
-        self.splitter = SemanticSplitterNodeParser(
-            buffer_size=1,
-            breakpoint_percentile_threshold=95,
-            embed_model=self.embedding_model,
+
+class StoryContext:
+    """
+    Story-level facts needed to score chunk importance, loaded once per ingestion.
+    """
+
+    def __init__(self, num_episodes: int, protagonist_names: List[str]):
+        self.num_episodes = num_episodes
+        self.midpoint = int(num_episodes * 0.5)
+        self.protagonist_names = protagonist_names
+
+    @classmethod
+    def from_story(cls, story: Dict) -> "StoryContext":
+        protagonist = story.get("protagonist") or []
+        if isinstance(protagonist, str):
+            protagonist = json.loads(protagonist or "[]")
+        return cls(
+            story.get("num_episodes") or 0,
+            [p["Name"] for p in protagonist if isinstance(p, dict) and p.get("Name")],
         )
 
-    
+
+class EmbeddingService:
+    def __init__(
+        self,
+        embedding_model: "HuggingFaceEmbedding",
+        db_service: DBService,
+        chunk_index: Optional[ChunkIndexManager] = None,
+    ):
+        self.embedding_model = embedding_model
+        self.db_service = db_service
+        self.chunk_index = chunk_index
+        self._splitter: Optional[SemanticSplitter] = None
+        # Cleared once PostgREST reports the sql/005 functions do not exist
+        self._packed_transport = settings.EMBEDDING_TRANSPORT != "text"
+
+    @property
+    def splitter(self) -> SemanticSplitter:
+        if self._splitter is None:
+            self._splitter = SemanticSplitter(
+                self.embedding_model,
+                buffer_size=1,
+                breakpoint_percentile_threshold=95,
+            )
+        return self._splitter
+
+    def load_story_context(self, story_id: int) -> StoryContext:
+        header = self.db_service.get_story_header(story_id, with_state=False)
+        return StoryContext.from_story({} if "error" in header else header)
+
+    @tracer.traced("embedding.store_chunks")
     def _process_and_store_chunks(
         self,
         story_id: int,
@@ -25,17 +71,25 @@ class EmbeddingService:
         episode_number: int,
         content: str,
         characters: List[str],
+        story_context: Optional[StoryContext] = None,
     ):
-        doc = Document(text=content)
-        nodes = self.splitter.get_nodes_from_documents([doc])
+        if story_context is None:
+            story_context = self.load_story_context(story_id)
+        # The splitter returns an embedding of each chunk's text
+        chunks, embeddings = self.splitter.split(content)
         characters_json = json.dumps(characters)
+        name_pattern = _compile_name_pattern(
+            characters + story_context.protagonist_names
+        )
+
+        span = current_span()
+        span.set_attribute("episode.number", episode_number)
+        span.set_attribute("embedding.chunks", len(chunks))
 
         chunk_data = []
-        for chunk_number, node in enumerate(nodes):
-            chunk_text = node.text
-            embedding = self.embedding_model.get_text_embedding(chunk_text)
+        for chunk_number, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
             importance_score = self._calculate_importance_score(
-                story_id, chunk_text, characters, episode_number
+                chunk_text, name_pattern, characters, episode_number, story_context
             )
 
             chunk_data.append({
@@ -45,76 +99,323 @@ class EmbeddingService:
                 "chunk_number": chunk_number,
                 "content": chunk_text,
                 "characters": characters_json,
-                "embedding": "[" + ",".join(map(str, embedding)) + "]",
+                "embedding": embedding,
                 "importance_score": importance_score,
             })
 
-        result = (
-            self.db_service.supabase.table("chunks")
-            .insert(chunk_data)
-            .execute()
-        )
+        ids = self._insert_chunks(chunk_data)
+        if self.chunk_index is not None:
+            self.chunk_index.add(
+                story_id,
+                [{**chunk, "id": chunk_id} for chunk, chunk_id in zip(chunk_data, ids)],
+                [chunk["embedding"] for chunk in chunk_data],
+            )
 
+    def _insert_chunks(self, chunk_data: List[Dict]) -> List[Optional[int]]:
+        """
+        Insert chunks with packed embeddings through the insert_chunks
+        function, or as pgvector text when it is not deployed. Returns the
+        new chunk ids. Any other RPC failure is raised rather than retried
+        as text: after a timeout the chunks may already have been inserted.
+        """
+        if self._packed_transport:
+            packed = [
+                {
+                    **{k: v for k, v in chunk.items() if k != "embedding"},
+                    "embedding_packed": encode_vector(
+                        chunk["embedding"], settings.EMBEDDING_TRANSPORT
+                    ),
+                }
+                for chunk in chunk_data
+            ]
+            try:
+                result = self.db_service._execute(
+                    self.db_service.supabase.rpc("insert_chunks", {"p_chunks": packed})
+                )
+                return list(result.data or [None] * len(chunk_data))
+            except Exception as e:
+                if not _missing_function(e):
+                    raise
+                print(f"insert_chunks is not deployed, sending embeddings as text: {e}")
+                self._packed_transport = False
 
+        result = self.db_service._execute(
+            self.db_service.supabase.table("chunks").insert(
+                [
+                    {
+                        **chunk,
+                        "embedding": "[" + ",".join(map(str, chunk["embedding"])) + "]",
+                    }
+                    for chunk in chunk_data
+                ]
+            )
+        )
+        return [row.get("id") for row in result.data] if result.data else [None] * len(chunk_data)
+
+    @tracer.traced("embedding.retrieve")
     def retrieve_relevant_chunks(
         self,
         story_id: int,
         current_episode_info: str,
         k: int = 5,
         character_names: List[str] = [],
+        time_budget_ms: Optional[int] = None,
+        before_episode: Optional[int] = None,
     ) -> List[Dict]:
-        query_embedding = self.embedding_model.get_text_embedding(current_episode_info)
-        query_embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
-
-        query = (
-            self.db_service.supabase.table("chunks")
-            .select("id, episode_number, chunk_number, content, importance_score")
-            .eq("story_id", story_id)
+        """
+        Return the k chunks that best match the query, ranked by a blend of
+        cosine similarity, importance score and recency. before_episode keeps
+        only chunks from earlier episodes, whichever source answers.
+        """
+        budget_ms = (
+            settings.RETRIEVAL_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
         )
-        if character_names:
-            query = query.contains("characters", character_names)  # Use JSON contains
-        chunks_result = query.order("importance_score", desc=True).limit(k).execute()
+        deadline = time.perf_counter() + budget_ms / 1000
+        candidate_count = k * settings.RETRIEVAL_CANDIDATE_MULTIPLIER
 
-        # Add foundational chunks
-        foundational_chunks = (
-            self.db_service.supabase.table("chunks")
-            .select("id, episode_number, chunk_number, content, importance_score")
-            .eq("story_id", story_id)
-            .in_(
-                "episode_number",
-                [
-                    1,
-                    int(self.db_service.get_story_info(story_id)["num_episodes"] * 0.5),
-                ],
+        with tracer.span("embedding.embed", **{"embedding.texts": 1}):
+            query_embedding = self.embedding_model.get_text_embedding(current_episode_info)
+
+        candidates, source = None, None
+        if self.chunk_index is not None:
+            candidates = self.chunk_index.search(
+                story_id,
+                query_embedding,
+                candidate_count,
+                character_names,
+                before_episode,
             )
-            .limit(2)
-            .execute()
-        )
+            source = "index"
+        if candidates is None and time.perf_counter() < deadline:
+            candidates = self._match_chunks_rpc(
+                story_id,
+                query_embedding,
+                candidate_count,
+                character_names,
+                before_episode,
+                deadline,
+            )
+            source = "rpc"
+        if candidates is None and time.perf_counter() < deadline:
+            candidates = self._match_chunks_local(
+                story_id,
+                query_embedding,
+                candidate_count,
+                character_names,
+                before_episode,
+                deadline,
+            )
+            source = "local"
+        if candidates is None:
+            # Out of budget: fall back to the cheap importance-only ordering
+            print(f"Retrieval budget of {budget_ms} ms exceeded for story {story_id}")
+            candidates = self._top_chunks_by_importance(
+                story_id, candidate_count, character_names, before_episode
+            )
+            source = "importance"
+        span = current_span()
+        span.set_attribute("retrieval.source", source)
+        span.set_attribute("retrieval.candidates", len(candidates))
 
-        chunks = (chunks_result.data or []) + (foundational_chunks.data or [])
         return [
             {
                 "id": chunk["id"],
                 "episode_number": chunk["episode_number"],
                 "chunk_number": chunk["chunk_number"],
                 "content": chunk["content"],
+                "score": score,
             }
-            for chunk in sorted(
-                chunks, key=lambda x: x["importance_score"], reverse=True
-            )[:k]
+            for score, chunk in self._rank_chunks(candidates)[:k]
+        ]
+
+    def _match_chunks_rpc(
+        self,
+        story_id: int,
+        query_embedding: List[float],
+        limit: int,
+        character_names: List[str],
+        before_episode: Optional[int],
+        deadline: float,
+    ) -> Optional[List[Dict]]:
+        """
+        Nearest-neighbour search in Postgres through the match_chunks pgvector
+        function, with each request bounded by the time left before deadline
+        (a perf_counter value). Returns None when the function is unavailable
+        or the request times out.
+        """
+        params = {
+            "p_story_id": story_id,
+            "match_count": limit,
+            "character_names": character_names or None,
+        }
+        if before_episode is not None:
+            # Needs sql/006; older deployments only match without it
+            params["before_episode"] = before_episode
+        if self._packed_transport:
+            try:
+                return self.db_service._execute(
+                    self.db_service.supabase.rpc(
+                        "match_chunks_packed",
+                        {
+                            **params,
+                            "query_packed": encode_vector(
+                                query_embedding, settings.EMBEDDING_TRANSPORT
+                            ),
+                        },
+                    ),
+                    timeout=_remaining(deadline),
+                ).data or []
+            except Exception as e:
+                if not _missing_function(e):
+                    print(f"match_chunks_packed failed, using local similarity: {e}")
+                    return None
+                print(f"match_chunks_packed is not deployed, querying as text: {e}")
+                self._packed_transport = False
+        try:
+            result = self.db_service._execute(
+                self.db_service.supabase.rpc(
+                    "match_chunks",
+                    {
+                        **params,
+                        "query_embedding": "[" + ",".join(map(str, query_embedding)) + "]",
+                    },
+                ),
+                timeout=_remaining(deadline),
+            )
+        except Exception as e:
+            print(f"match_chunks RPC failed, using local similarity: {e}")
+            return None
+        return result.data or []
+
+    def _match_chunks_local(
+        self,
+        story_id: int,
+        query_embedding: List[float],
+        limit: int,
+        character_names: List[str],
+        before_episode: Optional[int],
+        deadline: float,
+    ) -> Optional[List[Dict]]:
+        """
+        In-memory cosine similarity over the story's stored chunk embeddings.
+        """
+        query = (
+            self.db_service.supabase.table("chunks")
+            .select("id, episode_number, chunk_number, content, importance_score, embedding")
+            .eq("story_id", story_id)
+        )
+        if character_names:
+            query = query.contains("characters", character_names)
+        if before_episode is not None:
+            query = query.lt("episode_number", before_episode)
+        try:
+            rows = self.db_service._execute(query, timeout=_remaining(deadline)).data or []
+        except Exception as e:
+            print(f"Local chunk similarity failed: {e}")
+            return None
+        rows = [row for row in rows if row.get("embedding")]
+        if not rows:
+            return []
+
+        matrix = np.vstack([decode_vector(row["embedding"]) for row in rows])
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector)
+        similarities = matrix @ query_vector / np.where(norms == 0, 1, norms)
+
+        top = np.argsort(-similarities)[:limit]
+        return [
+            {**rows[i], "embedding": None, "similarity": float(similarities[i])}
+            for i in top
         ]
 
+    def _top_chunks_by_importance(
+        self,
+        story_id: int,
+        limit: int,
+        character_names: List[str],
+        before_episode: Optional[int] = None,
+    ) -> List[Dict]:
+        query = (
+            self.db_service.supabase.table("chunks")
+            .select("id, episode_number, chunk_number, content, importance_score")
+            .eq("story_id", story_id)
+        )
+        if character_names:
+            query = query.contains("characters", character_names)
+        if before_episode is not None:
+            query = query.lt("episode_number", before_episode)
+        return (
+            self.db_service._execute(
+                query.order("importance_score", desc=True).limit(limit)
+            ).data
+            or []
+        )
+
+    def _rank_chunks(self, chunks: List[Dict]) -> List[Tuple[float, Dict]]:
+        """
+        Combine similarity, normalised importance and recency into one score.
+        """
+        if not chunks:
+            return []
+        max_importance = max((c.get("importance_score") or 0) for c in chunks) or 1
+        latest_episode = max((c.get("episode_number") or 0) for c in chunks) or 1
+
+        ranked = []
+        for chunk in chunks:
+            score = (
+                settings.RETRIEVAL_SIMILARITY_WEIGHT * (chunk.get("similarity") or 0)
+                + settings.RETRIEVAL_IMPORTANCE_WEIGHT
+                * (chunk.get("importance_score") or 0)
+                / max_importance
+                + settings.RETRIEVAL_RECENCY_WEIGHT
+                * (chunk.get("episode_number") or 0)
+                / latest_episode
+            )
+            ranked.append((score, chunk))
+        return sorted(ranked, key=lambda item: item[0], reverse=True)
+
     def _calculate_importance_score(
-            self, story_id: int,chunk: str, characters: List[str], episode_number: int
+        self,
+        chunk: str,
+        name_pattern: Optional[re.Pattern],
+        characters: List[str],
+        episode_number: int,
+        story_context: StoryContext,
     ) -> float:
         score = 0
-        # Boost for key characters
-        for char in characters:
-            if char.lower() in chunk.lower():
-                score += 1
+        mentioned = (
+            {name.lower() for name in name_pattern.findall(chunk)}
+            if name_pattern
+            else set()
+        )
+        # Boost for key characters, and again for the protagonist
+        score += sum(1 for char in characters if char.lower() in mentioned)
+        score += sum(
+            1 for name in story_context.protagonist_names if name.lower() in mentioned
+        )
         # Boost for early or midpoint episodes
-        if episode_number == 1 or episode_number == int(
-            self.db_service.get_story_info(story_id)["num_episodes"] * 0.5
-        ):
+        if episode_number == 1 or episode_number == story_context.midpoint:
             score += 2
         return score
+
+
+def _remaining(deadline: float) -> float:
+    # Never 0, which would time the request out before it is sent
+    return max(deadline - time.perf_counter(), 0.001)
+
+
+def _missing_function(error: Exception) -> bool:
+    """True when PostgREST or Postgres reports the called function does not exist."""
+    return getattr(error, "code", None) in ("PGRST202", "42883")
+
+
+def _compile_name_pattern(names: List[str]) -> Optional[re.Pattern]:
+    """
+    One case-insensitive alternation over every name, longest first so that
+    "Anna" is preferred over "Ann".
+    """
+    names = sorted({name for name in names if name}, key=len, reverse=True)
+    if not names:
+        return None
+    return re.compile("|".join(re.escape(name) for name in names), re.IGNORECASE)
+
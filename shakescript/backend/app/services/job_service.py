@@ -0,0 +1,182 @@
+import threading
+import uuid
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.tracing import tracer
+from app.services.db_service import DBService
+from app.services.ai_service.llm_gateway import llm_priority
+from app.services.story_service import StoryService
+
+TERMINAL_JOB_STATUSES = ("cancelled", "completed", "failed")
+
+
+class JobService:
+    """
+    Runs generate-batch work on a worker pool instead of inside the HTTP
+    request. Job state and per-episode progress live in the generation_jobs
+    table, so any worker can report on a job; cancellation is cooperative and
+    takes effect between batches.
+    """
+
+    def __init__(self, story_service: StoryService, db_service: DBService):
+        self.story_service = story_service
+        self.db_service = db_service
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.JOB_WORKERS, thread_name_prefix="generation-job"
+        )
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self, story_id: int, batch_size: int, hinglish: bool, refinement_type: str
+    ) -> Dict[str, Any]:
+        job = self.db_service.create_job(
+            {
+                "id": str(uuid.uuid4()),
+                "story_id": story_id,
+                "status": "queued",
+                "params": {
+                    "batch_size": batch_size,
+                    "hinglish": hinglish,
+                    "refinement_type": refinement_type,
+                },
+                "progress": [],
+            }
+        )
+        self._enqueue(job)
+        return job
+
+    def resume(self, job_id: str) -> Dict[str, Any]:
+        """
+        Re-queue a cancelled or failed job, or one left queued / running /
+        cancelling by a worker that stopped (see _is_stale). Generation
+        restarts from the story's current_episode, so finished episodes are
+        not redone.
+        """
+        job = self.db_service.get_job(job_id)
+        if not job:
+            raise ValueError(f"Job {job_id} not found")
+        if job["status"] not in ("cancelled", "failed") and not self._is_stale(job):
+            raise ValueError(f"Job {job_id} is {job['status']} and cannot be resumed")
+        if not self.db_service.update_job(
+            job_id, {"status": "queued", "error": None}, from_statuses=[job["status"]]
+        ):
+            raise ValueError(f"Job {job_id} changed state while resuming")
+        job["status"] = "queued"
+        self._enqueue(job)
+        return job
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        job = self.db_service.get_job(job_id)
+        if not job:
+            raise ValueError(f"Job {job_id} not found")
+        if job["status"] in TERMINAL_JOB_STATUSES:
+            return job
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event:
+            event.set()
+        # A job queued or running in another worker process picks this up. The
+        # update only applies while the job is unfinished, so a job completing
+        # meanwhile keeps its final status.
+        if not self.db_service.update_job(
+            job_id, {"status": "cancelling"}, from_statuses=("queued", "running")
+        ):
+            return self.db_service.get_job(job_id) or job
+        job["status"] = "cancelling"
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.db_service.get_job(job_id)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for event in self._cancel_events.values():
+                event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _enqueue(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cancel_events[job["id"]] = threading.Event()
+        metrics.inc("generation_jobs_submitted_total")
+        self._executor.submit(self._run, job)
+
+    def _is_stale(self, job: Dict[str, Any]) -> bool:
+        """
+        An unfinished job that no worker in this process holds and that has
+        not been updated for JOB_STALE_SECONDS, e.g. after a restart.
+        """
+        if job["status"] in TERMINAL_JOB_STATUSES:
+            return False
+        with self._lock:
+            if job["id"] in self._cancel_events:
+                return False
+        updated_at = job.get("updated_at") or job.get("created_at")
+        if not updated_at:
+            return True
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(updated_at)
+        return age.total_seconds() > settings.JOB_STALE_SECONDS
+
+    def _is_cancelled(self, job_id: str, event: threading.Event) -> bool:
+        if event.is_set():
+            return True
+        # Cancellation may have been requested through another worker process
+        job = self.db_service.get_job(job_id)
+        if job and job["status"] == "cancelling":
+            event.set()
+        return event.is_set()
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        # Background work yields the LLM quota to interactive requests. Each
+        # job is its own trace, as it outlives the request that queued it.
+        with llm_priority("batch"), tracer.span(
+            "job.generate_batch", **{"job.id": job["id"], "story.id": job["story_id"]}
+        ):
+            self._run_job(job)
+
+    def _run_job(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        with self._lock:
+            event = self._cancel_events[job_id]
+        progress: List[Dict[str, Any]] = list(job.get("progress") or [])
+        params = job["params"]
+
+        def on_batch(episodes: List[Dict[str, Any]]) -> None:
+            progress.extend(
+                {
+                    "episode_number": ep.get("episode_number"),
+                    "episode_title": ep.get("episode_title"),
+                }
+                for ep in episodes
+            )
+            self.db_service.update_job(job_id, {"progress": progress})
+            metrics.inc("generation_job_episodes_total", len(episodes))
+
+        try:
+            # Only a still-queued job starts; otherwise it was cancelled meanwhile
+            if self._is_cancelled(job_id, event) or not self.db_service.update_job(
+                job_id, {"status": "running"}, from_statuses=("queued",)
+            ):
+                self.db_service.update_job(job_id, {"status": "cancelled"})
+                return
+            episodes = self.story_service.generate_and_refine_batch(
+                job["story_id"],
+                params["batch_size"],
+                params["hinglish"],
+                params["refinement_type"],
+                on_batch=on_batch,
+                should_stop=lambda: self._is_cancelled(job_id, event),
+            )
+            status = "cancelled" if event.is_set() else "completed"
+            self.db_service.update_job(job_id, {"status": status, "result": episodes})
+            metrics.inc("generation_jobs_finished_total", status=status)
+        except Exception as e:
+            print(f"Generation job {job_id} failed: {e}")
+            self.db_service.update_job(job_id, {"status": "failed", "error": str(e)})
+            metrics.inc("generation_jobs_finished_total", status="failed")
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
@@ -0,0 +1,97 @@
+from typing import Any, List, Tuple
+import numpy as np
+from app.core.tracing import current_span, tracer
+
+
+class SemanticSplitter:
+    """
+    Breakpoint-based semantic chunking, following llama_index's
+    SemanticSplitterNodeParser, that also returns an embedding of each
+    chunk's text. A chunk whose text is exactly one of the sentence groups
+    reuses that group's embedding; the rest are embedded in one more
+    batched call.
+    """
+
+    def __init__(
+        self,
+        embedding_model,
+        buffer_size: int = 1,
+        breakpoint_percentile_threshold: int = 95,
+    ):
+        self.embedding_model = embedding_model
+        self.buffer_size = buffer_size
+        self.breakpoint_percentile_threshold = breakpoint_percentile_threshold
+        # llama_index (and nltk behind it) is slow to import; defer it to first use
+        from llama_index.core.node_parser.text.utils import (
+            split_by_sentence_tokenizer,
+        )
+
+        self.sentence_splitter = split_by_sentence_tokenizer()
+
+    def warm_up(self) -> None:
+        """
+        Tokenize once so nltk's punkt data is checked and loaded now rather
+        than on the first real split.
+        """
+        self.sentence_splitter("Warm up. The splitter is ready.")
+
+    @tracer.traced("embedding.split")
+    def split(self, text: str) -> Tuple[List[str], List[List[float]]]:
+        """
+        Return the chunk texts and one embedding per chunk. The sentence
+        groups are embedded in one batched call and chunks that are not a
+        group in a second one, so a split costs at most two calls.
+        """
+        sentences = self.sentence_splitter(text)
+        span = current_span()
+        span.set_attribute("split.chars", len(text))
+        span.set_attribute("split.sentences", len(sentences))
+        if not sentences:
+            return [], []
+
+        groups = [
+            "".join(
+                sentences[
+                    max(0, i - self.buffer_size) : i + self.buffer_size + 1
+                ]
+            )
+            for i in range(len(sentences))
+        ]
+        embeddings = self.embedding_model.get_text_embedding_batch(groups)
+        vectors = _normalise(np.asarray(embeddings, dtype=np.float32))
+
+        if len(sentences) == 1:
+            return ["".join(sentences)], [list(embeddings[0])]
+
+        distances = 1 - np.sum(vectors[:-1] * vectors[1:], axis=1)
+        threshold = np.percentile(distances, self.breakpoint_percentile_threshold)
+
+        bounds = []
+        start = 0
+        for index in np.nonzero(distances > threshold)[0]:
+            bounds.append((start, index + 1))
+            start = index + 1
+        if start < len(sentences):
+            bounds.append((start, len(sentences)))
+
+        chunks = ["".join(sentences[start:end]) for start, end in bounds]
+        return chunks, self._chunk_embeddings(chunks, groups, embeddings)
+
+    def _chunk_embeddings(
+        self, chunks: List[str], groups: List[str], group_embeddings: List[Any]
+    ) -> List[List[float]]:
+        by_text = dict(zip(groups, group_embeddings))
+        missing = [chunk for chunk in chunks if chunk not in by_text]
+        if missing:
+            by_text.update(
+                zip(missing, self.embedding_model.get_text_embedding_batch(missing))
+            )
+        reused = len(chunks) - len(missing)
+        current_span().set_attribute("split.reused_embeddings", reused)
+        return [list(by_text[chunk]) for chunk in chunks]
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1
+    return vectors / norms[:, None]
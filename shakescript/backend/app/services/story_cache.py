@@ -0,0 +1,97 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Tuple
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class StoryCache:
+    """
+    In-process read-through cache for per-story DB reads, keyed by
+    (story_id, view), with LRU + TTL eviction.
+
+    get() returns a version (the cache's invalidation clock) that callers
+    pass back to put(); a value loaded before the story's latest
+    invalidate() is never stored, so a read racing a write cannot put stale
+    data back. Invalidations are remembered for ttl_seconds and at most
+    max_entries of them; once one is forgotten, put() rejects every load
+    that started before it. Values are deep-copied in and out because
+    callers mutate the dicts they get back.
+
+    The cache only sees writes made by this process, so with several workers
+    the TTL bounds how stale another worker's view can be. A shared backend
+    can replace this class as long as it keeps get / put / invalidate.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.STORY_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = settings.STORY_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[float, Any]]" = (
+            OrderedDict()
+        )
+        self._clock = 0
+        # story_id -> (clock, monotonic time) of its last invalidation, oldest first
+        self._invalidated: "OrderedDict[int, Tuple[int, float]]" = OrderedDict()
+        # Loads that started before this clock value may have missed a
+        # forgotten invalidation
+        self._floor = 0
+
+    def get(self, story_id: int, view: str) -> Tuple[bool, Any, int]:
+        """Return (found, value, version); pass version back to put()."""
+        key = (story_id, view)
+        with self._lock:
+            version = self._clock
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                metrics.inc("story_cache_hits_total", view=view.split(":")[0])
+                return True, copy.deepcopy(entry[1]), version
+            if entry:
+                del self._entries[key]
+        metrics.inc("story_cache_misses_total", view=view.split(":")[0])
+        return False, None, version
+
+    def put(self, story_id: int, view: str, version: int, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            invalidated = self._invalidated.get(story_id)
+            if version < self._floor or (invalidated and invalidated[0] > version):
+                return
+            key = (story_id, view)
+            self._entries[key] = (
+                time.monotonic() + self.ttl_seconds,
+                copy.deepcopy(value),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.inc("story_cache_evictions_total")
+
+    def invalidate(self, story_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._clock += 1
+            self._invalidated[story_id] = (self._clock, now)
+            self._invalidated.move_to_end(story_id)
+            for key in [key for key in self._entries if key[0] == story_id]:
+                del self._entries[key]
+            self._forget_invalidations(now)
+        metrics.inc("story_cache_invalidations_total")
+
+    def _forget_invalidations(self, now: float) -> None:
+        while self._invalidated:
+            story_id, (clock, at) = next(iter(self._invalidated.items()))
+            if at > now - self.ttl_seconds and len(self._invalidated) <= max(
+                self.max_entries, 1
+            ):
+                return
+            del self._invalidated[story_id]
+            self._floor = max(self._floor, clock)
@@ -1,4 +1,4 @@
-from typing import Dict, List, Any
+from typing import Callable, Dict, Iterator, List, Any, Optional
 from app.services.story_service.generation import StoryGeneration
 from app.services.story_service.storage import store_validated_episodes
 from app.services.story_service.refinement import generate_and_refine_batch
@@ -10,12 +10,17 @@ from app.services.embedding_service import EmbeddingService
 
 
 class StoryService:
-    def __init__(self):
-        self.ai_service = AIService()
-        self.generation = StoryGeneration()
-        self.utils = StoryUtils()
-        self.db_service = DBService()
-        self.embedding_service = EmbeddingService()
+    def __init__(
+        self,
+        ai_service: AIService,
+        db_service: DBService,
+        embedding_service: EmbeddingService,
+    ):
+        self.ai_service = ai_service
+        self.db_service = db_service
+        self.embedding_service = embedding_service
+        self.generation = StoryGeneration(ai_service, db_service, embedding_service)
+        self.utils = StoryUtils(db_service, ai_service)
         self.DEFAULT_BATCH_SIZE = 2
 
     async def create_story(
@@ -53,6 +58,18 @@ class StoryService:
             story_id, episode_number, num_episodes, hinglish, prev_episodes
         )
 
+    def stream_and_store_episode(
+        self,
+        story_id: int,
+        episode_number: int,
+        num_episodes: int,
+        hinglish: bool = False,
+        prev_episodes: List = [],
+    ) -> Iterator[Dict[str, Any]]:
+        return self.generation.stream_and_store_episode(
+            story_id, episode_number, num_episodes, hinglish, prev_episodes
+        )
+
     def generate_multiple_episodes(
         self,
         story_id: int,
@@ -112,10 +129,22 @@ class StoryService:
         return store_validated_episodes(self, story_id, episodes)
 
     def generate_and_refine_batch(
-        self, story_id: int, batch_size: int, hinglish: bool, refinement_type: str
+        self,
+        story_id: int,
+        batch_size: int,
+        hinglish: bool,
+        refinement_type: str,
+        on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
     ):
         return generate_and_refine_batch(
-            self, story_id, batch_size, hinglish, refinement_type
+            self,
+            story_id,
+            batch_size,
+            hinglish,
+            refinement_type,
+            on_batch,
+            should_stop,
         )
 
     def update_current_episodes_content(self, story_id: int, episodes: List[Dict]):
@@ -132,6 +161,8 @@ class StoryService:
 
     def delete_story(self, story_id: int) -> None:
         self.db_service.delete_story(story_id)
+        if self.embedding_service.chunk_index is not None:
+            self.embedding_service.chunk_index.drop(story_id)
 
 
 
@@ -1,15 +1,29 @@
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any
+from app.core.config import settings
+from app.core.tracing import tracer
 from app.services.ai_service import AIService
-from app.services.db_service import DBService
-from app.services.embedding_service import EmbeddingService
+from app.services.db_service import (
+    DBService,
+    apply_story_events,
+    character_from_row,
+    merge_character_rows,
+    story_events_from_episode,
+)
+from app.services.embedding_service import EmbeddingService, StoryContext
+from app.services.story_service.pipeline import EpisodePersister
 import json
 
 
 class StoryGeneration:
-    def __init__(self):
-        self.ai_service = AIService()
-        self.db_service = DBService()
-        self.embedding_service = EmbeddingService()
+    def __init__(
+        self,
+        ai_service: AIService,
+        db_service: DBService,
+        embedding_service: EmbeddingService,
+    ):
+        self.ai_service = ai_service
+        self.db_service = db_service
+        self.embedding_service = embedding_service
         self.DEFAULT_BATCH_SIZE = 2
 
     async def create_story(
@@ -30,11 +44,73 @@ class StoryGeneration:
         hinglish: bool = False,
         prev_episodes: List = [],
     ) -> Dict[str, Any]:
-        story_data = self.db_service.get_story_info(story_id)
+        story_data = self.db_service.get_story_header(story_id)
         if "error" in story_data:
             return story_data
 
-        story_metadata = {
+        episode_data = self.ai_service.generate_episode_helper(
+            num_episodes,
+            self._episode_metadata(story_data, episode_number),
+            episode_number,
+            json.dumps(self.db_service.get_story_characters(story_id)),
+            story_id,
+            prev_episodes,
+            hinglish,
+        )
+        return self._store_generated_episode(
+            story_id, episode_number, story_data, episode_data
+        )
+
+    def stream_and_store_episode(
+        self,
+        story_id: int,
+        episode_number: int,
+        num_episodes: int,
+        hinglish: bool = False,
+        prev_episodes: List = [],
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Like generate_and_store_episode, but yields the AI service's token
+        events while the episode is written and finishes with an "episode"
+        event carrying the stored result (or an "error" event).
+        """
+        try:
+            story_data = self.db_service.get_story_header(story_id)
+            if "error" in story_data:
+                yield {"event": "error", "data": story_data}
+                return
+
+            episode_data: Dict[str, Any] = {}
+            for event in self.ai_service.stream_episode_helper(
+                num_episodes,
+                self._episode_metadata(story_data, episode_number),
+                episode_number,
+                json.dumps(self.db_service.get_story_characters(story_id)),
+                story_id,
+                prev_episodes,
+                hinglish,
+            ):
+                if event["event"] == "episode":
+                    episode_data = event["data"]
+                else:
+                    yield event
+
+            result = self._store_generated_episode(
+                story_id, episode_number, story_data, episode_data
+            )
+        except Exception as e:
+            # The response has started streaming, so report failures in-band
+            print(
+                f"Streaming episode {episode_number} of story {story_id} failed: {e}"
+            )
+            yield {"event": "error", "data": {"error": str(e)}}
+            return
+        yield {"event": "error" if "error" in result else "episode", "data": result}
+
+    def _episode_metadata(
+        self, story_data: Dict[str, Any], episode_number: int
+    ) -> Dict[str, Any]:
+        return {
             "title": story_data["title"],
             "setting": story_data["setting"],
             "key_events": story_data["key_events"],
@@ -44,16 +120,14 @@ class StoryGeneration:
             "timeline": story_data["timeline"],
         }
 
-        episode_data = self.ai_service.generate_episode_helper(
-            num_episodes,
-            story_metadata,
-            episode_number,
-            json.dumps(story_data["characters"]),
-            story_id,
-            prev_episodes,
-            hinglish,
-        )
-
+    @tracer.traced("episode.store")
+    def _store_generated_episode(
+        self,
+        story_id: int,
+        episode_number: int,
+        story_data: Dict[str, Any],
+        episode_data: Dict[str, Any],
+    ) -> Dict[str, Any]:
         if "error" in episode_data or not episode_data.get("episode_content"):
             return {
                 "error": "Failed to generate episode content",
@@ -74,6 +148,7 @@ class StoryGeneration:
                 episode_number,
                 episode_data["episode_content"],
                 character_names,
+                StoryContext.from_story(story_data),
             )
             print(f"Chunking completed for episode {episode_number}")
         else:
@@ -90,6 +165,7 @@ class StoryGeneration:
             ),
         }
 
+    @tracer.traced("story.generate_episodes")
     def generate_multiple_episodes(
         self,
         story_id: int,
@@ -97,12 +173,20 @@ class StoryGeneration:
         hinglish: bool = False,
         batch_size: int = 1,
     ) -> List[Dict[str, Any]]:
-        story_data = self.db_service.get_story_info(story_id)
+        story_data = self.db_service.get_story_header(story_id, with_state=False)
         if "error" in story_data:
             return [story_data]
 
-        episodes = []
         current_episode = story_data["current_episode"]
+        if settings.EPISODE_PIPELINE_DEPTH > 0:
+            return self._generate_pipelined(
+                story_id,
+                range(current_episode, current_episode + num_episodes),
+                num_episodes,
+                hinglish,
+            )
+
+        episodes = []
         effective_batch_size = batch_size if batch_size else self.DEFAULT_BATCH_SIZE
         for i in range(0, num_episodes, effective_batch_size):
             batch_end = min(
@@ -115,6 +199,7 @@ class StoryGeneration:
                         "episode_number": ep["episode_number"],
                         "content": ep["episode_content"],
                         "title": ep["episode_title"],
+                        "summary": ep.get("episode_summary"),
                     }
                     for ep in episodes[-2:]
                 ]
@@ -126,6 +211,78 @@ class StoryGeneration:
                 episodes.append(episode_result)
         return episodes
 
+    def _generate_pipelined(
+        self,
+        story_id: int,
+        episode_numbers: range,
+        num_episodes: int,
+        hinglish: bool,
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate episodes back to back while an EpisodePersister stores the
+        previous ones. The next prompt only needs the previous episode's text
+        and the story state it leads to, so the header and cast are updated
+        in memory exactly as store_episode will update them in the database.
+        """
+        story_data = self.db_service.get_story_header(story_id)
+        if "error" in story_data:
+            return [story_data]
+        character_rows = self.db_service.get_character_rows(story_id)
+
+        persister = EpisodePersister(
+            lambda number, episode_data: self._store_generated_episode(
+                story_id, number, story_data, episode_data
+            ),
+            settings.EPISODE_PIPELINE_DEPTH,
+        )
+        generated: List[Dict[str, Any]] = []
+        failure = None
+        try:
+            for episode_number in episode_numbers:
+                if persister.error is not None:
+                    break
+                episode_data = self.ai_service.generate_episode_helper(
+                    num_episodes,
+                    self._episode_metadata(story_data, episode_number),
+                    episode_number,
+                    json.dumps([character_from_row(row) for row in character_rows]),
+                    story_id,
+                    [
+                        {
+                            "episode_number": ep["episode_number"],
+                            "content": ep["episode_content"],
+                            "title": ep["episode_title"],
+                            "summary": ep.get("episode_summary"),
+                        }
+                        for ep in generated[-2:]
+                    ],
+                    hinglish,
+                )
+                if "error" in episode_data or not episode_data.get("episode_content"):
+                    failure = {
+                        "error": "Failed to generate episode content",
+                        "episode_data": episode_data,
+                    }
+                    break
+                persister.submit(episode_number, episode_data)
+                generated.append({**episode_data, "episode_number": episode_number})
+
+                apply_story_events(
+                    story_data,
+                    story_events_from_episode(story_id, episode_data, episode_number),
+                )
+                featured = episode_data.get("characters_featured", [])
+                if featured:
+                    merged = {row["name"]: row for row in character_rows}
+                    for row in merge_character_rows(story_id, character_rows, featured):
+                        merged[row["name"]] = row
+                    character_rows = list(merged.values())
+        finally:
+            episodes = persister.close()
+
+        error = persister.error or failure
+        return episodes + [error] if error else episodes
+
     def get_episodes_by_range(
         self, story_id: int, start_episode: int, end_episode: int
     ) -> List[Dict[str, Any]]:
@@ -133,19 +290,9 @@ class StoryGeneration:
         Get episodes for a story within a specific range.
         """
         try:
-            result = (
-                self.db_service.supabase.table("episodes")
-                .select("*")
-                .eq("story_id", story_id)
-                .gte("episode_number", start_episode)
-                .lte("episode_number", end_episode)
-                .order("episode_number")
-                .execute()
+            return self.db_service.get_episodes_by_range(
+                story_id, start_episode, end_episode
             )
-            # Check if the response contains data
-            if hasattr(result, "data"):
-                return result.data
-            return []
         except Exception as e:
             print(f"Error fetching episodes: {e}")
             return []
@@ -155,17 +302,7 @@ class StoryGeneration:
         Get all stored episodes for a story.
         """
         try:
-            result = (
-                self.db_service.supabase.table("episodes")
-                .select("*")
-                .eq("story_id", story_id)
-                .order("episode_number")
-                .execute()
-            )
-            # Check if the response contains data
-            if hasattr(result, "data"):
-                return result.data
-            return []
+            return self.db_service.get_all_episodes(story_id)
         except Exception as e:
             print(f"Error fetching all episodes: {e}")
             return []
@@ -0,0 +1,58 @@
+import contextvars
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from app.core.metrics import metrics
+
+
+class EpisodePersister:
+    """
+    Background stage of pipelined episode generation. Stores generated
+    episodes (episode row, characters, story events, chunks and embeddings)
+    on its own thread, one at a time and in submission order, so commits stay
+    ordered while the next episode is already being written by the LLM.
+
+    submit() blocks once max_pending episodes are waiting, which keeps
+    generation at most that far ahead of the database. After the first
+    failure the remaining episodes are dropped and error is set.
+    """
+
+    def __init__(self, store: Callable[..., Dict[str, Any]], max_pending: int):
+        self._store = store
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_pending)
+        self.results: List[Dict[str, Any]] = []
+        self.error: Optional[Dict[str, Any]] = None
+        # Run in the submitter's context, e.g. a job's batch LLM priority
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(
+            target=context.run, args=(self._run,), name="episode-persister", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, *args) -> None:
+        self._queue.put(args)
+        metrics.set("episode_pipeline_pending", self._queue.qsize())
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Wait for every submitted episode and return the stored results."""
+        self._queue.put(None)
+        self._thread.join()
+        return self.results
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                result = self._store(*item)
+            except Exception as e:
+                print(f"Storing episode {item[0]} failed: {e}")
+                result = {"error": f"Failed to store episode {item[0]}: {e}"}
+            if "error" in result:
+                self.error = result
+            else:
+                self.results.append(result)
+            metrics.set("episode_pipeline_pending", self._queue.qsize())
@@ -1,11 +1,22 @@
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional
 from fastapi import HTTPException
+from app.core.tracing import tracer
 
 
 def generate_and_refine_batch(
-    self, story_id: int, batch_size: int, hinglish: bool, refinement_type: str
+    self,
+    story_id: int,
+    batch_size: int,
+    hinglish: bool,
+    refinement_type: str,
+    on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
 ) -> List[Dict[str, Any]]:
-    story_data = self.get_story_info(story_id)
+    """
+    on_batch is called with each batch once it is stored (AI) or pending
+    review (human); should_stop is checked before every further AI batch.
+    """
+    story_data = self.db_service.get_story(story_id)
     current_episode = story_data.get("current_episode", 1)
     metadata = {
         "title": story_data["title"],
@@ -29,14 +40,18 @@ def generate_and_refine_batch(
     if current_episode > 1:
         prev_batch_end = current_episode - 1
         prev_batch_start = max(1, prev_batch_end - 2)  # Get up to 2 previous episodes
-        prev_episodes = self.get_episodes_by_range(
-            story_id, prev_batch_start, prev_batch_end
+        prev_episodes = self.db_service.get_episodes_by_range(
+            story_id,
+            prev_batch_start,
+            prev_batch_end,
+            "episode_number, content, title, summary",
         )
         prev_episodes = [
             {
                 "episode_number": ep["episode_number"],
                 "content": ep["content"],
                 "title": ep["title"],
+                "summary": ep.get("summary"),
             }
             for ep in prev_episodes
         ]
@@ -58,9 +73,10 @@ def generate_and_refine_batch(
         attempt = 0
         validation_result = {}
         while attempt < max_attempts:
-            validation_result = self.ai_service.validate_batch(
-                story_id, episodes, prev_episodes, metadata
-            )
+            with tracer.span("story.validate", attempt=attempt + 1):
+                validation_result = self.ai_service.validate_batch(
+                    story_id, episodes, prev_episodes, metadata
+                )
             if validation_result.get("status") == "success":
                 print(f"Batch validated successfully on attempt {attempt+1}")
                 break
@@ -68,13 +84,14 @@ def generate_and_refine_batch(
             print(f"Batch needs refinement - attempt {attempt+1}")
             if validation_result.get("feedback"):
                 print(f"Feedback: {validation_result.get('feedback')}")
-                episodes = self.ai_service.regenerate_batch(
-                    story_id,
-                    validation_result["episodes"],
-                    prev_episodes,
-                    metadata,
-                    validation_result.get("feedback", []),
-                )
+                with tracer.span("story.regenerate", attempt=attempt + 1):
+                    episodes = self.ai_service.regenerate_batch(
+                        story_id,
+                        validation_result["episodes"],
+                        prev_episodes,
+                        metadata,
+                        validation_result.get("feedback", []),
+                    )
             attempt += 1
 
         if attempt == max_attempts and validation_result.get("status") != "success":
@@ -87,19 +104,22 @@ def generate_and_refine_batch(
 
         # Update current_episode
         new_current_episode = current_episode + len(episodes)
-        self.db_service.supabase.table("stories").update(
-            {"current_episode": new_current_episode}
-        ).eq("id", story_id).execute()
+        self.db_service.update_current_episode(story_id, new_current_episode)
 
         # Clear the current_episodes_content after processing this batch
         self.clear_current_episodes_content(story_id)
+        if on_batch:
+            on_batch(episodes)
 
         # Check if we need to process more batches
         if new_current_episode <= story_data["num_episodes"]:
+            if should_stop and should_stop():
+                print(f"Stopping before episode {new_current_episode} on request")
+                return episodes
             print(f"Moving to next batch starting at episode {new_current_episode}")
             # Recursively process the next batch
             next_batch = self.generate_and_refine_batch(
-                story_id, batch_size, hinglish, refinement_type
+                story_id, batch_size, hinglish, refinement_type, on_batch, should_stop
             )
             # Combine with current episodes
             return episodes + next_batch
@@ -110,4 +130,6 @@ def generate_and_refine_batch(
         )  # Return all episodes after AI refinement
 
     # For human refinement, just return the current batch
+    if on_batch:
+        on_batch(episodes)
     return episodes
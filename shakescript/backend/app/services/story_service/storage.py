@@ -1,6 +1,8 @@
 from typing import List, Dict, Any
+from app.core.tracing import tracer
 
 
+@tracer.traced("story.store_episodes")
 def store_validated_episodes(
     self, story_id: int, episodes: List[Dict[str, Any]]
 ) -> None:
@@ -11,6 +13,9 @@ def store_validated_episodes(
         print("No episodes to store")
         return
     
+    # Story-level facts for importance scoring are loaded once for the batch
+    story_context = self.embedding_service.load_story_context(story_id)
+
     # Store each episode in the episodes table
     for episode in episodes:
         episode_number = episode.get("episode_number")
@@ -33,6 +38,7 @@ def store_validated_episodes(
                 episode_number,
                 episode["episode_content"],
                 character_names,
+                story_context,
             )
             print(f"Chunking completed for validated episode {episode_number}")
         else:
@@ -42,9 +48,7 @@ def store_validated_episodes(
     max_episode_num = max([ep.get("episode_number", 0) for ep in episodes], default=0)
     if max_episode_num > 0:
         print(f"Updating story current_episode to {max_episode_num + 1}")
-        self.db_service.supabase.table("stories").update(
-            {"current_episode": max_episode_num + 1}
-        ).eq("id", story_id).execute()
+        self.db_service.update_current_episode(story_id, max_episode_num + 1)
     
     # Clear the current_episodes field after validation
     self.clear_current_episodes_content(story_id)
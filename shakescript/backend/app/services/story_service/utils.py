@@ -1,13 +1,14 @@
 from typing import Dict, List, Any
+from app.core.tracing import tracer
 from app.services.db_service import DBService
 from app.services.ai_service import AIService
 from app.models.schemas import StoryListItem
 
 
 class StoryUtils:
-    def __init__(self):
-        self.db_service = DBService()
-        self.ai_service = AIService()
+    def __init__(self, db_service: DBService, ai_service: AIService):
+        self.db_service = db_service
+        self.ai_service = ai_service
 
     def get_story_info(self, story_id: int) -> Dict[str, Any]:
         return self.db_service.get_story_info(story_id)
@@ -41,14 +42,16 @@ class StoryUtils:
             }
         )
 
+    @tracer.traced("story.update_summary")
     def update_story_summary(self, story_id: int) -> Dict[str, Any]:
-        story_data = self.get_story_info(story_id)
+        story_data = self.db_service.get_story_header(story_id, with_state=False)
         if "error" in story_data:
             return {"error": story_data["error"]}
-        episode_summaries = "\n".join(ep["summary"] for ep in story_data["episodes"])
+        episode_summaries = "\n".join(
+            ep["summary"]
+            for ep in self.db_service.get_all_episodes(story_id, "summary")
+        )
         instruction = f"Create a 150-200 word audio teaser summary for '{story_data['title']}' based on: {episode_summaries}. Use vivid, short sentences. End with a hook."
         summary = self.ai_service.model.generate_content(instruction).text.strip()
-        self.db_service.supabase.table("stories").update({"summary": summary}).eq(
-            "id", story_id
-        ).execute()
+        self.db_service.update_story_summary(story_id, summary)
         return {"status": "success", "summary": summary}
@@ -1,2 +1,3 @@
 from app.utils.utils import parse_user_prompt, parse_episode_response
 
+from app.utils.json_repair import extract_json, repair_json
@@ -0,0 +1,268 @@
+"""
+Single-pass extraction and repair of the JSON object in an LLM response.
+
+extract_json() tries json.loads first and otherwise rewrites the text from
+its first "{" (or "[") to the matching close, fixing what models commonly
+get wrong:
+
+    prose or ``` fences around the object      dropped
+    unescaped quotes inside strings            escaped (see _closes_string)
+    raw newlines / control characters          escaped
+    single-quoted strings, unquoted keys       quoted
+    True / False / None                        true / false / null
+    missing or trailing commas                 added / dropped
+    output cut off mid-object                  string and brackets closed
+
+Apostrophes inside double-quoted strings are left alone, so dialogue is not
+corrupted. Every character is consumed once (string bodies are skipped with
+a single-character-class regex) and lookahead only crosses the whitespace
+that follows a quote, so parse time is linear in the input length.
+"""
+
+import json
+import re
+from typing import Any, List
+
+_DOUBLE_SPECIAL = re.compile(r'["\\\x00-\x1f]')
+_SINGLE_SPECIAL = re.compile(r"['\"\\\x00-\x1f]")
+_NON_WHITESPACE = re.compile(r"[^ \t\r\n]")
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?")
+_BARE_KEY = re.compile(r"[^\s,:{}\[\]\"']+")
+_BARE_VALUE = re.compile(r"[^,}\]\n]+")
+_HEX4 = re.compile(r"[0-9a-fA-F]{4}")
+_LITERALS = {
+    "true": "true",
+    "false": "false",
+    "null": "null",
+    "True": "true",
+    "False": "false",
+    "None": "null",
+}
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_ARRAY_VALUE_START = set("{[\"'-0123456789tfnTFN")
+
+
+def extract_json(text: str, opening: str = "{") -> Any:
+    """
+    Parse the first JSON object (or, with opening="[", array) in text,
+    repairing it if needed. Raises ValueError if there is none.
+    """
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError, RecursionError):
+        pass
+    repaired = repair_json(text, opening)
+    try:
+        return json.loads(repaired)
+    except RecursionError:
+        raise ValueError("JSON nested too deeply")
+
+
+def repair_json(text: str, opening: str = "{") -> str:
+    """The repaired JSON text extract_json parses."""
+    start = text.find(opening)
+    if start < 0:
+        raise ValueError(f"No JSON {opening!r} found in response")
+    return _Repairer(text).run(start)
+
+
+class _Repairer:
+    def __init__(self, text: str):
+        self.text = text
+        self.n = len(text)
+        self.out: List[str] = []
+        # [opening char, members so far] per open container
+        self.stack: List[List[Any]] = []
+
+    def run(self, i: int) -> str:
+        text, out, stack = self.text, self.out, self.stack
+        expect = "value"
+        while True:
+            i = self._skip_whitespace(i)
+            if i >= self.n:
+                break
+            c = text[i]
+            top = stack[-1][0] if stack else None
+
+            if expect == "after":
+                if c in "}]":
+                    self._close()
+                    i += 1
+                    if not stack:
+                        break
+                elif c == ",":
+                    expect = "key" if top == "{" else "value"
+                    i += 1
+                elif top == "{" and (c in "\"'" or _BARE_KEY.match(text, i)):
+                    expect = "key"  # missing comma
+                elif top == "[" and c in _ARRAY_VALUE_START:
+                    expect = "value"  # missing comma
+                else:
+                    i += 1
+
+            elif expect == "key":
+                if c in "}]":
+                    self._close()
+                    i += 1
+                    if not stack:
+                        break
+                    expect = "after"
+                    continue
+                if c in "\"'":
+                    self._member()
+                    i = self._string(i, is_key=True)
+                    expect = "colon"
+                    continue
+                match = _BARE_KEY.match(text, i)
+                if match:
+                    self._member()
+                    out.append(json.dumps(match.group(0)))
+                    i = match.end()
+                    expect = "colon"
+                else:
+                    i += 1
+
+            elif expect == "colon":
+                out.append(":")
+                if c == ":":
+                    i += 1
+                elif c in ",}]":
+                    out.append("null")
+                    expect = "after"
+                    continue
+                expect = "value"
+
+            else:  # value
+                in_object = top == "{"
+                if c in "}]" or c == ",":
+                    if in_object:
+                        out.append("null")  # key with no value
+                    expect = "after"
+                    if c == "," and not in_object:
+                        i += 1  # empty array slot
+                        expect = "value"
+                    continue
+                if c == ":":
+                    i += 1
+                    continue
+                if top == "[":
+                    self._member()
+                if c in "{[":
+                    out.append(c)
+                    stack.append([c, 0])
+                    i += 1
+                    expect = "key" if c == "{" else "value"
+                    continue
+                if c in "\"'":
+                    i = self._string(i, is_key=False)
+                else:
+                    i = self._bare_value(i)
+                expect = "after"
+
+        if expect == "colon":
+            out.append(":null")
+        elif expect == "value" and stack and stack[-1][0] == "{":
+            out.append("null")
+        while stack:
+            self._close()
+        return "".join(out)
+
+    def _member(self) -> None:
+        entry = self.stack[-1]
+        if entry[1]:
+            self.out.append(",")
+        entry[1] += 1
+
+    def _close(self) -> None:
+        self.out.append("}" if self.stack.pop()[0] == "{" else "]")
+
+    def _skip_whitespace(self, i: int) -> int:
+        match = _NON_WHITESPACE.search(self.text, i)
+        return match.start() if match else self.n
+
+    def _string(self, i: int, is_key: bool) -> int:
+        text, n = self.text, self.n
+        quote = text[i]
+        special = _DOUBLE_SPECIAL if quote == '"' else _SINGLE_SPECIAL
+        pieces = ['"']
+        i += 1
+        while True:
+            match = special.search(text, i)
+            if match is None:
+                # Cut off mid-string
+                pieces.append(text[i:])
+                i = n
+                break
+            j = match.start()
+            pieces.append(text[i:j])
+            ch = text[j]
+            if ch == "\\":
+                nxt = text[j + 1] if j + 1 < n else ""
+                if nxt and nxt in '"\\/bfnrt':
+                    pieces.append("\\" + nxt)
+                    i = j + 2
+                elif nxt == "u" and _HEX4.match(text, j + 2):
+                    pieces.append(text[j : j + 6])
+                    i = j + 6
+                elif nxt == "'":
+                    pieces.append("'")
+                    i = j + 2
+                else:
+                    pieces.append("\\\\")
+                    i = j + 1
+            elif ch == quote and self._closes_string(j, is_key):
+                i = j + 1
+                break
+            elif ch == '"':
+                pieces.append('\\"')
+                i = j + 1
+            elif ch == "'":
+                pieces.append("'")
+                i = j + 1
+            else:
+                pieces.append(_ESCAPES.get(ch) or "\\u%04x" % ord(ch))
+                i = j + 1
+        pieces.append('"')
+        self.out.append("".join(pieces))
+        return i
+
+    def _closes_string(self, j: int, is_key: bool) -> bool:
+        """
+        Whether the quote at j ends the string, judged by what follows it:
+        a closing bracket, end of input, ":" after a key, or a comma that
+        leads on to another key or value. Any other quote is part of the
+        text (typically dialogue) and gets escaped.
+        """
+        k = self._skip_whitespace(j + 1)
+        if k >= self.n:
+            return True
+        c = self.text[k]
+        if c in "}]":
+            return True
+        if c == ":":
+            return is_key
+        if c != "," or is_key:
+            return False
+        k = self._skip_whitespace(k + 1)
+        if k >= self.n:
+            return True
+        c = self.text[k]
+        if c in "\"'}]":
+            return True
+        return self.stack[-1][0] == "[" and c in _ARRAY_VALUE_START
+
+    def _bare_value(self, i: int) -> int:
+        # Numbers and literals end at whitespace; anything else is unquoted
+        # text running to the next delimiter
+        token = _BARE_KEY.match(self.text, i)
+        if token:
+            word = token.group(0)
+            if word in _LITERALS:
+                self.out.append(_LITERALS[word])
+                return token.end()
+            if _NUMBER.fullmatch(word):
+                self.out.append(word)
+                return token.end()
+        match = _BARE_VALUE.match(self.text, i)
+        self.out.append(json.dumps(match.group(0).strip()))
+        return match.end()
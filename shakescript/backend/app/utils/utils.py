@@ -1,66 +1,69 @@
 import re
-import json
-from typing import Dict
+from typing import Dict, Iterator
+from app.utils.json_repair import extract_json, repair_json
 
 
 def clean_json_text(text: str) -> str:
     """
     Preprocess raw text to make it more JSON-friendly before parsing.
-    Removes code blocks, fixes single quotes, and handles trailing commas.
+    Removes code blocks and surrounding prose, quotes keys and strings and
+    handles trailing commas (see app/utils/json_repair.py).
     """
-    # Remove markdown code blocks (e.g., ```json ... ```)
-    text = re.sub(r"```(?:json)?\s*\n(.*?)\n```", r"\1", text, flags=re.DOTALL)
-    # Replace single quotes with double quotes for valid JSON
-    text = text.replace("'", '"')
-    # Remove trailing commas before closing brackets/braces
-    text = re.sub(r",\s*}", "}", text)
-    text = re.sub(r",\s*]", "]", text)
-    # Strip leading/trailing whitespace
-    text = text.strip()
-    return text
+    try:
+        return repair_json(text)
+    except ValueError:
+        return text.strip()
+
+
+_EPISODE_CONTENT_KEY = re.compile(r"[\"']episode_content[\"']")
+# Braces before the episode_content key to retry from; each retry is a
+# linear parse, so this bounds the total work
+_MAX_EPISODE_STARTS = 4
+
 
 def parse_episode_response(response_text: str, metadata: Dict) -> Dict:
-    try:
-        episode_data = json.loads(response_text)
-        return episode_data
-    except json.JSONDecodeError:
-        json_pattern = r"```(?:json)?\s*\n(.*?)\n```"
-        matches = re.findall(json_pattern, response_text, re.DOTALL)
-        if matches:
-            try:
-                episode_data = json.loads(matches[0])
-                return episode_data
-            except:
-                cleaned_text = matches[0].replace("'", '"')
-                try:
-                    episode_data = json.loads(cleaned_text)
-                    return episode_data
-                except:
-                    pass
-        json_pattern2 = r'{[\s\S]*"episode_title"[\s\S]*"episode_content"[\s\S]*}'
-        match = re.search(json_pattern2, response_text)
-        if match:
-            try:
-                cleaned_json = match.group(0).replace("'", '"')
-                episode_data = json.loads(cleaned_json)
-                return episode_data
-            except:
-                pass
-        title_match = re.search(r'"episode_title":\s*"([^"]+)"', response_text)
-        content_match = re.search(
-            r'"episode_content":\s*"([^"]*(?:(?:"[^"]*)*[^"])*)"', response_text
-        )
-        episode_title = (
-            title_match.group(1)
-            if title_match
-            else f"Episode {metadata.get('current_episode', 1)}"
-        )
-        episode_content = content_match.group(1) if content_match else response_text
-        
-        return {
-            "episode_title": episode_title,
-            "episode_content": episode_content,
-        }
+    """
+    The episode object in a model response. When the first "{" does not
+    start it (e.g. a brace in leading prose), parsing is retried from the
+    braces before the episode_content key. If no object with
+    episode_content can be recovered, the whole response is the content.
+    """
+    found: Dict = {}
+    for start in _episode_starts(response_text):
+        try:
+            episode_data = extract_json(response_text[start:])
+        except ValueError:
+            continue
+        if not isinstance(episode_data, dict):
+            continue
+        if "episode_content" in episode_data:
+            return episode_data
+        if not found.get("episode_title"):
+            found = episode_data
+
+    return {
+        "episode_title": found.get("episode_title")
+        or f"Episode {metadata.get('current_episode', 1)}",
+        "episode_content": response_text,
+        "episode_summary": found.get("episode_summary")
+        or "Episode summary not available.",
+    }
+
+
+def _episode_starts(text: str) -> Iterator[int]:
+    """0, then the nearest braces before the first episode_content key."""
+    yield 0
+    match = _EPISODE_CONTENT_KEY.search(text)
+    if not match:
+        return
+    end = match.start()
+    for _ in range(_MAX_EPISODE_STARTS):
+        start = text.rfind("{", 0, end)
+        if start <= 0:
+            return
+        yield start
+        end = start
+
 
 def parse_user_prompt(raw_prompt: str) -> str:
     """
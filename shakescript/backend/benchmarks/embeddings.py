@@ -0,0 +1,147 @@
+"""
+Compare embedding backends on throughput, memory and retrieval agreement.
+
+Run from shakescript/backend:
+
+    python -m benchmarks.embeddings
+    python -m benchmarks.embeddings --backend all-MiniLM-L6-v2 --backend onnx:all-MiniLM-L6-v2 --texts 2000
+
+Every backend runs in its own interpreter, so load time and peak RSS are
+measured per backend. The first --backend is the reference: the others are
+scored on the cosine similarity of their vectors to it and on how many of
+its top-k chunks they also return for a set of retrieval queries.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+import numpy as np
+
+from benchmarks.run import peak_rss_mb  # also sets the placeholder settings
+
+SUBJECTS = ["Asha", "Ravi", "Meera", "The old ferryman", "A masked stranger", "The village council"]
+ACTIONS = [
+    "searches the flooded market for",
+    "argues bitterly about",
+    "quietly hides",
+    "finally confesses the truth about",
+    "follows the river north towards",
+    "burns the last letter describing",
+]
+OBJECTS = [
+    "the missing brother",
+    "a lantern that never goes out",
+    "the silver key to the temple",
+    "the debt owed to the moneylender",
+    "the storm that destroyed the bridge",
+    "their mother's forgotten song",
+]
+QUERIES = [
+    "Who is looking for the lost brother?",
+    "A secret is revealed",
+    "The bridge collapsed during a storm",
+    "money and debts",
+    "a journey up the river",
+    "the lantern's magic",
+    "a family memory of music",
+    "Ravi hides something",
+]
+
+
+def corpus(size: int) -> List[str]:
+    sentences = [
+        f"{subject} {action} {obj}."
+        for subject, action, obj in itertools.product(SUBJECTS, ACTIONS, OBJECTS)
+    ]
+    # Longer passages, like the chunks the splitter produces
+    return [
+        " ".join(sentences[(i * 7 + j * 31) % len(sentences)] for j in range(1 + i % 4))
+        for i in range(size)
+    ]
+
+
+def run_backend(spec: str, args: argparse.Namespace, output: str) -> Dict[str, Any]:
+    from app.services.embedding_backends import build_embedding_model
+
+    start = time.perf_counter()
+    model = build_embedding_model(spec, args.batch_size, args.threads)
+    load_s = time.perf_counter() - start
+
+    texts = corpus(args.texts)
+    model.get_text_embedding_batch(texts[: args.batch_size])  # warm-up
+    start = time.perf_counter()
+    vectors = np.asarray(model.get_text_embedding_batch(texts), dtype=np.float32)
+    embed_s = time.perf_counter() - start
+    queries = np.asarray([model.get_text_embedding(q) for q in QUERIES], dtype=np.float32)
+    np.savez(output, vectors=vectors, queries=queries)
+
+    return {
+        "load_s": round(load_s, 3),
+        "texts_per_s": round(len(texts) / embed_s, 1),
+        "dimension": int(vectors.shape[1]),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def agreement(reference: Dict[str, np.ndarray], candidate: Dict[str, np.ndarray], k: int) -> Dict[str, float]:
+    """Mean pairwise cosine, and top-k overlap of the retrieval results."""
+    cosine = float(np.mean(np.sum(reference["vectors"] * candidate["vectors"], axis=1)))
+    overlaps = []
+    for ref_query, cand_query in zip(reference["queries"], candidate["queries"]):
+        ref_top = set(np.argsort(-(reference["vectors"] @ ref_query))[:k])
+        cand_top = set(np.argsort(-(candidate["vectors"] @ cand_query))[:k])
+        overlaps.append(len(ref_top & cand_top) / k)
+    return {"mean_cosine": round(cosine, 4), f"top{k}_overlap": round(float(np.mean(overlaps)), 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backend", action="append", help="EMBEDDING_MODEL value to compare")
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, args, args.output)))
+        return
+
+    backends = args.backend or ["all-MiniLM-L6-v2", "onnx:all-MiniLM-L6-v2"]
+    passthrough = [f"--texts={args.texts}", f"--batch-size={args.batch_size}", f"--threads={args.threads}"]
+    with tempfile.TemporaryDirectory() as tmp:
+        results, vectors = {}, {}
+        for i, spec in enumerate(backends):
+            output = os.path.join(tmp, f"{i}.npz")
+            completed = subprocess.run(
+                [sys.executable, "-m", "benchmarks.embeddings", *passthrough, "--child", spec, "--output", output],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+            if completed.returncode != 0:
+                print(f"{spec}: failed\n{completed.stderr[-2000:]}")
+                continue
+            results[spec] = json.loads(completed.stdout.strip().splitlines()[-1])
+            with np.load(output) as data:
+                vectors[spec] = {"vectors": data["vectors"], "queries": data["queries"]}
+
+        reference = backends[0]
+        for spec, result in results.items():
+            if spec != reference and reference in vectors:
+                result.update(agreement(vectors[reference], vectors[spec], args.k))
+            print(f"{spec}: {json.dumps(result)}")
+    if len(results) < len(backends):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
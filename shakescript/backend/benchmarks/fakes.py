@@ -0,0 +1,534 @@
+"""
+Deterministic stand-ins for Gemini, Supabase and the embedding model, so
+the generation pipeline can be measured without paid APIs or a database.
+"""
+
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import numpy as np
+
+
+def _words(n: int, seed: str) -> str:
+    vocabulary = (
+        "the lantern river night storm whisper forest city stone silver door "
+        "secret promise shadow morning letter bridge fire voice memory road"
+    ).split()
+    digest = hashlib.sha256(seed.encode("utf-8")).digest()
+    return " ".join(vocabulary[digest[i % len(digest)] % len(vocabulary)] for i in range(n))
+
+
+def _approx_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+class FakeRateLimitError(Exception):
+    """Looks like google.api_core's ResourceExhausted to the LLM gateway."""
+
+    code = 429
+
+
+class FakeApiError(Exception):
+    """Looks like postgrest's APIError for a function that does not exist."""
+
+    code = "PGRST202"
+
+
+class FakeGenerativeModel:
+    """
+    Mimics google.generativeai.GenerativeModel.generate_content closely
+    enough for the prompts this app sends. Responses depend only on the
+    prompt, and every call sleeps latency_s plus output tokens divided by
+    tokens_per_second.
+
+    quality_issue_rate is the share of quality checks that report an issue.
+    Issues are spread evenly by call count rather than by content, so
+    variants that change the prose still see the same number of
+    refinement rounds. rate_limit_rate is the share of calls rejected with
+    FakeRateLimitError before any work is done, spread the same way.
+    """
+
+    def __init__(
+        self,
+        latency_s: float = 0.0,
+        tokens_per_second: float = 0.0,
+        episode_words: int = 450,
+        quality_issue_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+    ):
+        self.latency_s = latency_s
+        self.tokens_per_second = tokens_per_second
+        self.episode_words = episode_words
+        self.quality_issue_rate = quality_issue_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rate_limited = 0
+        self._attempts = 0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self._quality_checks = 0
+
+    def generate_content(
+        self,
+        contents,
+        generation_config: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
+        request_options: Optional[Dict[str, Any]] = None,
+        **kwargs,
+    ):
+        if self.rate_limit_rate:
+            with self._lock:
+                self._attempts += 1
+                n = self._attempts
+                if int(n * self.rate_limit_rate) > int((n - 1) * self.rate_limit_rate):
+                    self.rate_limited += 1
+                    raise FakeRateLimitError("429 Resource has been exhausted")
+        prompt = contents if isinstance(contents, str) else json.dumps(contents)
+        text = self._respond(prompt, generation_config or {})
+        prompt_tokens, output_tokens = _approx_tokens(prompt), _approx_tokens(text)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+        usage = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        )
+        if stream:
+            return self._stream(text)
+        self._sleep(output_tokens)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def _stream(self, text: str) -> Iterator[SimpleNamespace]:
+        time.sleep(self.latency_s)
+        for start in range(0, len(text), 64):
+            piece = text[start : start + 64]
+            if self.tokens_per_second:
+                time.sleep(_approx_tokens(piece) / self.tokens_per_second)
+            yield SimpleNamespace(text=piece)
+
+    def _sleep(self, output_tokens: int) -> None:
+        delay = self.latency_s
+        if self.tokens_per_second:
+            delay += output_tokens / self.tokens_per_second
+        if delay:
+            time.sleep(delay)
+
+    def _respond(self, prompt: str, generation_config: Dict[str, Any]) -> str:
+        if "response_schema" in generation_config:
+            return json.dumps(self._structured_episode(prompt))
+        if "Story Outline" in prompt and "Format as JSON" in prompt:
+            return json.dumps(self._metadata(prompt))
+        if "I have written episode" in prompt:
+            return json.dumps(self._details(prompt))
+        if "converting one of my story's episode to Hinglish" in prompt:
+            return json.dumps(
+                {"episode_title": "Hinglish Title", "episode_content": _words(self.episode_words, prompt)}
+            )
+        if "We will now be generating the EPISODE" in prompt:
+            number = self._episode_number(prompt)
+            return json.dumps(
+                {
+                    "episode_title": f"Episode {number}: {_words(3, prompt).title()}",
+                    "episode_content": self._episode_text(prompt),
+                }
+            )
+        if "Return only TRUE if consistent" in prompt:
+            return "TRUE"
+        if "Analyze this story episode for quality issues" in prompt:
+            with self._lock:
+                self._quality_checks += 1
+                n = self._quality_checks
+            if int(n * self.quality_issue_rate) > int((n - 1) * self.quality_issue_rate):
+                return "The dialogue feels flat; sharpen the conflict."
+            return "GOOD"
+        if "Refine this episode" in prompt:
+            return self._episode_text(prompt)
+        if "Create a brief, engaging title" in prompt:
+            return _words(4, prompt).title()
+        if "audio teaser summary" in prompt:
+            return _words(160, prompt)
+        return "OK"
+
+    def _episode_number(self, prompt: str) -> int:
+        match = re.search(r"EPISODE (\d+) of", prompt)
+        return int(match.group(1)) if match else 1
+
+    def _episode_text(self, prompt: str) -> str:
+        # Sentences that mention the cast, so chunk scoring has work to do
+        words = _words(self.episode_words, prompt).split()
+        sentences = []
+        for i in range(0, len(words), 15):
+            name = ("Asha", "Ravi", "Meera")[(i // 15) % 3]
+            sentences.append(f"{name} saw the " + " ".join(words[i : i + 15]) + ".")
+        return " ".join(sentences)
+
+    def _metadata(self, prompt: str) -> Dict[str, Any]:
+        match = re.search(r"which would have (\d+) episodes", prompt)
+        num_episodes = int(match.group(1)) if match else 10
+        phases = ["Exposition", "Inciting Incident", "Rising Action", "Dilemma", "Climax", "Denouement"]
+        per_phase = max(1, num_episodes // len(phases))
+        outline, start = [], 1
+        for i, phase in enumerate(phases):
+            end = num_episodes if i == len(phases) - 1 else min(num_episodes, start + per_phase - 1)
+            if start > num_episodes:
+                break
+            key = f"Ep {start}-{end}" if end > start else f"Ep {start}"
+            outline.append({key: f"{phase} of the story", "Phase_name": phase})
+            start = end + 1
+        return {
+            "Title": "The Lantern River",
+            "Settings": {"River Town": "A town of lanterns on a slow river"},
+            "Protagonist": [{"Name": "Asha", "Motivation": "Find her brother", "Fear": "Deep water"}],
+            "Characters": [
+                {
+                    "Name": name,
+                    "Role": role,
+                    "Description": "NOT YET INTRODUCED",
+                    "Relationship": {},
+                    "Emotional_State": "curious",
+                }
+                for name, role in (("Asha", "Protagonist"), ("Ravi", "Brother"), ("Meera", "Mentor"))
+            ],
+            "Theme": "Courage",
+            "Story Outline": outline,
+            "Special Instructions": "Suspenseful tone",
+        }
+
+    def _details(self, prompt: str) -> Dict[str, Any]:
+        return {
+            "episode_summary": _words(60, prompt),
+            "episode_emotional_state": "tense",
+            "characters_featured": [
+                {
+                    "Name": name,
+                    "Role": "Lead",
+                    "Description": _words(12, name + prompt),
+                    "Relationship": {"Asha": "sibling"} if name != "Asha" else {},
+                    "role_active": True,
+                    "Emotional_State": _words(1, name + prompt),
+                }
+                for name in ("Asha", "Ravi", "Meera")
+            ],
+            "Key Events": [{"event": _words(10, prompt), "tier": "foundational"}],
+            "Settings": {"River Town": "Lanterns drift past the docks"},
+        }
+
+    def _structured_episode(self, prompt: str) -> Dict[str, Any]:
+        details = self._details(prompt)
+        for char in details["characters_featured"]:
+            char["Relationship"] = [
+                {"Character_Name": k, "Relation": v} for k, v in char["Relationship"].items()
+            ]
+        number = self._episode_number(prompt)
+        return {
+            "episode_title": f"Episode {number}: {_words(3, prompt).title()}",
+            "episode_content": self._episode_text(prompt),
+            **details,
+            "Settings": [{"Place": "River Town", "Description": "Lanterns drift past the docks"}],
+        }
+
+
+class FakeEmbedding:
+    """
+    Hashed bag-of-words vectors with the HuggingFaceEmbedding call surface.
+    A fixed random rotation makes them dense like real sentence embeddings,
+    so payload sizes are realistic, while keeping cosine similarities.
+    """
+
+    def __init__(self, dimension: int = 384, latency_per_text_s: float = 0.0):
+        self.dimension = dimension
+        self._rotation = np.linalg.qr(
+            np.random.default_rng(0).normal(size=(dimension, dimension))
+        )[0].astype(np.float32)
+        self.latency_per_text_s = latency_per_text_s
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.texts = 0
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self.get_text_embedding_batch([text])[0]
+
+    def get_query_embedding(self, query: str) -> List[float]:
+        return self.get_text_embedding(query)
+
+    def get_text_embedding_batch(self, texts: List[str], **kwargs) -> List[List[float]]:
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        if self.latency_per_text_s:
+            time.sleep(self.latency_per_text_s * len(texts))
+        return [self._embed(text) for text in texts]
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return (self._rotation @ (vector / norm if norm else vector)).tolist()
+
+
+class FakeSupabase:
+    """
+    In-memory subset of the supabase-py / postgrest builder API used by this
+    app: table(...).select/insert/upsert/update/delete with eq, gt, gte, lt,
+    lte, contains, order and limit, plus the match_chunks, match_chunks_packed
+    and insert_chunks RPCs. Every execute() counts as one round trip and sleeps latency_s;
+    payload_bytes adds up the JSON size of what was sent.
+    """
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.round_trips = 0
+        self.payload_bytes = 0
+
+    def table(self, name: str) -> "FakeQuery":
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> "FakeRpc":
+        return FakeRpc(self, name, params)
+
+    def _round_trip(self, payload: Any = None) -> None:
+        size = len(json.dumps(payload, default=str)) if payload is not None else 0
+        with self._lock:
+            self.round_trips += 1
+            self.payload_bytes += size
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+    def _rows(self, table: str) -> List[Dict[str, Any]]:
+        return self.tables.setdefault(table, [])
+
+    def _insert(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = copy.deepcopy(row)
+        if "id" not in row:
+            self._ids[table] = self._ids.get(table, 0) + 1
+            row["id"] = self._ids[table]
+        self._rows(table).append(row)
+        return row
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+class FakeQuery:
+    def __init__(self, db: FakeSupabase, table: str):
+        self.db = db
+        self.table = table
+        self.operation = "select"
+        self.columns = "*"
+        self.payload: Any = None
+        self.on_conflict = ""
+        self.ignore_duplicates = False
+        self.filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self.orders: List[tuple] = []
+        self.row_limit: Optional[int] = None
+
+    def select(self, columns: str = "*", **kwargs) -> "FakeQuery":
+        self.columns = columns
+        return self
+
+    def insert(self, rows, **kwargs) -> "FakeQuery":
+        self.operation, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = "", ignore_duplicates: bool = False, **kwargs) -> "FakeQuery":
+        self.operation, self.payload = "upsert", rows
+        self.on_conflict, self.ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, values: Dict[str, Any], **kwargs) -> "FakeQuery":
+        self.operation, self.payload = "update", values
+        return self
+
+    def delete(self, **kwargs) -> "FakeQuery":
+        self.operation = "delete"
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def lt(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(lambda row: row.get(column) is not None and row[column] < value)
+        return self
+
+    def lte(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(lambda row: row.get(column) is not None and row[column] <= value)
+        return self
+
+    def in_(self, column: str, values: List[Any]) -> "FakeQuery":
+        wanted = list(values)
+        self.filters.append(lambda row: row.get(column) in wanted)
+        return self
+
+    def contains(self, column: str, values: List[Any]) -> "FakeQuery":
+        wanted = _json_value(values)
+        self.filters.append(
+            lambda row: all(v in (_json_value(row.get(column)) or []) for v in wanted)
+        )
+        return self
+
+    def order(self, column: str, desc: bool = False, **kwargs) -> "FakeQuery":
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n: int) -> "FakeQuery":
+        self.row_limit = n
+        return self
+
+    def execute(self) -> SimpleNamespace:
+        self.db._round_trip(self.payload)
+        with self.db._lock:
+            data = getattr(self, f"_{self.operation}")()
+        return SimpleNamespace(data=copy.deepcopy(data))
+
+    def _matching(self) -> List[Dict[str, Any]]:
+        return [row for row in self.db._rows(self.table) if all(f(row) for f in self.filters)]
+
+    def _select(self) -> List[Dict[str, Any]]:
+        rows = self._matching()
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        if self.row_limit is not None:
+            rows = rows[: self.row_limit]
+        if self.columns.strip() == "*":
+            return rows
+        columns = [c.strip() for c in self.columns.split(",")]
+        return [{c: row.get(c) for c in columns} for row in rows]
+
+    def _insert(self) -> List[Dict[str, Any]]:
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        return [self.db._insert(self.table, row) for row in rows]
+
+    def _upsert(self) -> List[Dict[str, Any]]:
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        keys = [k.strip() for k in (self.on_conflict or "id").split(",")]
+        result = []
+        for row in rows:
+            existing = next(
+                (
+                    current
+                    for current in self.db._rows(self.table)
+                    if all(k in row and current.get(k) == row[k] for k in keys)
+                ),
+                None,
+            )
+            if existing is None:
+                result.append(self.db._insert(self.table, row))
+            elif not self.ignore_duplicates:
+                existing.update(copy.deepcopy(row))
+                result.append(existing)
+        return result
+
+    def _update(self) -> List[Dict[str, Any]]:
+        rows = self._matching()
+        for row in rows:
+            row.update(copy.deepcopy(self.payload))
+        return rows
+
+    def _delete(self) -> List[Dict[str, Any]]:
+        rows = self._matching()
+        deleted = {id(row) for row in rows}
+        self.db.tables[self.table] = [
+            row for row in self.db._rows(self.table) if id(row) not in deleted
+        ]
+        if self.table == "stories":
+            # on delete cascade
+            story_ids = {row["id"] for row in rows}
+            for name, table_rows in self.db.tables.items():
+                if name != "stories":
+                    self.db.tables[name] = [r for r in table_rows if r.get("story_id") not in story_ids]
+        return rows
+
+
+class FakeRpc:
+    def __init__(self, db: FakeSupabase, name: str, params: Dict[str, Any]):
+        self.db = db
+        self.name = name
+        self.params = params
+
+    def execute(self) -> SimpleNamespace:
+        if self.name not in ("match_chunks", "match_chunks_packed", "insert_chunks"):
+            raise FakeApiError(f"Could not find the function public.{self.name}")
+        self.db._round_trip(self.params)
+        with self.db._lock:
+            return SimpleNamespace(data=getattr(self, f"_{self.name}")(**self.params))
+
+    def _match_chunks_packed(self, query_packed: str, **params) -> List[Dict[str, Any]]:
+        from app.utils.vector_codec import decode_vector
+
+        return self._match_chunks(query_embedding=decode_vector(query_packed).tolist(), **params)
+
+    def _insert_chunks(self, p_chunks: List[Dict[str, Any]]) -> List[int]:
+        """Decode the packed embeddings as sql/005's decode_embedding does."""
+        from app.utils.vector_codec import decode_vector
+
+        ids = []
+        for chunk in p_chunks:
+            row = {k: v for k, v in chunk.items() if k != "embedding_packed"}
+            vector = decode_vector(chunk["embedding_packed"]).tolist()
+            row["embedding"] = "[" + ",".join(map(str, vector)) + "]"
+            ids.append(self.db._insert("chunks", row)["id"])
+        return ids
+
+    def _match_chunks(
+        self,
+        p_story_id,
+        query_embedding,
+        match_count=20,
+        character_names=None,
+        before_episode=None,
+    ) -> List[Dict[str, Any]]:
+        wanted = _json_value(character_names) or []
+        rows = [
+            row
+            for row in self.db._rows("chunks")
+            if row.get("story_id") == p_story_id
+            and row.get("embedding") is not None
+            and (before_episode is None or row["episode_number"] < before_episode)
+            and all(name in (_json_value(row.get("characters")) or []) for name in wanted)
+        ]
+        if not rows:
+            return []
+        matrix = np.asarray([_json_value(row["embedding"]) for row in rows], dtype=np.float32)
+        query = np.asarray(_json_value(query_embedding), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        similarities = matrix @ query / np.where(norms == 0, 1, norms)
+        top = np.argsort(-similarities)[:match_count]
+        return [
+            {
+                "id": rows[i]["id"],
+                "episode_number": rows[i]["episode_number"],
+                "chunk_number": rows[i]["chunk_number"],
+                "content": rows[i]["content"],
+                "importance_score": rows[i]["importance_score"],
+                "similarity": float(similarities[i]),
+            }
+            for i in top
+        ]
@@ -0,0 +1,93 @@
+"""
+Profile how long `import app.main` takes and which modules it pulls in.
+
+Run from shakescript/backend:
+
+    python -m benchmarks.import_profile
+    python -m benchmarks.import_profile --top 30 --budget 0.8
+
+The import runs in a fresh interpreter under `python -X importtime`. Exits
+non-zero when the total is over --budget seconds or when one of the heavy
+SDKs (which the service container loads lazily) is imported at startup.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+HEAVY_PACKAGES = (
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "llama_index",
+    "google.generativeai",
+    "openai",
+    "supabase",
+    "tiktoken",
+)
+
+
+def profile_import(module: str) -> List[Tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) for every module imported."""
+    env = dict(os.environ)
+    for name in ("SUPABASE_URL", "SUPABASE_KEY", "GEMINI_API_KEY", "OPENAI_API_KEY"):
+        env.setdefault(name, "benchmark")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr}")
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds")
+    args = parser.parse_args()
+
+    rows = profile_import(args.module)
+    total = next((cumulative for name, _, cumulative in rows if name == args.module), 0)
+    by_package: Dict[str, int] = {}
+    for name, self_us, _ in rows:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+
+    print(f"import {args.module}: {total / 1e6:.3f} s, {len(rows)} modules")
+    print(f"\nTop {args.top} by cumulative time:")
+    for name, _, cumulative in sorted(rows, key=lambda r: -r[2])[: args.top]:
+        print(f"  {cumulative / 1000:9.1f} ms  {name}")
+    print(f"\nTop {args.top} packages by self time:")
+    for package, self_us in sorted(by_package.items(), key=lambda p: -p[1])[: args.top]:
+        print(f"  {self_us / 1000:9.1f} ms  {package}")
+
+    imported = {name for name, _, _ in rows}
+    heavy = [
+        package
+        for package in HEAVY_PACKAGES
+        if package in imported or any(name.startswith(package + ".") for name in imported)
+    ]
+    if heavy:
+        print(f"\nHeavy packages imported at startup: {', '.join(heavy)}")
+
+    if total / 1e6 > args.budget or heavy:
+        print(f"\nOver budget ({args.budget:.2f} s, no heavy packages)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Fuzz and time app.utils.json_repair.extract_json on adversarial LLM output.
+
+Run from shakescript/backend:
+
+    python -m benchmarks.json_repair
+    python -m benchmarks.json_repair --size-kb 100 --mutations 200 --legacy
+
+Each adversarial case is generated and parsed at size/10 and at size. Exits
+non-zero when a full-size parse takes longer than --budget-ms, when growing
+the input 10x grows the parse time more than --max-growth times (i.e. the
+parser is not linear), when a mutated response raises anything but
+ValueError, or when a repair check gives the wrong result.
+--legacy also runs the regexes the parsers used before, in a child process
+with a timeout, for comparison.
+"""
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+from app.utils.json_repair import extract_json
+
+# The fallback the episode parsers used; cubic when "{" and "episode_title"
+# repeat without a later "episode_content"
+LEGACY_EPISODE_PATTERN = r'{[\s\S]*"episode_title"[\s\S]*"episode_content"[\s\S]*}'
+
+
+def _dialogue(n: int, rng: random.Random) -> str:
+    lines = [
+        'She said "wait", then stopped. ',
+        "He'd never seen the river so still. ",
+        '"Don\'t," Mira whispered, "not yet." ',
+        "The lantern's light shook: one, two, three. ",
+        'A voice: "{north}" and "[south]" ',
+    ]
+    parts, size = [], 0
+    while size < n:
+        line = rng.choice(lines)
+        parts.append(line)
+        size += len(line)
+    return "".join(parts)[:n]
+
+
+def _episode(content: str) -> Dict[str, str]:
+    return {
+        "episode_title": "The Lantern's Promise",
+        "episode_content": content,
+        "episode_summary": 'Mira keeps her "promise" at the bridge.',
+    }
+
+
+def adversarial_cases(size: int, rng: random.Random) -> Dict[str, str]:
+    """Inputs that are slow for backtracking regexes or naive repairers."""
+    return {
+        "titles_without_content": '{"episode_title" ' * (size // 17),
+        "unescaped_quotes": '{"episode_title": "T", "episode_content": "'
+        + 'he said "x" ' * (size // 12),
+        "quote_comma_spaces": '{"a": "' + ('" ,' + " " * 20 + "x") * (size // 24),
+        "quotes_only": '{"a": "' + '"' * size,
+        "deep_arrays": '{"a": ' + "[" * size,
+        "deep_objects": '{"a":' * (size // 5),
+        "brace_flood": "{" * (size // 2) + "}" * (size // 2),
+        "backslashes": '{"a": "' + "\\" * size,
+        "unicode_escapes": '{"a": "' + "\\u12" * (size // 4),
+        "single_quotes": "{'episode_content': '" + _dialogue(size, rng),
+        "prose_then_json": "Sure! " * (size // 12)
+        + json.dumps(_episode(_dialogue(size // 2, rng))),
+        "unquoted_keys": "{" + ", ".join(f"k{i}: v{i}" for i in range(size // 12)),
+        "commas": '{"a": [' + "," * size,
+    }
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    """Delete, duplicate or insert structural characters at random."""
+    chars = list(text)
+    for _ in range(rng.randint(1, 20)):
+        position = rng.randrange(len(chars))
+        action = rng.random()
+        if action < 0.4:
+            del chars[position]
+        elif action < 0.7:
+            chars.insert(position, rng.choice('{}[]",:\'\\\n'))
+        else:
+            chars.insert(position, chars[position] * rng.randint(1, 50))
+    if rng.random() < 0.3:
+        chars = chars[: rng.randrange(len(chars))]
+    return "".join(chars)
+
+
+def repair_checks(rng: random.Random) -> List[Tuple[str, str, Callable[[object], bool]]]:
+    content = _dialogue(2000, rng)
+    episode = _episode(content)
+    valid = json.dumps(episode, indent=2)
+    unescaped = valid.replace('\\"', '"')
+    return [
+        ("valid", valid, lambda r: r == episode),
+        ("fenced", f"Here you go:\n```json\n{valid}\n```\nEnjoy!", lambda r: r == episode),
+        ("unescaped dialogue", unescaped, lambda r: r == episode),
+        ("raw newlines", valid.replace("\\n", "\n"), lambda r: r == episode),
+        (
+            "truncated",
+            valid[: len(valid) // 2],
+            lambda r: content.startswith(r["episode_content"]),
+        ),
+        (
+            "python literals",
+            "{'done': True, 'next': None, 'n': 3,}",
+            lambda r: r == {"done": True, "next": None, "n": 3},
+        ),
+    ]
+
+
+def time_parse(text: str) -> float:
+    start = time.perf_counter()
+    try:
+        extract_json(text)
+    except ValueError:
+        pass
+    return time.perf_counter() - start
+
+
+def legacy_seconds(text: str, timeout: float) -> str:
+    code = (
+        "import re, sys, time\n"
+        "text = sys.stdin.read()\n"
+        "start = time.perf_counter()\n"
+        f"re.search({LEGACY_EPISODE_PATTERN!r}, text)\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    try:
+        completed = subprocess.run(
+            [sys.executable, "-c", code],
+            input=text,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return f"> {timeout:.0f} s (killed)"
+    return f"{float(completed.stdout) * 1000:.1f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size-kb", type=int, default=100)
+    parser.add_argument("--mutations", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=500)
+    parser.add_argument("--max-growth", type=float, default=25)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--legacy", action="store_true")
+    parser.add_argument("--legacy-timeout", type=float, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    size = args.size_kb * 1024
+    failures = []
+
+    print(f"{'case':<24} {size // 10240:>6} KB {args.size_kb:>7} KB  growth")
+    small_cases = adversarial_cases(size // 10, random.Random(args.seed))
+    for name, text in adversarial_cases(size, rng).items():
+        small = time_parse(small_cases[name])
+        full = time_parse(text)
+        growth = full / small if small else 0
+        print(f"{name:<24} {small * 1000:8.1f} ms {full * 1000:8.1f} ms  {growth:5.1f}x")
+        if full * 1000 > args.budget_ms:
+            failures.append(f"{name}: {full * 1000:.0f} ms over the {args.budget_ms:.0f} ms budget")
+        if full > 0.005 and growth > args.max_growth:
+            failures.append(f"{name}: 10x input took {growth:.0f}x as long")
+
+    base = json.dumps(_episode(_dialogue(size, rng)))
+    slowest = 0.0
+    for _ in range(args.mutations):
+        text = mutate(base, rng)
+        start = time.perf_counter()
+        try:
+            extract_json(text)
+        except ValueError:
+            pass
+        except Exception as e:
+            failures.append(f"mutation raised {type(e).__name__}: {e}")
+        slowest = max(slowest, time.perf_counter() - start)
+    print(f"\n{args.mutations} mutated {args.size_kb} KB episodes: slowest {slowest * 1000:.1f} ms")
+    if slowest * 1000 > args.budget_ms:
+        failures.append(f"mutations: {slowest * 1000:.0f} ms over the budget")
+
+    print()
+    for name, text, check in repair_checks(rng):
+        try:
+            ok = check(extract_json(text))
+        except Exception as e:
+            ok = False
+            print(f"  {name}: {type(e).__name__}: {e}")
+        print(f"repair {name:<20} {'ok' if ok else 'WRONG'}")
+        if not ok:
+            failures.append(f"repair check {name!r} failed")
+
+    if args.legacy:
+        text = adversarial_cases(size, rng)["titles_without_content"]
+        for length in (2000, 8000, len(text)):
+            print(
+                f"\nlegacy episode regex on {length} chars: "
+                f"{legacy_seconds(text[:length], args.legacy_timeout)}",
+                end="",
+            )
+        print()
+
+    if failures:
+        print("\nFAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
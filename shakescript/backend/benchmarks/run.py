@@ -0,0 +1,339 @@
+"""
+Benchmark the generation pipeline against the fakes in benchmarks.fakes.
+
+Run from shakescript/backend:
+
+    python -m benchmarks.run                          # every scenario
+    python -m benchmarks.run -s ai_batch --llm-latency 0.5
+    python -m benchmarks.run --save benchmarks/baselines/baseline.json
+    python -m benchmarks.run --compare benchmarks/baselines/baseline.json
+
+Each scenario runs in its own interpreter, so peak RSS and the in-process
+caches are per scenario. --compare exits non-zero when wall time, round
+trips, LLM calls or tokens regress by more than --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+# Settings require these, but nothing here talks to the real services
+for _name in ("SUPABASE_URL", "SUPABASE_KEY", "GEMINI_API_KEY", "OPENAI_API_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+
+PROMPT = "A girl searches a lantern-lit river town for her missing brother."
+SCENARIOS: Dict[str, Callable[[Dict[str, Any], argparse.Namespace], Dict[str, Any]]] = {}
+COMPARED = ("wall_time_s", "db_round_trips", "db_payload_kb", "llm_calls", "prompt_tokens", "output_tokens")
+
+
+def scenario(name: str):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+
+    return register
+
+
+def build_services(args: argparse.Namespace) -> Dict[str, Any]:
+    from benchmarks.fakes import FakeEmbedding, FakeGenerativeModel, FakeSupabase
+    from app.services.story_cache import StoryCache
+    from app.services.db_service import DBService
+    from app.services.embedding_service import EmbeddingService
+    from app.services.ai_service import AIService
+    from app.services.story_service import StoryService
+
+    llm = FakeGenerativeModel(
+        latency_s=args.llm_latency,
+        tokens_per_second=args.llm_tokens_per_second,
+        quality_issue_rate=args.quality_issue_rate,
+        rate_limit_rate=args.llm_429_rate,
+    )
+    model = llm
+    if args.llm_rpm or args.llm_tpm or args.llm_429_rate:
+        from app.services.ai_service.llm_gateway import LLMGateway, RateLimitedModel
+
+        gateway = LLMGateway("fake", args.llm_rpm, args.llm_tpm, 6, 0.05, 1.0)
+        model = RateLimitedModel(model, gateway, 1000)
+    if args.llm_cache != "none":
+        from app.core.cache_backends import build_cache_backend
+        from app.services.ai_service.llm_cache import CachedGenerativeModel
+
+        backend = build_cache_backend(
+            args.llm_cache,
+            os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3"),
+            64 * 1024 * 1024,
+        )
+        model = CachedGenerativeModel(model, backend, "fake", 0.2)
+
+    supabase = FakeSupabase(latency_s=args.db_latency)
+    embedding = FakeEmbedding(latency_per_text_s=args.embedding_latency)
+    embedding_model = embedding
+    if args.embedding_cache:
+        from app.core.cache_backends import MemoryCacheBackend
+        from app.services.embedding_cache import CachedEmbeddingModel
+
+        embedding_model = CachedEmbeddingModel(
+            embedding, "fake", MemoryCacheBackend(32 * 1024 * 1024)
+        )
+    db_service = DBService(supabase, StoryCache())
+    chunk_index = None
+    if args.chunk_index:
+        from app.services.chunk_index import ChunkIndexManager
+
+        chunk_index = ChunkIndexManager(db_service, 64 * 1024 * 1024, 300, 20000, 384)
+    embedding_service = EmbeddingService(embedding_model, db_service, chunk_index)
+    # The splitter is built lazily; build it here, as the server's pre-warm
+    # does, so its import cost stays out of the measured scenarios
+    embedding_service.splitter.warm_up()
+    ai_service = AIService(model, None, embedding_service)
+    return {
+        "llm": llm,
+        "supabase": supabase,
+        "embedding": embedding,
+        "db_service": db_service,
+        "embedding_service": embedding_service,
+        "story_service": StoryService(ai_service, db_service, embedding_service),
+    }
+
+
+def create_story(services: Dict[str, Any], num_episodes: int) -> int:
+    result = asyncio.run(
+        services["story_service"].create_story(PROMPT, num_episodes)
+    )
+    return result["story_id"]
+
+
+@scenario("create_story")
+def bench_create_story(services, args):
+    story_id = create_story(services, args.episodes)
+    return {"story_id": story_id}
+
+
+@scenario("ai_batch")
+def bench_ai_batch(services, args):
+    story_id = setup_story(services, args)
+    episodes = services["story_service"].generate_and_refine_batch(
+        story_id, args.batch_size, False, "ai"
+    )
+    return {"episodes": len(services["supabase"].tables.get("episodes", []))}
+
+
+@scenario("human_loop")
+def bench_human_loop(services, args):
+    """generate-batch (human) -> refine-batch -> validate-batch until done."""
+    story_id = setup_story(services, args)
+    service = services["story_service"]
+    db = services["db_service"]
+    rounds = 0
+    while db.get_story_header(story_id, with_state=False)["current_episode"] <= args.episodes:
+        episodes = service.generate_and_refine_batch(
+            story_id, args.batch_size, False, "human"
+        )
+        story_data = db.get_story_header(story_id)
+        metadata = {
+            "title": story_data["title"],
+            "setting": story_data["setting"],
+            "num_episodes": story_data["num_episodes"],
+            "story_outline": story_data["story_outline"],
+            "characters": db.get_story_characters(story_id),
+        }
+        refined = service.ai_service.regenerate_batch(
+            story_id,
+            db.get_refined_episodes(story_id),
+            [],
+            metadata,
+            [{"episode_number": episodes[0]["episode_number"], "feedback": "Make it more suspenseful"}],
+        )
+        db.update_story_current_episodes_content(story_id, refined)
+        service.store_validated_episodes(story_id, db.get_refined_episodes(story_id))
+        rounds += 1
+    return {"rounds": rounds}
+
+
+@scenario("ingest")
+def bench_ingest(services, args):
+    """Chunk, embed and store episodes, then run retrieval queries."""
+    story_id = setup_story(services, args)
+    llm = services["llm"]
+    embedding_service = services["embedding_service"]
+    context = embedding_service.load_story_context(story_id)
+    for episode_number in range(1, args.episodes + 1):
+        content = llm._episode_text(f"ingest {episode_number}")
+        embedding_service._process_and_store_chunks(
+            story_id, episode_number, episode_number, content, ["Asha", "Ravi"], context
+        )
+    start = time.perf_counter()
+    for query in range(args.episodes):
+        embedding_service.retrieve_relevant_chunks(story_id, f"Asha query {query}", k=5)
+    return {
+        "chunks": len(services["supabase"].tables.get("chunks", [])),
+        "retrieval_ms_per_query": (time.perf_counter() - start) * 1000 / max(1, args.episodes),
+    }
+
+
+def setup_story(services: Dict[str, Any], args: argparse.Namespace) -> int:
+    """Create the story the scenario works on, then restart the counters."""
+    story_id = create_story(services, args.episodes)
+    _reset_counters(services)
+    return story_id
+
+
+def _reset_counters(services: Dict[str, Any]) -> None:
+    llm, supabase, embedding = services["llm"], services["supabase"], services["embedding"]
+    llm.calls = llm.prompt_tokens = llm.output_tokens = llm.rate_limited = 0
+    supabase.round_trips = supabase.payload_bytes = 0
+    embedding.calls = embedding.texts = 0
+    services["started"] = time.perf_counter()
+
+
+def peak_rss_mb() -> Any:
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except Exception:
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(name: str, args: argparse.Namespace) -> Dict[str, Any]:
+    services = build_services(args)
+    _reset_counters(services)
+    extra = SCENARIOS[name](services, args)
+    wall = time.perf_counter() - services["started"]
+    llm, embedding = services["llm"], services["embedding"]
+    return {
+        "wall_time_s": round(wall, 4),
+        "db_round_trips": services["supabase"].round_trips,
+        "db_payload_kb": round(services["supabase"].payload_bytes / 1024, 1),
+        "llm_calls": llm.calls,
+        "llm_rate_limited": llm.rate_limited,
+        "prompt_tokens": llm.prompt_tokens,
+        "output_tokens": llm.output_tokens,
+        "embedding_calls": embedding.calls,
+        "embedded_texts": embedding.texts,
+        "peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+
+
+def run_in_child(name: str, argv: List[str]) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        result_file = os.path.join(tmp, "result.json")
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", *argv, "--child", name, "--result-file", result_file],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Scenario {name} failed:\n{completed.stderr}")
+        with open(result_file) as f:
+            return json.load(f)
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline_path: str, tolerance: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    ok = True
+    for name, result in results.items():
+        for metric in COMPARED:
+            old = (baseline.get(name) or {}).get(metric)
+            new = result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = ""
+            # Sub-50 ms wall-time differences are timer noise at zero latency
+            noise = metric == "wall_time_s" and new - old < 0.05
+            if change > tolerance and not noise:
+                flag, ok = "  REGRESSION", False
+            print(f"{name:14} {metric:16} {old:>12} -> {new:>12} ({change:+.1%}){flag}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS))
+    parser.add_argument("--episodes", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per LLM call")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--db-latency", type=float, default=0.0, help="seconds per DB round trip")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="seconds per embedded text")
+    parser.add_argument("--quality-issue-rate", type=float, default=0.25)
+    parser.add_argument("--llm-rpm", type=int, default=0, help="gateway requests per minute")
+    parser.add_argument("--llm-tpm", type=int, default=0, help="gateway tokens per minute")
+    parser.add_argument("--llm-429-rate", type=float, default=0.0, help="share of LLM calls rejected with a 429")
+    parser.add_argument("--llm-cache", default="none", choices=["none", "memory", "sqlite"])
+    parser.add_argument("--embedding-cache", action="store_true")
+    parser.add_argument("--chunk-index", action="store_true")
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args, _ = parser.parse_known_args()
+
+    if args.child:
+        with open(args.result_file, "w") as f:
+            json.dump(run_scenario(args.child, args), f)
+        return
+
+    passthrough = [
+        f"--episodes={args.episodes}",
+        f"--batch-size={args.batch_size}",
+        f"--llm-latency={args.llm_latency}",
+        f"--llm-tokens-per-second={args.llm_tokens_per_second}",
+        f"--db-latency={args.db_latency}",
+        f"--embedding-latency={args.embedding_latency}",
+        f"--quality-issue-rate={args.quality_issue_rate}",
+        f"--llm-rpm={args.llm_rpm}",
+        f"--llm-tpm={args.llm_tpm}",
+        f"--llm-429-rate={args.llm_429_rate}",
+        f"--llm-cache={args.llm_cache}",
+    ]
+    if args.embedding_cache:
+        passthrough.append("--embedding-cache")
+    if args.chunk_index:
+        passthrough.append("--chunk-index")
+    results = {}
+    for name in args.scenario or list(SCENARIOS):
+        results[name] = run_in_child(name, passthrough)
+        print(f"{name}: {json.dumps(results[name])}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "meta": {
+                        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "python": platform.python_version(),
+                        "args": passthrough,
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
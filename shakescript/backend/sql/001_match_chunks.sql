@@ -0,0 +1,37 @@
+-- Nearest-neighbour chunk search used by EmbeddingService.retrieve_relevant_chunks.
+-- Requires the pgvector extension and chunks.embedding stored as vector(384).
+
+create extension if not exists vector;
+
+create index if not exists chunks_embedding_idx
+    on chunks using hnsw (embedding vector_cosine_ops);
+
+create or replace function match_chunks(
+    p_story_id bigint,
+    query_embedding vector(384),
+    match_count int default 20,
+    character_names jsonb default null
+)
+returns table (
+    id bigint,
+    episode_number int,
+    chunk_number int,
+    content text,
+    importance_score float,
+    similarity float
+)
+language sql stable
+as $$
+    select
+        c.id,
+        c.episode_number,
+        c.chunk_number,
+        c.content,
+        c.importance_score,
+        1 - (c.embedding <=> query_embedding) as similarity
+    from chunks c
+    where c.story_id = p_story_id
+      and (character_names is null or c.characters::jsonb @> character_names)
+    order by c.embedding <=> query_embedding
+    limit match_count;
+$$;
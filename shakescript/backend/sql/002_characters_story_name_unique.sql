@@ -0,0 +1,76 @@
+-- DBService.update_character_state upserts the whole cast in one request keyed
+-- on (story_id, name). Merge any duplicate names into the newest row before
+-- adding the constraint:
+--   relationship  combined across the rows; the newer row wins per key
+--   milestones    concatenated in row order, keeping the last five as the app does
+--   last_episode  the highest of the rows
+-- role, description, emotional_state and is_active describe the character's
+-- current state and are taken from the newest row; the older rows' values for
+-- those columns are discarded with the rows. relationship and milestones hold
+-- JSON text, as DBService writes them.
+
+with duplicates as (
+    select story_id, name, max(id) as keep_id, max(last_episode) as last_episode
+    from characters
+    group by story_id, name
+    having count(*) > 1
+),
+relationships as (
+    select d.keep_id, jsonb_object_agg(r.key, r.value) as relationship
+    from duplicates d
+    cross join lateral (
+        select distinct on (e.key) e.key, e.value
+        from characters c
+        cross join lateral jsonb_each(
+            case
+                when jsonb_typeof(nullif(c.relationship, '')::jsonb) = 'object'
+                    then c.relationship::jsonb
+                else '{}'::jsonb
+            end
+        ) e
+        where c.story_id = d.story_id and c.name = d.name
+        order by e.key, c.id desc
+    ) r
+    group by d.keep_id
+),
+milestones as (
+    select m.keep_id, jsonb_agg(m.value order by m.row_id, m.position) as milestones
+    from (
+        select
+            d.keep_id,
+            c.id as row_id,
+            e.value,
+            e.position,
+            row_number() over (
+                partition by d.keep_id order by c.id desc, e.position desc
+            ) as from_end
+        from duplicates d
+        join characters c on c.story_id = d.story_id and c.name = d.name
+        cross join lateral jsonb_array_elements(
+            case
+                when jsonb_typeof(nullif(c.milestones, '')::jsonb) = 'array'
+                    then c.milestones::jsonb
+                else '[]'::jsonb
+            end
+        ) with ordinality as e(value, position)
+    ) m
+    where m.from_end <= 5
+    group by m.keep_id
+)
+update characters c
+set relationship = coalesce(r.relationship, '{}'::jsonb)::text,
+    milestones = coalesce(m.milestones, '[]'::jsonb)::text,
+    last_episode = d.last_episode
+from duplicates d
+left join relationships r on r.keep_id = d.keep_id
+left join milestones m on m.keep_id = d.keep_id
+where c.id = d.keep_id;
+
+delete from characters a
+    using characters b
+    where a.story_id = b.story_id
+      and a.name = b.name
+      and a.id < b.id;
+
+alter table characters
+    add constraint characters_story_id_name_key unique (story_id, name);
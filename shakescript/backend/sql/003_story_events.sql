@@ -0,0 +1,21 @@
+-- Append-only story state. DBService.store_episode inserts one row per key
+-- event, timeline entry and setting instead of rewriting the JSON columns on
+-- stories. Those columns now hold a compacted snapshot covering every event
+-- with id <= stories.snapshot_event_id; later events are folded in on read.
+
+create table if not exists story_events (
+    id bigserial primary key,
+    story_id bigint not null references stories (id) on delete cascade,
+    episode_number int not null,
+    kind text not null check (kind in ('key_event', 'timeline', 'setting')),
+    payload jsonb not null,
+    event_key text not null,
+    created_at timestamptz not null default now(),
+    unique (story_id, episode_number, kind, event_key)
+);
+
+create index if not exists story_events_story_id_id_idx
+    on story_events (story_id, id);
+
+alter table stories
+    add column if not exists snapshot_event_id bigint not null default 0;
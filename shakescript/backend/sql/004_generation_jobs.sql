@@ -0,0 +1,18 @@
+-- Background generate-batch jobs run by JobService. progress holds one entry
+-- per episode finished so far, result the episodes returned when done.
+
+create table if not exists generation_jobs (
+    id uuid primary key,
+    story_id bigint not null references stories (id) on delete cascade,
+    status text not null check (
+        status in ('queued', 'running', 'cancelling', 'cancelled', 'completed', 'failed')
+    ),
+    params jsonb not null,
+    progress jsonb not null default '[]'::jsonb,
+    result jsonb,
+    error text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists generation_jobs_story_id_idx on generation_jobs (story_id);
@@ -0,0 +1,126 @@
+-- Compact embedding transport (see app/utils/vector_codec.py). EmbeddingService
+-- sends chunk and query vectors packed as "f4:<base64>", "f2:<base64>" or
+-- "i8:<scale>:<base64>" (big-endian values) instead of ~8 KB of "[x,y,...]"
+-- text, and decode_embedding rebuilds the vector(384) here. Without this
+-- migration the service falls back to the text format.
+
+create extension if not exists vector;
+
+-- Make sure embeddings live in a native pgvector column (4 bytes per dimension).
+do $$
+begin
+    if (
+        select udt_name from information_schema.columns
+        where table_name = 'chunks' and column_name = 'embedding'
+    ) <> 'vector' then
+        alter table chunks
+            alter column embedding type vector(384) using embedding::text::vector(384);
+    end if;
+end;
+$$;
+
+-- IEEE 754 value from its bit pattern (float32: 8/23 bits, float16: 5/10 bits).
+create or replace function embedding_float_from_bits(bits bigint, exp_bits int, man_bits int)
+returns float8
+language sql immutable strict
+as $$
+    select
+        (case when (bits >> (exp_bits + man_bits)) & 1 = 1 then -1 else 1 end)
+        * case
+            when (bits >> man_bits) & ((1 << exp_bits) - 1) = 0 then
+                (bits & ((1::bigint << man_bits) - 1))::float8 / (1::bigint << man_bits)
+                * 2 ^ (2 - (1 << (exp_bits - 1)))
+            else
+                (1 + (bits & ((1::bigint << man_bits) - 1))::float8 / (1::bigint << man_bits))
+                * 2 ^ (((bits >> man_bits) & ((1 << exp_bits) - 1)) - ((1 << (exp_bits - 1)) - 1))
+        end;
+$$;
+
+create or replace function decode_embedding(packed text)
+returns vector
+language plpgsql immutable strict
+as $$
+declare
+    kind text := split_part(packed, ':', 1);
+    raw bytea;
+    scale float8 := 1;
+    width int;
+begin
+    if kind = 'i8' then
+        scale := split_part(packed, ':', 2)::float8;
+        raw := decode(split_part(packed, ':', 3), 'base64');
+        width := 1;
+    elsif kind in ('f4', 'f2') then
+        raw := decode(split_part(packed, ':', 2), 'base64');
+        width := case kind when 'f4' then 4 else 2 end;
+    else
+        -- Already pgvector text
+        return packed::vector;
+    end if;
+
+    -- One array_agg over the elements; appending in a loop copies the array
+    -- on every step.
+    return (
+        select array_agg(
+            (
+                case kind
+                    when 'f4' then embedding_float_from_bits(e.bits, 8, 23)
+                    when 'f2' then embedding_float_from_bits(e.bits, 5, 10)
+                    else (case when e.bits > 127 then e.bits - 256 else e.bits end) * scale
+                end
+            )::float4
+            order by e.i
+        )
+        from (
+            select i, (
+                select bit_or(
+                    get_byte(raw, i * width + j)::bigint << (8 * (width - 1 - j))
+                )
+                from generate_series(0, width - 1) as j
+            ) as bits
+            from generate_series(0, length(raw) / width - 1) as i
+        ) as e
+    )::vector;
+end;
+$$;
+
+-- Bulk chunk insert. Each element carries the chunks columns plus
+-- embedding_packed; columns are converted exactly as a PostgREST insert would.
+create or replace function insert_chunks(p_chunks jsonb)
+returns setof bigint
+language sql
+as $$
+    insert into chunks (
+        story_id, episode_id, episode_number, chunk_number,
+        content, characters, importance_score, embedding
+    )
+    select
+        r.story_id, r.episode_id, r.episode_number, r.chunk_number,
+        r.content, r.characters, r.importance_score,
+        decode_embedding(c->>'embedding_packed')
+    from jsonb_array_elements(p_chunks) as c,
+        lateral jsonb_populate_record(null::chunks, c - 'embedding_packed') as r
+    returning id;
+$$;
+
+-- match_chunks with the query vector packed the same way.
+create or replace function match_chunks_packed(
+    p_story_id bigint,
+    query_packed text,
+    match_count int default 20,
+    character_names jsonb default null
+)
+returns table (
+    id bigint,
+    episode_number int,
+    chunk_number int,
+    content text,
+    importance_score float,
+    similarity float
+)
+language sql stable
+as $$
+    select * from match_chunks(
+        p_story_id, decode_embedding(query_packed), match_count, character_names
+    );
+$$;
@@ -0,0 +1,69 @@
+-- Episode cutoff for chunk search. build_episode_prompt excludes chunks from
+-- the episodes whose text is already in the prompt, and from any episode the
+-- pipelined generator may not have stored yet, so the same inputs always
+-- retrieve the same chunks. The filter has to run before the limit, or the
+-- excluded chunks would still take candidate slots.
+--
+-- Adding a parameter creates a new overload, so the old signatures are
+-- dropped first to keep PostgREST's named-argument lookup unambiguous.
+
+drop function if exists match_chunks_packed(bigint, text, int, jsonb);
+drop function if exists match_chunks(bigint, vector, int, jsonb);
+
+create or replace function match_chunks(
+    p_story_id bigint,
+    query_embedding vector(384),
+    match_count int default 20,
+    character_names jsonb default null,
+    before_episode int default null
+)
+returns table (
+    id bigint,
+    episode_number int,
+    chunk_number int,
+    content text,
+    importance_score float,
+    similarity float
+)
+language sql stable
+as $$
+    select
+        c.id,
+        c.episode_number,
+        c.chunk_number,
+        c.content,
+        c.importance_score,
+        1 - (c.embedding <=> query_embedding) as similarity
+    from chunks c
+    where c.story_id = p_story_id
+      and (character_names is null or c.characters::jsonb @> character_names)
+      and (before_episode is null or c.episode_number < before_episode)
+    order by c.embedding <=> query_embedding
+    limit match_count;
+$$;
+
+create or replace function match_chunks_packed(
+    p_story_id bigint,
+    query_packed text,
+    match_count int default 20,
+    character_names jsonb default null,
+    before_episode int default null
+)
+returns table (
+    id bigint,
+    episode_number int,
+    chunk_number int,
+    content text,
+    importance_score float,
+    similarity float
+)
+language sql stable
+as $$
+    select * from match_chunks(
+        p_story_id,
+        decode_embedding(query_packed),
+        match_count,
+        character_names,
+        before_episode
+    );
+$$;